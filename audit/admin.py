@@ -0,0 +1,20 @@
+from django.contrib import admin
+from library_app.admin_utils import IndexedDateFieldListFilter, LargeTableAdmin
+from .models import AuditEvent
+
+
+@admin.register(AuditEvent)
+class AuditEventAdmin(LargeTableAdmin):
+    """Read-only admin interface for AuditEvent model"""
+    list_display = ['timestamp', 'action', 'actor_id', 'object_id']
+    list_filter = [('timestamp', IndexedDateFieldListFilter)]
+    ordering = ['-timestamp']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,121 @@
+"""
+Buffered audit logging.
+
+`record()` only appends to an in-memory buffer of the current worker process,
+and only once the surrounding transaction has committed, so auditing adds no
+database write to the request. A background thread writes the buffer with one
+bulk INSERT when it holds AUDIT_BUFFER_SIZE events, every AUDIT_FLUSH_INTERVAL
+seconds otherwise, and once more when the process exits.
+
+Events still in memory are lost if the process is killed outright; a failed
+write keeps them for the next flush. The buffer never holds more than
+AUDIT_MAX_BUFFER events: past that, the oldest are dropped, so a database that
+stays down costs events rather than the worker's memory.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import AuditEvent
+from .partitions import ensure_partitions, month_start
+
+logger = logging.getLogger(__name__)
+
+# Months whose partitions this process already made sure of
+_partitioned_months = set()
+
+
+def write_events(events):
+    """Insert a batch of AuditEvent instances"""
+    months = {month_start(event.timestamp) for event in events}
+    if months - _partitioned_months:
+        for month in sorted(months - _partitioned_months):
+            ensure_partitions(month, ahead=settings.AUDIT_PARTITIONS_AHEAD)
+        _partitioned_months.update(months)
+    AuditEvent.objects.bulk_create(events, batch_size=settings.AUDIT_BUFFER_SIZE)
+
+
+class AuditBuffer:
+    """Per-process buffer of audit events, flushed by a daemon thread"""
+
+    def __init__(self, writer=write_events):
+        self.writer = writer
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.events = []
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.dropped = 0
+
+    def add(self, event):
+        with self.lock:
+            self.events.append(event)
+            self.trim()
+            full = len(self.events) >= settings.AUDIT_BUFFER_SIZE
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='audit-flusher', daemon=True)
+                self.thread.start()
+        if full:
+            self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(settings.AUDIT_FLUSH_INTERVAL)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # The thread must outlive any failure, or the buffer would only ever grow
+                logger.exception('Flushing the audit buffer failed')
+            finally:
+                close_old_connections()
+
+    def trim(self):
+        """Drop the oldest events past AUDIT_MAX_BUFFER; call with `lock` held"""
+        overflow = len(self.events) - settings.AUDIT_MAX_BUFFER
+        if overflow > 0:
+            del self.events[:overflow]
+            self.dropped += overflow
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of events written"""
+        with self.flush_lock:
+            with self.lock:
+                events, self.events = self.events, []
+            if not events:
+                return 0
+            try:
+                self.writer(events)
+            except Exception:
+                logger.exception('Writing %d audit events failed; keeping them for the next flush', len(events))
+                with self.lock:
+                    self.events[:0] = events
+                    self.trim()
+                if self.dropped:
+                    logger.error('Audit buffer full, dropped %d events so far', self.dropped)
+                return 0
+            return len(events)
+
+
+buffer = AuditBuffer()
+atexit.register(buffer.flush)
+
+
+def record(action, object_id=None, user=None, **data):
+    """Audit `action`; call it where the change is made, it is buffered once the transaction commits"""
+    event = AuditEvent(
+        timestamp=timezone.now(),
+        action=action,
+        actor_id=user.pk if user is not None and user.is_authenticated else None,
+        object_id=object_id,
+        data=data,
+    )
+    transaction.on_commit(lambda: buffer.add(event))
+
+
+def flush():
+    return buffer.flush()
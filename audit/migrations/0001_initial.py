@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:43
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+PARTITIONED_TABLE = '''
+CREATE TABLE "audit_auditevent" (
+    "id" bigint GENERATED BY DEFAULT AS IDENTITY,
+    "timestamp" timestamp with time zone NOT NULL,
+    "action" varchar(50) NOT NULL,
+    "actor_id" bigint NULL,
+    "object_id" bigint NULL,
+    "data" jsonb NOT NULL,
+    PRIMARY KEY ("id", "timestamp")
+) PARTITION BY RANGE ("timestamp");
+CREATE TABLE "audit_auditevent_default" PARTITION OF "audit_auditevent" DEFAULT;
+'''
+
+
+def partition_table(apps, schema_editor):
+    """Recreate the new, empty table partitioned by month of `timestamp` on PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    AuditEvent = apps.get_model('audit', 'AuditEvent')
+    schema_editor.delete_model(AuditEvent)
+    # The primary key of a partitioned table has to include the partition key
+    schema_editor.execute(PARTITIONED_TABLE)
+    for index in AuditEvent._meta.indexes:
+        schema_editor.add_index(AuditEvent, index)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('action', models.CharField(max_length=50)),
+                ('actor_id', models.BigIntegerField(blank=True, null=True)),
+                ('object_id', models.BigIntegerField(blank=True, null=True)),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+            options={
+                'ordering': ['-timestamp', '-id'],
+                'indexes': [models.Index(fields=['timestamp'], name='audit_timestamp_idx'), models.Index(fields=['actor_id', 'timestamp'], name='audit_actor_idx'), models.Index(fields=['object_id', 'timestamp'], name='audit_object_idx')],
+            },
+        ),
+        # Reversing CreateModel drops the partitioned table as well
+        migrations.RunPython(partition_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class AuditEvent(models.Model):
+    """
+    Who changed what, written in batches by audit.log and never updated.
+
+    On PostgreSQL the table is partitioned by month on `timestamp` (see
+    audit.partitions), so time-range queries only scan the matching partitions.
+    """
+    timestamp = models.DateTimeField()
+    action = models.CharField(max_length=50)
+    # Plain ids rather than foreign keys: the log outlives users and books
+    actor_id = models.BigIntegerField(null=True, blank=True)
+    object_id = models.BigIntegerField(null=True, blank=True)
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        ordering = ['-timestamp', '-id']
+        indexes = [
+            models.Index(fields=['timestamp'], name='audit_timestamp_idx'),
+            models.Index(fields=['actor_id', 'timestamp'], name='audit_actor_idx'),
+            models.Index(fields=['object_id', 'timestamp'], name='audit_object_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.timestamp:%Y-%m-%d %H:%M:%S} {self.action} #{self.object_id}'
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Audit events are append-only')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Audit events are append-only')
@@ -0,0 +1,77 @@
+"""
+Monthly partitions of the audit table on PostgreSQL.
+
+The migration creates `audit_auditevent` as a table partitioned by range of
+`timestamp` plus a default partition. Each month gets its own partition,
+created ahead of time by `ensure_partitions` (called by the flusher and by the
+`audit.maintain_partitions` job), and old months are dropped whole by
+`drop_partitions` instead of deleting rows. Other databases keep a plain table.
+"""
+from datetime import datetime, timezone
+
+from django.db import connection
+
+TABLE = 'audit_auditevent'
+
+
+def is_partitioned():
+    return connection.vendor == 'postgresql'
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(moment, months):
+    month = moment.month - 1 + months
+    return moment.replace(year=moment.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def partition_name(start):
+    return f'{TABLE}_{start:%Y_%m}'
+
+
+def existing_partitions():
+    """Names of the monthly partitions"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s AND child.relname <> %s",
+            [TABLE, f'{TABLE}_default'],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def ensure_partitions(moment, ahead=1):
+    """Create the partitions of `moment`'s month and the `ahead` months after it; returns the new names"""
+    if not is_partitioned():
+        return []
+    existing = existing_partitions()
+    created = []
+    start = month_start(moment)
+    for offset in range(ahead + 1):
+        lower, upper = add_months(start, offset), add_months(start, offset + 1)
+        name = partition_name(lower)
+        if name in existing:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" '
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+        created.append(name)
+    return created
+
+
+def drop_partitions(before):
+    """Drop the monthly partitions that end on or before `before`; returns their names"""
+    if not is_partitioned():
+        return []
+    cutoff = partition_name(month_start(before))
+    dropped = sorted(name for name in existing_partitions() if name < cutoff)
+    for name in dropped:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE "{name}"')
+    return dropped
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import AuditEvent
+
+
+class AuditEventSerializer(serializers.ModelSerializer):
+    """Serializer for AuditEvent model"""
+
+    class Meta:
+        model = AuditEvent
+        fields = ['id', 'timestamp', 'action', 'actor_id', 'object_id', 'data']
+
+
+class AuditQuerySerializer(serializers.Serializer):
+    """Validates the audit log query; the time range is required to stay within AUDIT_MAX_QUERY_DAYS"""
+    since = serializers.DateTimeField(required=False, help_text='Defaults to one day before `until`')
+    until = serializers.DateTimeField(required=False, help_text='Defaults to now')
+    action = serializers.CharField(required=False, max_length=50)
+    user = serializers.IntegerField(required=False, help_text='Actor user id')
+    object = serializers.IntegerField(required=False, help_text='Id of the changed book (or branch)')
+    cursor = serializers.CharField(required=False, help_text='`next_cursor` of the previous page')
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=1000, default=100)
+
+    def validate_cursor(self, value):
+        timestamp, _, event_id = value.rpartition('|')
+        try:
+            return serializers.DateTimeField().to_internal_value(timestamp), int(event_id)
+        except (serializers.ValidationError, ValueError):
+            raise serializers.ValidationError('Invalid cursor')
+
+    def validate(self, data):
+        data['until'] = data.get('until') or timezone.now()
+        data['since'] = data.get('since') or data['until'] - timedelta(days=1)
+        if data['since'] > data['until']:
+            raise serializers.ValidationError({'since': 'since must not be after until'})
+        if data['until'] - data['since'] > timedelta(days=settings.AUDIT_MAX_QUERY_DAYS):
+            raise serializers.ValidationError(
+                {'since': f'The time range may cover at most {settings.AUDIT_MAX_QUERY_DAYS} days'}
+            )
+        return data
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.utils import timezone
+
+from jobs.queue import task
+from .partitions import add_months, drop_partitions, ensure_partitions, month_start
+
+
+@task(name='audit.maintain_partitions')
+def maintain_partitions():
+    """Create the coming months' audit partitions and drop those past AUDIT_RETENTION_MONTHS"""
+    now = timezone.now()
+    created = ensure_partitions(now, ahead=settings.AUDIT_PARTITIONS_AHEAD)
+    dropped = []
+    if settings.AUDIT_RETENTION_MONTHS:
+        dropped = drop_partitions(add_months(month_start(now), -settings.AUDIT_RETENTION_MONTHS))
+    return {'created': created, 'dropped': dropped}
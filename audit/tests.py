@@ -0,0 +1,215 @@
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from user.models import User
+from books.models import Book
+from audit import log as audit_log
+from audit.log import AuditBuffer
+from audit.models import AuditEvent
+from audit.partitions import add_months, ensure_partitions, partition_name
+from audit.tasks import maintain_partitions
+from library_app.testing import QueryBudgetMixin
+
+
+class AuditBufferTests(SimpleTestCase):
+    """Test cases for the per-process event buffer"""
+
+    def make_buffer(self):
+        self.written = []
+        self.flushed = threading.Event()
+
+        def writer(events):
+            self.written.append(list(events))
+            self.flushed.set()
+        return AuditBuffer(writer=writer)
+
+    @override_settings(AUDIT_BUFFER_SIZE=3, AUDIT_FLUSH_INTERVAL=3600)
+    def test_flushes_when_full(self):
+        """Test a full buffer is written in one batch by the flusher thread"""
+        buffer = self.make_buffer()
+        buffer.add('a')
+        buffer.add('b')
+        self.assertFalse(self.flushed.wait(0.1))
+        buffer.add('c')
+        self.assertTrue(self.flushed.wait(2))
+        self.assertEqual(self.written, [['a', 'b', 'c']])
+
+    @override_settings(AUDIT_BUFFER_SIZE=1000, AUDIT_FLUSH_INTERVAL=0.05)
+    def test_flushes_on_interval(self):
+        """Test events are written after AUDIT_FLUSH_INTERVAL even when the buffer is not full"""
+        buffer = self.make_buffer()
+        buffer.add('a')
+        self.assertTrue(self.flushed.wait(2))
+        self.assertEqual(self.written, [['a']])
+
+    @override_settings(AUDIT_BUFFER_SIZE=1000, AUDIT_FLUSH_INTERVAL=3600, AUDIT_MAX_BUFFER=3)
+    def test_failed_writes_are_kept_up_to_the_limit(self):
+        """Test events survive a failed write and the oldest are dropped past AUDIT_MAX_BUFFER"""
+        buffer = AuditBuffer(writer=mock.Mock(side_effect=DatabaseError('down')))
+        for event in 'abcd':
+            buffer.add(event)
+        with self.assertLogs('audit.log', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.events, ['b', 'c', 'd'])
+        self.assertEqual(buffer.dropped, 1)
+
+        buffer.writer = mock.Mock()
+        self.assertEqual(buffer.flush(), 3)
+        buffer.writer.assert_called_once_with(['b', 'c', 'd'])
+
+    @override_settings(AUDIT_BUFFER_SIZE=1000, AUDIT_FLUSH_INTERVAL=3600, AUDIT_MAX_BUFFER=3)
+    def test_add_is_capped(self):
+        """Test the buffer stays within AUDIT_MAX_BUFFER while nothing flushes it"""
+        buffer = self.make_buffer()
+        for event in 'abcde':
+            buffer.add(event)
+        self.assertEqual(buffer.events, ['c', 'd', 'e'])
+        self.assertEqual(buffer.dropped, 2)
+
+    @override_settings(AUDIT_BUFFER_SIZE=1000, AUDIT_FLUSH_INTERVAL=0.05)
+    def test_flusher_survives_unexpected_errors(self):
+        """Test a write failing with any exception keeps the events and the flusher thread"""
+        buffer = self.make_buffer()
+        writer, failures = buffer.writer, [ValueError('bad event')]
+
+        def flaky(events):
+            if failures:
+                raise failures.pop()
+            writer(events)
+        buffer.writer = flaky
+        with self.assertLogs('audit.log', 'ERROR'):
+            buffer.add('a')
+            self.assertTrue(self.flushed.wait(2))
+        self.assertEqual(self.written, [['a']])
+        self.assertTrue(buffer.thread.is_alive())
+
+    def test_partition_names(self):
+        """Test monthly partition bounds and names"""
+        start = datetime(2026, 11, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(add_months(start, 2), datetime(2027, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(add_months(start, -11), datetime(2025, 12, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partition_name(start), 'audit_auditevent_2026_11')
+
+
+@override_settings(AUDIT_BUFFER_SIZE=1000, AUDIT_FLUSH_INTERVAL=3600)
+class AuditLogTests(TestCase):
+    """Test cases for auditing the book and loan endpoints"""
+
+    def setUp(self):
+        # A buffer of our own, flushed by the test rather than by a background thread
+        patcher = mock.patch.object(audit_log, 'buffer', AuditBuffer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='AdminPass123!')
+        self.client.force_authenticate(user=self.admin)
+
+    def test_mutations_are_audited_after_commit(self):
+        """Test changes are buffered once committed and written in one batch"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('books'), {'title': 'Audited', 'isbn': '0306406152', 'page_count': 10},
+                                        format='json')
+        book_id = Book.objects.get().id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('books', args=[book_id]), {'page_count': 20})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('borrow_book'), {'book_id': book_id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('return_book'), {'book_id': book_id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(AuditEvent.objects.exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(audit_log.flush(), 4)
+        events = AuditEvent.objects.order_by('id')
+        self.assertEqual([event.action for event in events],
+                         ['book.created', 'book.updated', 'loan.borrowed', 'loan.returned'])
+        self.assertEqual({event.actor_id for event in events}, {self.admin.id})
+        self.assertEqual(events[1].data, {'changes': {'page_count': 20}})
+
+    def test_rolled_back_changes_are_not_audited(self):
+        """Test failed mutations leave no audit event"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('borrow_book'), {'book_id': 999})
+        self.assertEqual(audit_log.flush(), 0)
+
+    def test_events_are_append_only(self):
+        """Test stored events can't be changed or deleted one by one"""
+        event = AuditEvent.objects.create(timestamp=timezone.now(), action='book.created')
+        with self.assertRaises(ValueError):
+            event.save()
+        with self.assertRaises(ValueError):
+            event.delete()
+
+    def test_partition_maintenance_is_a_noop_without_postgres(self):
+        """Test other databases keep a plain table"""
+        self.assertEqual(ensure_partitions(timezone.now()), [])
+        self.assertEqual(maintain_partitions(), {'created': [], 'dropped': []})
+
+
+class AuditQueryTests(QueryBudgetMixin, TestCase):
+    """Test cases for the audit query endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='AdminPass123!')
+        self.now = timezone.now()
+        AuditEvent.objects.bulk_create([
+            AuditEvent(timestamp=self.now - timedelta(hours=hours), action=action, actor_id=actor, object_id=7)
+            for hours, action, actor in [
+                (1, 'loan.borrowed', 1), (2, 'loan.returned', 2), (3, 'loan.borrowed', 1), (30, 'book.created', 1),
+            ]
+        ])
+        self.url = reverse('audit_events')
+
+    def test_superuser_only(self):
+        """Test regular users can't read the audit log"""
+        user = User.objects.create_user(username='reader', email='reader@example.com', password='Pass123!')
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_time_range_and_filters(self):
+        """Test the default range is the last day and filters narrow it down"""
+        self.client.force_authenticate(user=self.admin)
+        data = self.client.get(self.url).data['data']
+        self.assertEqual([event['action'] for event in data['events']], ['loan.borrowed', 'loan.returned', 'loan.borrowed'])
+
+        data = self.client.get(self.url, {'since': (self.now - timedelta(days=2)).isoformat(), 'user': 1,
+                                          'action': 'book.created'}).data['data']
+        self.assertEqual(len(data['events']), 1)
+
+    def test_cursor_pagination(self):
+        """Test pages follow each other without gaps or repeats"""
+        self.client.force_authenticate(user=self.admin)
+        first = self.client.get(self.url, {'limit': 2}).data['data']
+        second = self.client.get(self.url, {'limit': 2, 'cursor': first['next_cursor']}).data['data']
+        self.assertEqual(len(first['events']), 2)
+        self.assertEqual(len(second['events']), 1)
+        self.assertIsNone(second['next_cursor'])
+        ids = [event['id'] for event in first['events'] + second['events']]
+        self.assertEqual(len(set(ids)), 3)
+
+    def test_query_count(self):
+        """Test a page of events is read with a constant number of queries"""
+        self.client.force_authenticate(user=self.admin)
+
+        def add_rows(count):
+            AuditEvent.objects.bulk_create(
+                AuditEvent(timestamp=self.now - timedelta(minutes=1), action='loan.borrowed', actor_id=1, object_id=7)
+                for _ in range(count)
+            )
+
+        self.assertConstantQueries(add_rows, lambda: self.client.get(self.url, {'limit': 200}))
+
+    def test_rejects_wide_ranges(self):
+        """Test queries can't span more than AUDIT_MAX_QUERY_DAYS"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.url, {'since': (self.now - timedelta(days=60)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('since', response.data['errors'])
@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import AuditEventAPIView
+
+urlpatterns = [
+    path('', AuditEventAPIView.as_view(), name='audit_events'),
+]
@@ -0,0 +1,40 @@
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticated
+from library_app.utils import wrap_response
+from library_app.permissions import IsSuperUser
+from .models import AuditEvent
+from .serializers import AuditEventSerializer, AuditQuerySerializer
+
+
+class AuditEventAPIView(APIView):
+    """Audit events in a time range, newest first, paged by cursor"""
+    permission_classes = [IsAuthenticated, IsSuperUser]
+
+    def get(self, request):
+        query = AuditQuerySerializer(data=request.query_params.dict())
+        if not query.is_valid():
+            return wrap_response(success=False, code="invalid_filters", message='Invalid filters', errors=query.errors, status_code=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+
+        # The time range bounds every query, so it only reads the matching partitions
+        events = AuditEvent.objects.filter(timestamp__gte=params['since'], timestamp__lt=params['until'])
+        if params.get('action'):
+            events = events.filter(action=params['action'])
+        if params.get('user') is not None:
+            events = events.filter(actor_id=params['user'])
+        if params.get('object') is not None:
+            events = events.filter(object_id=params['object'])
+        if params.get('cursor'):
+            timestamp, event_id = params['cursor']
+            events = events.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=event_id))
+
+        page = list(events.order_by('-timestamp', '-id')[:params['limit'] + 1])
+        has_more = len(page) > params['limit']
+        page = page[:params['limit']]
+        data = {
+            "events": AuditEventSerializer(page, many=True).data,
+            "next_cursor": f'{page[-1].timestamp.isoformat()}|{page[-1].id}' if has_more else None,
+        }
+        return wrap_response(success=True, code="audit_events_retrieved", data=data, status_code=status.HTTP_200_OK)
@@ -1,21 +1,82 @@
 from django.contrib import admin
-from .models import Book, Loan
+from django.db.models import Q
+from library_app.admin_utils import IndexedDateFieldListFilter, LargeTableAdmin
+from user.models import User
+from .isbn import normalize_isbn
+from .models import Book, Branch, Loan, Transfer
+
+
+def _isbn_or_none(term):
+    try:
+        return normalize_isbn(term)
+    except ValueError:
+        return None
+
+
+@admin.register(Branch)
+class BranchAdmin(admin.ModelAdmin):
+    """Admin interface for Branch model"""
+    list_display = ['name', 'code', 'created']
+    search_fields = ['name', 'code']
 
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(LargeTableAdmin):
     """Admin interface for Book model"""
-    list_display = ['title', 'author', 'isbn', 'page_count', 'availability', 'created']
-    list_filter = ['availability', 'created']
-    search_fields = ['title', 'author', 'isbn']
+    list_display = ['title', 'author', 'isbn', 'page_count', 'availability', 'branch', 'created']
+    list_select_related = ['author', 'branch']
+    list_filter = ['branch', 'availability', ('created', IndexedDateFieldListFilter)]
+    # Searched through get_search_results; also enables the Loan.book autocomplete
+    search_fields = ['title']
+    search_help_text = 'Title prefix, exact ISBN, author username or book id'
+    raw_id_fields = ['author']
+    autocomplete_fields = ['branch']
     ordering = ['-created']
 
+    def get_search_results(self, request, queryset, search_term):
+        """Only lookups an index can answer: title prefix, ISBN-13, username, id"""
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        condition = Q(title__istartswith=term) | Q(author__in=User.objects.filter(username=term))
+        isbn = _isbn_or_none(term)
+        if isbn:
+            condition |= Q(isbn13=isbn)
+        if term.isdigit():
+            condition |= Q(pk=int(term))
+        return queryset.filter(condition), False
+
 
 @admin.register(Loan)
-class LoanAdmin(admin.ModelAdmin):
+class LoanAdmin(LargeTableAdmin):
     """Admin interface for Loan model"""
-    list_display = ['book', 'user', 'loan_date', 'return_date', 'created']
-    list_filter = ['loan_date', 'return_date']
-    search_fields = ['book__title', 'user__username']
+    list_display = ['book', 'user', 'branch', 'loan_date', 'return_date', 'created']
+    list_select_related = ['book', 'user', 'branch']
+    list_filter = ['branch', ('loan_date', IndexedDateFieldListFilter), ('return_date', IndexedDateFieldListFilter)]
+    search_fields = ['user__username']
+    search_help_text = 'Exact username, book ISBN or book id'
+    autocomplete_fields = ['book']
+    raw_id_fields = ['user']
     ordering = ['-loan_date']
-    
\ No newline at end of file
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        condition = Q(user__in=User.objects.filter(username=term))
+        isbn = _isbn_or_none(term)
+        if isbn:
+            condition |= Q(book__in=Book.objects.filter(isbn13=isbn))
+        if term.isdigit():
+            condition |= Q(book_id=int(term))
+        return queryset.filter(condition), False
+
+
+@admin.register(Transfer)
+class TransferAdmin(LargeTableAdmin):
+    """Admin interface for Transfer model"""
+    list_display = ['book', 'from_branch', 'to_branch', 'user', 'created']
+    list_select_related = ['book', 'from_branch', 'to_branch', 'user']
+    list_filter = ['to_branch', ('created', IndexedDateFieldListFilter)]
+    raw_id_fields = ['book', 'user']
+    ordering = ['-created']
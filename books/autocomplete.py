@@ -0,0 +1,146 @@
+"""
+In-process prefix index of book titles for typeahead.
+
+Titles are normalized (accents stripped, case-folded, whitespace collapsed)
+and every suffix starting at a word boundary is kept in one sorted list, so
+"rings" and "lord of" both find "The Lord of the Rings". A lookup is a binary
+search followed by a short scan and never touches the database.
+
+Each worker builds its own index at startup. Book signals keep it current for
+writes made by that worker; writes made elsewhere are picked up by a rebuild in
+the background once the index is older than AUTOCOMPLETE_REFRESH_INTERVAL.
+"""
+import bisect
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+
+
+def normalize_title(title):
+    decomposed = unicodedata.normalize('NFKD', title)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def _word_suffixes(normalized):
+    words = normalized.split(' ')
+    return {' '.join(words[index:]) for index in range(len(words)) if words[index]}
+
+
+class TitleIndex:
+    """Sorted array of title suffixes with the book id of each entry"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rebuilding = threading.Lock()
+        self._keys = []
+        self._ids = []
+        self._titles = {}
+        self.built_at = None
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def build(self, rows):
+        """Replace the index with (book_id, title) rows"""
+        titles = {}
+        entries = []
+        for book_id, title in rows:
+            titles[book_id] = title
+            entries.extend((key, book_id) for key in _word_suffixes(normalize_title(title)))
+        entries.sort()
+        with self._lock:
+            self._keys = [key for key, _ in entries]
+            self._ids = [book_id for _, book_id in entries]
+            self._titles = titles
+            self.built_at = time.monotonic()
+
+    def build_from_db(self):
+        from .models import Book
+        rows = Book.objects.order_by().values_list('id', 'title').iterator(chunk_size=10000)
+        self.build(rows)
+
+    def ensure_built(self):
+        if not self.is_built:
+            with self._lock:
+                if not self.is_built:
+                    self.build_from_db()
+        elif time.monotonic() - self.built_at > settings.AUTOCOMPLETE_REFRESH_INTERVAL:
+            self.refresh_in_background()
+
+    def refresh_in_background(self):
+        """Rebuild in a thread while lookups keep using the current index"""
+        if not self._rebuilding.acquire(blocking=False):
+            return
+
+        def rebuild():
+            from django.db import connection
+            try:
+                self.build_from_db()
+            finally:
+                connection.close()
+                self._rebuilding.release()
+
+        threading.Thread(target=rebuild, daemon=True).start()
+
+    def add(self, book_id, title):
+        with self._lock:
+            self.remove(book_id)
+            self._titles[book_id] = title
+            for key in _word_suffixes(normalize_title(title)):
+                position = bisect.bisect_left(self._keys, key)
+                self._keys.insert(position, key)
+                self._ids.insert(position, book_id)
+
+    def remove(self, book_id):
+        with self._lock:
+            title = self._titles.pop(book_id, None)
+            if title is None:
+                return
+            for key in _word_suffixes(normalize_title(title)):
+                position = bisect.bisect_left(self._keys, key)
+                while position < len(self._keys) and self._keys[position] == key:
+                    if self._ids[position] == book_id:
+                        del self._keys[position]
+                        del self._ids[position]
+                        break
+                    position += 1
+
+    def search(self, prefix, limit=10):
+        """Books whose title has a word sequence starting with `prefix`"""
+        key = normalize_title(prefix)
+        if not key:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect.bisect_left(self._keys, key)
+            while position < len(self._keys) and len(results) < limit:
+                if not self._keys[position].startswith(key):
+                    break
+                book_id = self._ids[position]
+                if book_id not in seen:
+                    seen.add(book_id)
+                    results.append({'id': book_id, 'title': self._titles[book_id]})
+                position += 1
+        return results
+
+
+title_index = TitleIndex()
+
+
+def warm_title_index():
+    """Build the index when a server process starts, without delaying startup"""
+    def warm():
+        from django.db import DatabaseError, connection
+        try:
+            title_index.ensure_built()
+        except DatabaseError:
+            pass  # e.g. not migrated yet; the first lookup builds it instead
+        finally:
+            connection.close()
+
+    threading.Thread(target=warm, daemon=True).start()
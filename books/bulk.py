@@ -0,0 +1,145 @@
+"""
+Bulk changes to the catalogue.
+
+`bulk_update` and `bulk_delete` walk the selected books in primary-key order,
+BULK_BATCH_SIZE at a time. Each batch is its own transaction: it locks its
+rows, changes them with one UPDATE, or with one DELETE per table for a
+delete, and logs them for delta sync, the outbox and the audit log with one
+bulk insert each. However many books are selected, locks are only held for
+one batch, and a failure only rolls back the batch in progress. Neither path
+sends per-row model signals; what their receivers do is done here once per
+batch, and the catalogue cache is invalidated once at the end.
+
+A bulk update sets availability, page count, author and branch. Availability
+follows loans: a bulk update never marks a book on loan available, nor a book
+that isn't on loan unavailable, as that would be the drift
+`reconcile_availability` repairs. A new branch is a transfer, logged like one
+made through the transfer API, and books on loan stay where they are until
+they are returned. Books a change can't apply to are skipped.
+"""
+import operator
+from functools import partial, reduce
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists
+
+from audit import log as audit_log
+from user.dashboard import invalidate_dashboards
+from .autocomplete import title_index
+from .cache import bump_catalogue_version
+from .models import Book, Loan, OutboxEvent, Transfer
+from .outbox import book_payload
+from .reconcile import open_loans
+from .sync import record_changes
+
+# What book.updated events carry
+EVENT_FIELDS = ('id', 'title', 'author_id', 'availability', 'branch_id')
+
+
+def locked_batch(books, after, size):
+    """Lock the next `size` books of `books` after id `after`"""
+    return list(books.filter(pk__gt=after).order_by('pk').select_for_update().only(*EVENT_FIELDS)[:size])
+
+
+def plan_update(books, changes):
+    """(books `changes` will be applied to, books skipped because of their loans)"""
+    books = books.exclude(**changes)
+    on_loan = Exists(open_loans())
+    conflicts = []
+    if 'availability' in changes:
+        conflicts.append(on_loan if changes['availability'] else ~on_loan)
+    if 'branch_id' in changes:
+        conflicts.append(on_loan)
+    if not conflicts:
+        return books, books.none()
+    skip = reduce(operator.or_, conflicts)
+    return books.exclude(skip), books.filter(skip)
+
+
+def transfer_batch(batch, to_branch_id, user):
+    """Log the books of `batch` leaving for `to_branch_id` as transfers; call before changing them"""
+    moving = [book for book in batch if book.branch_id != to_branch_id]
+    Transfer.objects.bulk_create(
+        Transfer(book_id=book.pk, from_branch_id=book.branch_id, to_branch_id=to_branch_id, user=user)
+        for book in moving
+    )
+    OutboxEvent.objects.bulk_create(
+        OutboxEvent(topic='book.transferred', book_id=book.pk,
+                    payload={'from_branch_id': book.branch_id, 'to_branch_id': to_branch_id})
+        for book in moving
+    )
+    for book in moving:
+        audit_log.record('book.transferred', book.pk, user, from_branch_id=book.branch_id, to_branch_id=to_branch_id)
+
+
+def bulk_update(books, changes, user=None, batch_size=None):
+    """Apply `changes` ({column: value}) to the books of `books` that differ; returns how many changed"""
+    batch_size = batch_size or settings.BULK_BATCH_SIZE
+    books, _ = plan_update(books, changes)
+    updated, last = 0, 0
+    while True:
+        with transaction.atomic():
+            # The loan condition is checked again on the locked rows
+            batch = locked_batch(books, last, batch_size)
+            if not batch:
+                break
+            ids = [book.pk for book in batch]
+            if 'branch_id' in changes:
+                transfer_batch(batch, changes['branch_id'], user)
+            Book.objects.filter(pk__in=ids).update(**changes)
+            for book in batch:
+                for field, value in changes.items():
+                    setattr(book, field, value)
+            record_changes(ids)
+            OutboxEvent.objects.bulk_create(
+                OutboxEvent(topic='book.updated', book_id=book.pk, payload=book_payload(book)) for book in batch
+            )
+            audit_log.record('book.bulk_updated', user=user, book_ids=ids, changes=changes)
+        updated += len(ids)
+        last = ids[-1]
+    if updated:
+        bump_catalogue_version()
+    return updated
+
+
+def book_relations():
+    """Every foreign key pointing at Book, including hidden ones (related_name='+')"""
+    return [
+        field for field in Book._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete and (field.one_to_many or field.one_to_one)
+    ]
+
+
+def delete_books(ids):
+    """Delete books `ids` and the rows cascading from them with one DELETE per table"""
+    for relation in book_relations():
+        # Every relation to Book cascades (see BookBulkTests.test_relations_cascade)
+        relation.related_model._base_manager.filter(**{f'{relation.field.name}__in': ids}).delete()
+    # A plain DELETE: QuerySet.delete() would load every book to send post_delete
+    Book.objects.filter(pk__in=ids)._raw_delete(Book.objects.db)
+
+
+def bulk_delete(books, user=None, batch_size=None):
+    """Delete the books of `books` and everything that cascades from them; returns how many were deleted"""
+    batch_size = batch_size or settings.BULK_BATCH_SIZE
+    deleted, last = 0, 0
+    while True:
+        with transaction.atomic():
+            ids = [book.pk for book in locked_batch(books, last, batch_size)]
+            if not ids:
+                break
+            borrowers = set(Loan.objects.filter(book_id__in=ids).values_list('user_id', flat=True).distinct())
+            delete_books(ids)
+            record_changes(ids, deleted=True)
+            OutboxEvent.objects.bulk_create(OutboxEvent(topic='book.deleted', book_id=book_id) for book_id in ids)
+            audit_log.record('book.bulk_deleted', user=user, book_ids=ids)
+            transaction.on_commit(partial(invalidate_dashboards, borrowers))
+        if title_index.is_built:
+            for book_id in ids:
+                title_index.remove(book_id)
+        deleted += len(ids)
+        last = ids[-1]
+    if deleted:
+        bump_catalogue_version()
+    return deleted
@@ -0,0 +1,53 @@
+"""
+Versioned caching of catalogue reads.
+
+Cached catalogue entries embed the current catalogue version in their key.
+Any change to a book bumps the version, which makes every older entry
+unreachable at once instead of deleting keys one by one; the stale entries
+simply expire.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOGUE_VERSION_KEY = 'catalogue:version'
+
+
+def catalogue_version():
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        # Start from the clock so a lost counter never reuses an old version
+        cache.add(CATALOGUE_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(CATALOGUE_VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    """Invalidate every cached catalogue entry"""
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        catalogue_version()
+
+
+def catalogue_cache_key(name, request):
+    """Key for a cached catalogue response, unique per host and query string"""
+    query = sorted(request.query_params.lists())
+    digest = hashlib.sha256(f'{request.get_host()}|{query}'.encode()).hexdigest()
+    return f'catalogue:{catalogue_version()}:{name}:{digest}'
+
+
+def get_catalogue_entry(key):
+    return cache.get(key)
+
+
+def set_catalogue_entry(key, value):
+    cache.set(key, value, settings.CATALOGUE_CACHE_TIMEOUT)
+
+
+def cache_compressed_body(response, key):
+    """Have CompressionMiddleware keep the compressed page in the cache beside the entry"""
+    response.compressed_cache = (key, settings.CATALOGUE_CACHE_TIMEOUT)
+    return response
@@ -0,0 +1,101 @@
+"""
+Book cover images.
+
+Files are stored under a name derived from their content
+(covers/<sha256>.<ext>), so a name never points at different bytes and every
+cover file can be cached by clients for good. Thumbnails are rendered by the
+`books.render_cover` job, which hands each size to a process pool: Pillow's
+resizing is CPU bound and would otherwise hold the GIL of a worker running
+other jobs in threads. The variant names are stored on the book, so listing
+covers needs no storage lookups.
+
+This module must stay importable without Django being set up, because the pool
+processes only import it to run `render_thumbnail`.
+"""
+import hashlib
+import io
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+DIRECTORY = 'covers'
+# What `store` names files: the sha256 of their content and an extension
+NAME_PATTERN = re.compile(r'[0-9a-f]{64}\.(%s)' % '|'.join(FORMATS.values()))
+
+_pool = None
+
+
+def inspect_cover(data):
+    """The file extension of an uploaded cover; raises ValueError when it is not a usable image"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+            image_format, (width, height) = image.format, image.size
+    except (OSError, SyntaxError, Image.DecompressionBombError) as error:
+        raise ValueError('Cover is not a valid image') from error
+    if image_format not in FORMATS:
+        raise ValueError(f'Cover must be one of {", ".join(sorted(FORMATS))}')
+    if width * height > settings.COVER_MAX_PIXELS:
+        raise ValueError(f'Cover must have at most {settings.COVER_MAX_PIXELS} pixels')
+    return FORMATS[image_format]
+
+
+def store(data, extension):
+    """Save `data` under its content hash and return the storage name"""
+    name = f'{DIRECTORY}/{hashlib.sha256(data).hexdigest()}.{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def render_thumbnail(data, width, quality):
+    """WebP of the image scaled down to `width` pixels wide"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, 'WEBP', quality=quality)
+    return output.getvalue()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        # Spawned rather than forked: job workers are threaded, and forking a
+        # threaded process can copy locks held by other threads
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.COVER_THUMBNAIL_PROCESSES, mp_context=multiprocessing.get_context('spawn')
+        )
+    return _pool
+
+
+def render_variants(data):
+    """Store every COVER_THUMBNAIL_SIZES variant of a cover and return {size: name}"""
+    sizes = settings.COVER_THUMBNAIL_SIZES
+    widths = list(sizes.values())
+    quality = [settings.COVER_THUMBNAIL_QUALITY] * len(widths)
+    if settings.COVER_THUMBNAIL_PROCESSES:
+        thumbnails = get_pool().map(render_thumbnail, [data] * len(widths), widths, quality)
+    else:
+        thumbnails = map(render_thumbnail, [data] * len(widths), widths, quality)
+    return {size: store(thumbnail, 'webp') for size, thumbnail in zip(sizes, thumbnails)}
+
+
+def cover_url(name):
+    return f'{settings.COVER_URL}{name.rpartition("/")[2]}'
+
+
+def cover_urls(book):
+    """URLs of a book's cover and of the thumbnails rendered so far, or None"""
+    if not book.cover:
+        return None
+    urls = {'original': cover_url(book.cover.name)}
+    urls.update((size, cover_url(name)) for size, name in book.cover_variants.items())
+    return urls
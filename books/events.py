@@ -0,0 +1,224 @@
+"""
+Live feed of availability changes, served as server-sent events.
+
+The outbox (see books.outbox) already holds one row per committed borrow,
+return and book change, with increasing ids, so it doubles as the event log:
+an event's id is its SSE id and the resume token. Clients reconnecting with
+`Last-Event-ID` (or `?last_event_id=`) are first sent what they missed from the
+table and then continue live. Tokens older than the retained outbox get a
+`reset` event, telling the client to reload the catalogue once.
+
+Each event loop runs a single poller reading new outbox rows every
+SSE_POLL_INTERVAL seconds and fanning them out to its subscribers, so the
+database load does not grow with the number of connected screens.
+"""
+import asyncio
+import json
+import logging
+import weakref
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+TOPICS = ('loan.borrowed', 'loan.returned', 'book.created', 'book.updated', 'book.deleted', 'book.transferred')
+# Put in a subscriber's queue when it fell too far behind; the stream ends and the
+# client resumes from its last event id
+OVERFLOW = object()
+
+
+def event_availability(topic, payload):
+    if topic == 'loan.borrowed':
+        return False
+    if topic == 'loan.returned':
+        return True
+    return payload.get('availability')
+
+
+def event_data(event):
+    return {
+        'id': event.id,
+        'topic': event.topic,
+        'book_id': event.book_id,
+        'available': event_availability(event.topic, event.payload),
+        'payload': event.payload,
+        'created': event.created,
+    }
+
+
+def format_event(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder)
+    return f"id: {data['id']}\nevent: {data['topic']}\ndata: {body}\n\n"
+
+
+class EventFilter:
+    """Per-subscription filter from `?book=1,2&topic=loan.borrowed,loan.returned`"""
+
+    def __init__(self, book_ids=None, topics=None):
+        self.book_ids = book_ids
+        self.topics = topics
+
+    @classmethod
+    def from_query(cls, params):
+        """Build from query parameters; raises ValueError for malformed values"""
+        book_ids = topics = None
+        if params.get('book'):
+            book_ids = {int(value) for value in params['book'].split(',')}
+        if params.get('topic'):
+            topics = set(params['topic'].split(','))
+            if not topics <= set(TOPICS):
+                raise ValueError(f"Unknown topic; expected any of {', '.join(TOPICS)}")
+        return cls(book_ids, topics)
+
+    def matches(self, data):
+        return (
+            (self.book_ids is None or data['book_id'] in self.book_ids)
+            and (self.topics is None or data['topic'] in self.topics)
+        )
+
+
+def settled_before():
+    return timezone.now() - timedelta(seconds=settings.SSE_SETTLE_SECONDS)
+
+
+async def fetch_events(after, limit):
+    """
+    Events after id `after` in id order, up to the first one younger than SSE_SETTLE_SECONDS.
+
+    Ids are taken when a row is inserted, not when it commits, so a transaction
+    holding a lower id may still commit after a higher one was read. Stopping at
+    the young rows keeps the cursor behind any such transaction.
+    """
+    settled = settled_before()
+    events = OutboxEvent.objects.filter(id__gt=after, topic__in=TOPICS).order_by('id')[:limit]
+    data = []
+    async for event in events:
+        if event.created > settled:
+            break
+        data.append(event_data(event))
+    return data
+
+
+async def latest_event_id():
+    """The id the live feed starts after: the newest event not younger than SSE_SETTLE_SECONDS"""
+    settled = settled_before()
+    recent = OutboxEvent.objects.order_by('-id').values_list('id', 'created')[:settings.SSE_BATCH_SIZE]
+    rows = [row async for row in recent]
+    young = [event_id for event_id, created in rows if created > settled]
+    if young:
+        return min(young) - 1
+    return rows[0][0] if rows else 0
+
+
+async def token_expired(token):
+    """Whether events after `token` may already have been purged from the outbox"""
+    oldest = (await OutboxEvent.objects.aaggregate(oldest=Min('id')))['oldest']
+    return oldest is not None and oldest > token + 1
+
+
+class EventBroadcaster:
+    """Polls the outbox for one event loop and hands new events to every subscriber"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.last_id = None
+        self.task = None
+
+    async def subscribe(self):
+        queue = asyncio.Queue(maxsize=settings.SSE_QUEUE_SIZE)
+        if self.task is None or self.task.done():
+            # A feed that went idle starts again from the present, rather than
+            # replaying everything committed meanwhile as live events
+            last_id = await latest_event_id()
+            if self.task is None or self.task.done():
+                self.last_id = last_id
+                self.task = asyncio.create_task(self.poll())
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    async def poll(self):
+        while self.subscribers:
+            try:
+                events = await fetch_events(self.last_id, settings.SSE_BATCH_SIZE)
+            except Exception:
+                logger.exception('Polling the outbox for SSE subscribers failed')
+                await asyncio.sleep(settings.SSE_POLL_INTERVAL)
+                continue
+            for data in events:
+                self.last_id = data['id']
+                for queue in list(self.subscribers):
+                    try:
+                        queue.put_nowait(data)
+                    except asyncio.QueueFull:
+                        self.subscribers.discard(queue)
+                        queue.get_nowait()
+                        queue.put_nowait(OVERFLOW)
+            if len(events) < settings.SSE_BATCH_SIZE:
+                await asyncio.sleep(settings.SSE_POLL_INTERVAL)
+
+
+_broadcasters = weakref.WeakKeyDictionary()
+
+
+def get_broadcaster():
+    loop = asyncio.get_running_loop()
+    if loop not in _broadcasters:
+        _broadcasters[loop] = EventBroadcaster()
+    return _broadcasters[loop]
+
+
+async def missed_events(token, event_filter):
+    """SSE messages for the events after `token`, or a reset when they are gone"""
+    if await token_expired(token):
+        yield 'event: reset\ndata: {}\n\n', None
+        return
+    while True:
+        events = await fetch_events(token, settings.SSE_BATCH_SIZE)
+        for data in events:
+            token = data['id']
+            if event_filter.matches(data):
+                yield format_event(data), token
+        if len(events) < settings.SSE_BATCH_SIZE:
+            return
+
+
+async def event_stream(event_filter, token=None):
+    """The SSE body: missed events since `token`, then live events until SSE_MAX_DURATION"""
+    broadcaster = get_broadcaster()
+    # Subscribe before catching up, so nothing committed in between is lost
+    queue = await broadcaster.subscribe()
+    try:
+        yield f'retry: {settings.SSE_RETRY_MS}\n\n'
+        sent = 0
+        if token is not None:
+            async for message, event_id in missed_events(token, event_filter):
+                sent = event_id or sent
+                yield message
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.SSE_MAX_DURATION
+        while loop.time() < deadline:
+            try:
+                data = await asyncio.wait_for(queue.get(), settings.SSE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if data is OVERFLOW:
+                break
+            # Already sent while catching up
+            if data['id'] <= sent:
+                continue
+            sent = data['id']
+            if event_filter.matches(data):
+                yield format_event(data)
+    finally:
+        broadcaster.unsubscribe(queue)
@@ -0,0 +1,31 @@
+import re
+
+_SEPARATORS = re.compile(r'[\s-]')
+_ISBN10 = re.compile(r'\d{9}[\dX]')
+_ISBN13 = re.compile(r'97[89]\d{10}')
+
+
+def isbn13_check_digit(first_twelve):
+    total = sum(int(digit) * (3 if index % 2 else 1) for index, digit in enumerate(first_twelve))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_isbn(value):
+    """
+    Canonical ISBN-13 for an ISBN-10 or ISBN-13, ignoring hyphens and spaces.
+
+    Raises ValueError when the value is not a well-formed ISBN with a valid
+    check digit.
+    """
+    compact = _SEPARATORS.sub('', str(value)).upper()
+    if _ISBN10.fullmatch(compact):
+        total = sum((10 - index) * (10 if char == 'X' else int(char)) for index, char in enumerate(compact))
+        if total % 11:
+            raise ValueError(f'Invalid ISBN-10 check digit: {value}')
+        first_twelve = '978' + compact[:9]
+        return first_twelve + isbn13_check_digit(first_twelve)
+    if _ISBN13.fullmatch(compact):
+        if compact[-1] != isbn13_check_digit(compact[:12]):
+            raise ValueError(f'Invalid ISBN-13 check digit: {value}')
+        return compact
+    raise ValueError(f'Not an ISBN-10 or ISBN-13: {value}')
@@ -0,0 +1,196 @@
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from books.management.commands.seed_library import TITLE_WORDS
+from books.models import Book
+
+DEFAULT_MIX = 'browse=50,search=25,login=5,borrow=10,return=10'
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, elapsed):
+    """Report for {endpoint: [(latency_seconds, status), ...]} gathered over `elapsed` seconds"""
+    def stats(entries):
+        latencies = sorted(round(latency * 1000, 3) for latency, _ in entries)
+        statuses = defaultdict(int)
+        for _, code in entries:
+            statuses[str(code)] += 1
+        return {
+            'requests': len(entries),
+            'errors': sum(count for code, count in statuses.items() if int(code) == 0 or int(code) >= 500),
+            'rps': round(len(entries) / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'max_ms': latencies[-1] if latencies else None,
+            'status': dict(sorted(statuses.items())),
+        }
+
+    endpoints = {name: stats(entries) for name, entries in sorted(samples.items())}
+    total = stats([entry for entries in samples.values() for entry in entries])
+    return {'endpoints': endpoints, 'total': total}
+
+
+class VirtualUser:
+    """One client thread replaying the scenario mix over a persistent connection"""
+
+    def __init__(self, command, index):
+        self.command = command
+        self.random = random.Random(command.seed * 100003 + index)
+        self.username = f'{command.prefix}_user{self.random.randrange(command.user_count)}'
+        self.token = None
+        self.borrowed = []
+        self.samples = defaultdict(list)
+        parts = command.base
+        connection_class = HTTPSConnection if parts.scheme == 'https' else HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=30)
+
+    def request(self, name, method, path, body=None, authenticated=False):
+        headers = {'Accept': 'application/json'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if authenticated and self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, path, payload, headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            code = response.status
+        except OSError:
+            self.connection.close()
+            data, code = b'', 0
+        self.samples[name].append((time.perf_counter() - start, code))
+        return code, data
+
+    def login(self):
+        code, data = self.request('login', 'POST', '/users/login/', {
+            'username': self.username, 'password': self.command.password,
+        })
+        if code == 200:
+            self.token = json.loads(data)['data']['access']
+
+    def browse(self):
+        page = self.random.randint(1, self.command.browse_pages)
+        self.request('browse', 'GET', '/books/?' + urlencode({'page': page}))
+
+    def search(self):
+        self.request('search', 'GET', '/books/search/?' + urlencode({'title': self.random.choice(TITLE_WORDS)}))
+
+    def borrow(self):
+        book_id = self.random.randint(*self.command.book_range)
+        code, _ = self.request('borrow', 'POST', '/books/borrow/', {'book_id': book_id}, authenticated=True)
+        if code == 200:
+            self.borrowed.append(book_id)
+
+    def return_book(self):
+        if self.borrowed:
+            book_id = self.borrowed.pop(self.random.randrange(len(self.borrowed)))
+        else:
+            book_id = self.random.randint(*self.command.book_range)
+        self.request('return', 'POST', '/books/return/', {'book_id': book_id}, authenticated=True)
+
+    def run(self, deadline):
+        self.login()
+        actions = {
+            'browse': self.browse, 'search': self.search, 'login': self.login,
+            'borrow': self.borrow, 'return': self.return_book,
+        }
+        names, weights = zip(*self.command.mix.items())
+        while time.monotonic() < deadline:
+            actions[self.random.choices(names, weights)[0]]()
+        self.connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay a weighted mix of browse, search, login, borrow and return calls against '
+        'a running server and write a JSON latency/throughput report. Expects data from '
+        'seed_library in the database the server uses.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to run')
+        parser.add_argument('--concurrency', type=int, default=16, help='Number of client threads')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Scenario weights, e.g. "%s"' % DEFAULT_MIX)
+        parser.add_argument('--prefix', default='load', help='Username prefix used by seed_library')
+        parser.add_argument('--password', default='LoadTest123!')
+        parser.add_argument('--users', type=int, default=10000, help='Number of seeded users to log in as')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the report here instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            self.mix = {
+                name.strip(): float(weight)
+                for name, weight in (item.split('=') for item in options['mix'].split(','))
+            }
+        except ValueError:
+            raise CommandError('--mix must look like "browse=50,search=25"')
+        unknown = set(self.mix) - {'browse', 'search', 'login', 'borrow', 'return'}
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+        bounds = Book.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            raise CommandError('No books found; run seed_library first')
+        self.book_range = (bounds['low'], bounds['high'])
+        self.browse_pages = max(min(Book.objects.count() // 10, 1000), 1)
+        self.base = urlsplit(options['base_url'])
+        self.prefix = options['prefix']
+        self.password = options['password']
+        self.user_count = options['users']
+        self.seed = options['seed']
+
+        clients = [VirtualUser(self, index) for index in range(options['concurrency'])]
+        started_at = timezone.now()
+        deadline = time.monotonic() + options['duration']
+        started = time.monotonic()
+        threads = [threading.Thread(target=client.run, args=(deadline,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        samples = defaultdict(list)
+        for client in clients:
+            for name, entries in client.samples.items():
+                samples[name].extend(entries)
+
+        report = {
+            'started_at': started_at.isoformat(),
+            'base_url': options['base_url'],
+            'duration_s': round(elapsed, 2),
+            'concurrency': options['concurrency'],
+            'mix': self.mix,
+            'seed': self.seed,
+            **summarize(samples, elapsed),
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
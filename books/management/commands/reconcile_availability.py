@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from audit import log as audit_log
+from books.reconcile import Reconciliation
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare book availability with open loans in chunks of book ids and report the '
+        'books that disagree; --repair fixes them. An interrupted run resumes where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='Fix the availability of drifted books')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Book ids per chunk')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Chunks checked in parallel, each on its own connection')
+        parser.add_argument('--state', default=settings.RECONCILE_STATE,
+                            help='Checkpoint file of an interrupted run')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start over')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        if options['restart']:
+            Reconciliation.discard(options['state'])
+        started = time.monotonic()
+        reconciliation = Reconciliation(state_path=options['state'], chunk_size=options['chunk_size'],
+                                        workers=options['workers'], fix=options['repair'])
+        if reconciliation.resumed:
+            self.stdout.write(f'Resuming after book {reconciliation.state["done_below"]}')
+        state = reconciliation.run(progress=self.progress if options['verbosity'] > 1 else None)
+        audit_log.flush()
+
+        for issue in Reconciliation.ISSUES:
+            examples = ', '.join(str(book_id) for book_id in state['examples'][issue])
+            self.stdout.write(f'{issue}: {state["counts"][issue]}' + (f' (e.g. {examples})' if examples else ''))
+        if options['repair']:
+            self.stdout.write(f'repaired: {state["counts"]["repaired"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked books up to {state["upto"]} in {time.monotonic() - started:.1f}s'
+        ))
+
+    def progress(self, start, end, result):
+        drifted = sum(len(result[issue]) for issue in Reconciliation.ISSUES)
+        self.stdout.write(f'books {start}-{end - 1}: {drifted} drifted, {len(result["repaired"])} repaired')
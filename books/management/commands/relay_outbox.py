@@ -0,0 +1,71 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from books.outbox import RelayError, get_sink, purge_delivered, relay_batch, unpark
+
+
+class Command(BaseCommand):
+    help = (
+        'Deliver pending outbox events to OUTBOX_SINK in batches. Run one relay per '
+        'shard (e.g. --shard 0/2 and --shard 1/2) to keep per-book ordering.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep when there is nothing to deliver')
+        parser.add_argument('--max-backoff', type=float, default=60.0,
+                            help='Longest pause after repeated sink failures')
+        parser.add_argument('--shard', help='INDEX/COUNT, e.g. 0/4')
+        parser.add_argument('--once', action='store_true', help='Drain pending events and exit')
+        parser.add_argument('--unpark', action='store_true',
+                            help='Queue events parked after OUTBOX_MAX_ATTEMPTS failures again and exit')
+
+    def handle(self, *args, **options):
+        if options['unpark']:
+            self.stdout.write(self.style.SUCCESS(f'Unparked {unpark()} events'))
+            return
+
+        shard = None
+        if options['shard']:
+            try:
+                index, count = (int(part) for part in options['shard'].split('/'))
+            except ValueError:
+                raise CommandError('--shard must look like 0/4')
+            if not 0 <= index < count:
+                raise CommandError('--shard index must be below the shard count')
+            shard = (index, count)
+
+        sink = get_sink()
+        failures = 0
+        delivered_total = 0
+        last_purge = 0.0
+        while True:
+            close_old_connections()
+            try:
+                delivered = relay_batch(sink, options['batch_size'], shard)
+                failures = 0
+            except RelayError as error:
+                failures += 1
+                delivered = 0
+                self.stderr.write(f'{error}: {error.__cause__}')
+                if options['once']:
+                    raise CommandError(str(error))
+                time.sleep(min(options['interval'] * 2 ** failures, options['max_backoff']))
+                continue
+            delivered_total += delivered
+
+            if time.monotonic() - last_purge > 3600:
+                purge_delivered(timezone.now() - timedelta(days=settings.OUTBOX_RETENTION_DAYS))
+                last_purge = time.monotonic()
+
+            if delivered < options['batch_size']:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Delivered {delivered_total} events'))
@@ -0,0 +1,163 @@
+import io
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from books.cache import bump_catalogue_version
+from books.isbn import isbn13_check_digit
+from books.models import Book, BookChange, Loan
+from user.models import User
+
+TITLE_WORDS = [
+    'ancient', 'atlas', 'autumn', 'bridge', 'castle', 'city', 'code', 'crown', 'dark', 'dawn',
+    'desert', 'dream', 'echo', 'empire', 'field', 'fire', 'forest', 'garden', 'ghost', 'glass',
+    'gold', 'harbor', 'history', 'house', 'island', 'journey', 'kingdom', 'lake', 'last', 'light',
+    'lost', 'memory', 'midnight', 'moon', 'mountain', 'night', 'ocean', 'orchard', 'paper', 'path',
+    'python', 'queen', 'rain', 'river', 'road', 'secret', 'shadow', 'silent', 'silver', 'sky',
+    'song', 'star', 'stone', 'storm', 'summer', 'sun', 'tale', 'tide', 'tower', 'winter',
+]
+
+# Columns written per table. COPY leaves out the rest, so these must cover every
+# NOT NULL column without a database default (see LoadTestToolingTests)
+USER_COLUMNS = ['username', 'email', 'password', 'first_name', 'last_name', 'is_superuser', 'is_staff',
+                'is_active', 'date_joined', 'created', 'modified']
+BOOK_COLUMNS = ['title', 'author_id', 'isbn', 'isbn13', 'page_count', 'availability', 'cover',
+                'cover_variants', 'created', 'modified']
+BOOK_CHANGE_COLUMNS = ['book_id', 'deleted', 'created', 'modified']
+LOAN_COLUMNS = ['book_id', 'user_id', 'loan_date', 'return_date', 'created', 'modified']
+COLUMNS = {User: USER_COLUMNS, Book: BOOK_COLUMNS, BookChange: BOOK_CHANGE_COLUMNS, Loan: LOAN_COLUMNS}
+
+
+def isbn13(number):
+    """Valid ISBN-13 in the 978 prefix for a sequence number below 10**9"""
+    digits = f'978{number:09d}'
+    return digits + isbn13_check_digit(digits)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic users, books and loans for load testing. Uses COPY on '
+        'PostgreSQL and batched bulk inserts elsewhere.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--books', type=int, default=100000)
+        parser.add_argument('--loans', type=int, default=200000)
+        parser.add_argument('--authors', type=int, default=10, help='Superusers owning the books')
+        parser.add_argument('--open-ratio', type=float, default=0.1,
+                            help='Share of loans that are still open')
+        parser.add_argument('--batch-size', type=int, default=50000)
+        parser.add_argument('--prefix', default='load', help='Username prefix of seeded users')
+        parser.add_argument('--password', default='LoadTest123!', help='Password of every seeded user')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for reproducible data')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql'
+        started = time.monotonic()
+
+        password = make_password(options['password'])
+        prefix = options['prefix']
+        now = timezone.now()
+
+        author_ids = self.insert(User, (
+            (f'{prefix}_author{n}', f'{prefix}_author{n}@example.com', password, 'Author', str(n),
+             True, True, True, now, now, now)
+            for n in range(options['authors'])
+        ))
+        user_ids = self.insert(User, (
+            (f'{prefix}_user{n}', f'{prefix}_user{n}@example.com', password, 'User', str(n),
+             False, False, True, now, now, now)
+            for n in range(options['users'])
+        ))
+        self.stdout.write(f'{len(author_ids) + len(user_ids)} users')
+
+        # Decide up front which books are on loan so availability matches the open loans
+        book_count = options['books']
+        open_count = min(int(options['loans'] * options['open_ratio']), book_count)
+        on_loan = set(self.random.sample(range(book_count), open_count))
+        book_ids = self.insert(Book, self.book_rows(book_count, on_loan, author_ids, now))
+        self.stdout.write(f'{len(book_ids)} books')
+        # Log the new books for delta sync, which the skipped post_save signals would do
+        self.insert(BookChange, ((book_id, False, now, now) for book_id in book_ids))
+
+        open_books = [book_ids[n] for n in sorted(on_loan)]
+        loan_ids = self.insert(Loan, self.loan_rows(options['loans'], open_books, book_ids, user_ids, now))
+        self.stdout.write(f'{len(loan_ids)} loans')
+        # Bulk inserts skip the model signals that normally invalidate cached pages
+        bump_catalogue_version()
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.monotonic() - started:.1f}s'))
+
+    def book_rows(self, count, on_loan, author_ids, now):
+        # Number ISBNs after the highest existing id so repeated runs stay unique
+        offset = Book.objects.aggregate(Max('id'))['id__max'] or 0
+        for n in range(count):
+            isbn = isbn13(offset + n)
+            yield (' '.join(self.random.choices(TITLE_WORDS, k=self.random.randint(2, 4))).title(),
+                   self.random.choice(author_ids), isbn, isbn, self.random.randint(40, 1200),
+                   n not in on_loan, '', {}, now - timedelta(days=self.random.randint(0, 3650)), now)
+
+    def loan_rows(self, count, open_books, book_ids, user_ids, now):
+        for book_id in open_books:
+            loaned = now - timedelta(days=self.random.randint(0, 30))
+            yield (book_id, self.random.choice(user_ids), loaned, None, loaned, loaned)
+        for _ in range(count - len(open_books)):
+            loaned = now - timedelta(days=self.random.randint(31, 3650))
+            returned = loaned + timedelta(days=self.random.randint(1, 30))
+            yield (self.random.choice(book_ids), self.random.choice(user_ids), loaned, returned,
+                   loaned, returned)
+
+    def insert(self, model, rows):
+        """Insert rows of COLUMNS[model] in batches and return the new primary keys in insertion order"""
+        columns = COLUMNS[model]
+        last_id = model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.write_batch(model, columns, batch)
+                batch = []
+        if batch:
+            self.write_batch(model, columns, batch)
+        # Seeding is expected to run alone, so the new rows are the ones after last_id
+        return list(model.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True))
+
+    @staticmethod
+    def copy_value(value):
+        """`value` in COPY's text format"""
+        if value is None:
+            return r'\N'
+        if isinstance(value, dict):
+            return json.dumps(value)
+        return str(value)
+
+    @transaction.atomic
+    def write_batch(self, model, columns, batch):
+        if self.use_copy:
+            buffer = io.StringIO()
+            for row in batch:
+                buffer.write('\t'.join(self.copy_value(value) for value in row))
+                buffer.write('\n')
+            buffer.seek(0)
+            sql = f'COPY {model._meta.db_table} ({", ".join(columns)}) FROM STDIN'
+            with connection.cursor() as cursor:
+                raw = cursor.cursor
+                if hasattr(raw, 'copy_expert'):
+                    raw.copy_expert(sql, buffer)  # psycopg2
+                else:
+                    with raw.copy(sql) as copy:  # psycopg 3
+                        copy.write(buffer.getvalue())
+        else:
+            # bulk_create applies auto_now_add, so historical dates are only kept with COPY
+            model.objects.bulk_create(
+                (model(**dict(zip(columns, row))) for row in batch), batch_size=self.batch_size
+            )
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:51
+
+from django.db import migrations, models
+
+from books.isbn import normalize_isbn
+
+
+def backfill_isbn13(apps, schema_editor):
+    """Normalize existing ISBNs; later duplicates of an ISBN are left empty"""
+    Book = apps.get_model('books', 'Book')
+    seen = set()
+    batch = []
+    for book in Book.objects.order_by('id').only('id', 'isbn').iterator(chunk_size=5000):
+        try:
+            isbn13 = normalize_isbn(book.isbn)
+        except ValueError:
+            continue
+        if isbn13 in seen:
+            continue
+        seen.add(isbn13)
+        book.isbn13 = isbn13
+        batch.append(book)
+        if len(batch) >= 5000:
+            Book.objects.bulk_update(batch, ['isbn13'])
+            batch = []
+    Book.objects.bulk_update(batch, ['isbn13'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_catalogue_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='isbn13',
+            field=models.CharField(blank=True, editable=False, max_length=13, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_isbn13, migrations.RunPython.noop),
+    ]
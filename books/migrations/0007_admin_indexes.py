@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_title_prefix_index(apps, schema_editor):
+    """Let admin title searches (UPPER(title) LIKE 'X%') use an index on PostgreSQL"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS book_title_prefix_idx '
+            'ON books_book (UPPER(title::text) text_pattern_ops)'
+        )
+
+
+def drop_title_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS book_title_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_outboxevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['-loan_date'], name='loan_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['return_date'], name='loan_return_date_idx'),
+        ),
+        migrations.RunPython(create_title_prefix_index, drop_title_prefix_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:27
+
+from django.db import migrations, models
+
+
+def log_existing_books(apps, schema_editor):
+    # Existing books start in the log so a first sync returns the whole catalogue
+    Book = apps.get_model('books', 'Book')
+    BookChange = apps.get_model('books', 'BookChange')
+    book_ids = Book.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=5000)
+    batch = []
+    for book_id in book_ids:
+        batch.append(BookChange(book_id=book_id))
+        if len(batch) >= 5000:
+            BookChange.objects.bulk_create(batch)
+            batch = []
+    BookChange.objects.bulk_create(batch)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, null=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('book_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['book_id'], name='book_change_book_idx'), models.Index(condition=models.Q(('deleted', True)), fields=['created'], name='book_change_tombstone_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_books, migrations.RunPython.noop),
+    ]
@@ -1,27 +1,163 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from user.models import User , Base
+from .isbn import normalize_isbn
 
 # Book model containing fields such as title, author, ISBN, page count, availability, etc.
 # Loan model to track which user borrowed which book and when.
 
+class Branch(Base):
+    """A library location holding its own copies and booking its own loans"""
+    code = models.SlugField(max_length=32, unique=True)
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
 class Book(Base):
     title = models.CharField(max_length=255)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     isbn = models.CharField(max_length=255)
+    # Canonical ISBN-13 derived from `isbn` on save; empty when `isbn` is not a valid ISBN
+    isbn13 = models.CharField(max_length=13, unique=True, null=True, blank=True, editable=False)
     page_count = models.IntegerField()
     availability = models.BooleanField(default=True)
+    # Holding branch, null for books not assigned to one; indexed by the composite branch indexes
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, null=True, blank=True,
+                               related_name='books', db_index=False)
+    # Stored under a content-hashed name by books.covers; thumbnails are rendered by a job
+    cover = models.ImageField(upload_to='covers/', blank=True)
+    # Thumbnail size -> storage name, filled in once the thumbnails exist
+    cover_variants = models.JSONField(default=dict, blank=True)
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            # Catalogue filters; each also serves the default newest-first ordering
+            models.Index(fields=['-created'], name='book_created_idx'),
+            models.Index(fields=['availability', '-created'], name='book_availability_idx'),
+            models.Index(fields=['author', '-created'], name='book_author_idx'),
+            models.Index(fields=['page_count'], name='book_page_count_idx'),
+            # Branch-scoped catalogue and search; per-branch queries only touch that branch's rows
+            models.Index(fields=['branch', '-created'], name='book_branch_idx'),
+            models.Index(fields=['branch', 'availability', '-created'], name='book_branch_availability_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        try:
+            self.isbn13 = normalize_isbn(self.isbn)
+        except ValueError:
+            self.isbn13 = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'isbn' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'isbn13'}
+        super().save(*args, **kwargs)
+
 class Loan(Base):
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     loan_date = models.DateTimeField(auto_now_add=True)
     return_date = models.DateTimeField(null=True, blank=True)
-    
+    # Branch the book was borrowed from
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, null=True, blank=True,
+                               related_name='loans', db_index=False)
+
+    class Meta:
+        indexes = [
+            # Admin ordering and date filters
+            models.Index(fields=['-loan_date'], name='loan_date_idx'),
+            models.Index(fields=['return_date'], name='loan_return_date_idx'),
+            models.Index(fields=['branch', '-loan_date'], name='loan_branch_idx'),
+        ]
+
+    def __str__(self):
+        return self.book.title
+
+    @property
+    def due_date(self):
+        return self.loan_date + timedelta(days=settings.LOAN_PERIOD_DAYS)
+
+
+class Transfer(Base):
+    """A book moved from one branch to another"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='transfers')
+    from_branch = models.ForeignKey(Branch, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    to_branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created']
+        indexes = [
+            models.Index(fields=['-created'], name='transfer_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.book_id}: {self.from_branch_id} -> {self.to_branch_id}'
+
+
+class BookRecommendation(models.Model):
+    """A book often borrowed by patrons who borrowed `book`; written by the books.update_recommendations job"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='recommendations', db_index=False)
+    recommended = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    # Patrons who borrowed both books
+    score = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['book', 'rank']
+        constraints = [
+            # Also the index behind the one-query lookup of a book's recommendations
+            models.UniqueConstraint(fields=['book', 'rank'], name='recommendation_book_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.book_id} -> {self.recommended_id}'
+
+
+class OutboxEvent(Base):
+    """Change notification for downstream systems, written in the same transaction as the change"""
+    topic = models.CharField(max_length=50)
+    # Plain id rather than a foreign key: events outlive deleted books
+    book_id = models.BigIntegerField()
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Set when the event failed OUTBOX_MAX_ATTEMPTS times; parked events are not relayed
+    parked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(delivered_at__isnull=True, parked_at__isnull=True),
+                         name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.topic} #{self.book_id}'
+
+
+class BookChange(Base):
+    """Latest change of a book for delta sync; the id is the change sequence"""
+    # Plain id rather than a foreign key: tombstones outlive deleted books
+    book_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['book_id'], name='book_change_book_idx'),
+            models.Index(fields=['created'], condition=models.Q(deleted=True), name='book_change_tombstone_idx'),
+        ]
+
     def __str__(self):
-        return self.book.title
\ No newline at end of file
+        return f'{"deleted" if self.deleted else "changed"} #{self.book_id}'
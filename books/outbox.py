@@ -0,0 +1,134 @@
+"""
+Transactional outbox for loan and catalogue changes.
+
+Views call `record_event` inside the transaction that changes a loan or a book,
+so an event exists exactly when the change committed. The `relay_outbox` command
+drains pending events in id order and hands them to the sink named by
+OUTBOX_SINK; events are only marked delivered after the sink accepted them, so
+delivery is at-least-once and consumers should de-duplicate on the event id.
+
+The sink is called outside any transaction, so a slow sink holds no locks.
+When a batch fails, its first event is retried on its own until it goes
+through or has failed OUTBOX_MAX_ATTEMPTS times; it is then parked (set aside
+with its last error) and the events behind it flow again. `relay_outbox
+--unpark` queues parked events for delivery again.
+"""
+import json
+import urllib.request
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.db.models.functions import Mod
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+
+
+class RelayError(Exception):
+    """The sink failed; the batch stays pending"""
+
+
+def record_event(topic, book_id, **payload):
+    """Queue an event; call inside the transaction making the change"""
+    return OutboxEvent.objects.create(topic=topic, book_id=book_id, payload=payload)
+
+
+def book_payload(book):
+    return {'title': book.title, 'author_id': book.author_id, 'availability': book.availability,
+            'branch_id': book.branch_id}
+
+
+def record_book_event(topic, book):
+    """Queue a book.created / book.updated event carrying the book's current state"""
+    return record_event(topic, book.id, **book_payload(book))
+
+
+def serialize_event(event):
+    return {
+        'id': event.id,
+        'topic': event.topic,
+        'book_id': event.book_id,
+        'payload': event.payload,
+        'created': event.created,
+    }
+
+
+class FileSink:
+    """Append events as JSON lines to OUTBOX_FILE"""
+
+    def __init__(self, path=None):
+        self.path = path or settings.OUTBOX_FILE
+
+    def send(self, events):
+        with open(self.path, 'a') as handle:
+            for event in events:
+                handle.write(json.dumps(event, cls=DjangoJSONEncoder) + '\n')
+
+
+class HTTPSink:
+    """POST each batch as {"events": [...]} to OUTBOX_HTTP_URL"""
+
+    def __init__(self, url=None, timeout=10):
+        self.url = url or settings.OUTBOX_HTTP_URL
+        self.timeout = timeout
+
+    def send(self, events):
+        body = json.dumps({'events': events}, cls=DjangoJSONEncoder).encode()
+        request = urllib.request.Request(
+            self.url, data=body, method='POST', headers={'Content-Type': 'application/json'}
+        )
+        # urlopen raises for non-2xx responses, leaving the batch pending
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def get_sink():
+    return import_string(settings.OUTBOX_SINK)()
+
+
+def relay_batch(sink, batch_size=500, shard=None):
+    """
+    Deliver up to `batch_size` pending events in id order and return how many went out.
+
+    Per-book order holds with one relay per shard: `shard=(index, count)` limits
+    the relay to books whose id modulo `count` equals `index`.
+    """
+    pending = OutboxEvent.objects.filter(delivered_at__isnull=True, parked_at__isnull=True).order_by('id')
+    if shard is not None:
+        index, count = shard
+        pending = pending.annotate(shard=Mod('book_id', count)).filter(shard=index)
+    events = list(pending[:batch_size])
+    if not events:
+        return 0
+    head = events[0]
+    if head.attempts:
+        # The last batch failed: find out whether this event is the one the sink rejects
+        events = [head]
+
+    try:
+        sink.send([serialize_event(event) for event in events])
+    except Exception as error:
+        # Only the first event is charged: the batch is retried from it, so later
+        # events of a book never overtake earlier ones unless it gets parked
+        failed = {'attempts': F('attempts') + 1, 'last_error': str(error)[:1000]}
+        if head.attempts + 1 >= settings.OUTBOX_MAX_ATTEMPTS:
+            failed['parked_at'] = timezone.now()
+        OutboxEvent.objects.filter(id=head.id).update(**failed)
+        raise RelayError(f'Sink rejected {len(events)} events') from error
+    OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(delivered_at=timezone.now())
+    return len(events)
+
+
+def unpark():
+    """Queue parked events for delivery again; returns how many"""
+    return OutboxEvent.objects.filter(delivered_at__isnull=True, parked_at__isnull=False).update(
+        parked_at=None, attempts=0
+    )
+
+
+def purge_delivered(older_than):
+    """Delete delivered events created before `older_than`"""
+    deleted, _ = OutboxEvent.objects.filter(delivered_at__isnull=False, created__lt=older_than).delete()
+    return deleted
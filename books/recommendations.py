@@ -0,0 +1,215 @@
+"""
+"Borrowed together" recommendations.
+
+The co-occurrence matrix C is U^T U with the diagonal cleared, where U is the
+patron-by-book matrix of who ever borrowed what (1 per pair, however often),
+so C[a, b] counts the patrons who borrowed both a and b. It is kept as a scipy
+sparse matrix in RECOMMENDATIONS_STATE together with the last loan id it has
+seen. Each run only reads the loans after that id: with D holding the patron/book
+pairs they add to U, the update is
+
+    C' = C + D^T U + U^T D + D^T D
+
+where only the rows of patrons who borrowed since the last run are non-zero, so
+the work follows the new loans rather than the whole history. The top
+RECOMMENDATIONS_TOP_N neighbours of every book whose row changed are then
+written to BookRecommendation, which the API reads with one indexed query.
+
+Loans younger than RECOMMENDATIONS_SETTLE_SECONDS are left for the next run:
+ids are taken on insert, so a loan with a lower id may still be committing and
+would otherwise be skipped for good. Only one update runs at a time (an
+advisory lock on PostgreSQL, a process lock elsewhere); a run that finds
+another one going returns at once, as that one covers the same loans.
+
+Needs numpy and scipy; only the job imports this module, so web workers never
+load them.
+"""
+import itertools
+import os
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Book, BookRecommendation, Loan
+
+WRITE_CHUNK = 1000
+LOCK_KEY = zlib.crc32(b'books.update_recommendations')
+
+_process_lock = threading.Lock()
+
+
+@contextmanager
+def exclusive_run():
+    """Yield whether this caller may run an update, with no other update running meanwhile"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [LOCK_KEY])
+            acquired = cursor.fetchone()[0]
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_unlock(%s)', [LOCK_KEY])
+    else:
+        acquired = _process_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                _process_lock.release()
+
+
+def load_state(path):
+    """(co-occurrence matrix, last loan id, books whose recommendations are stale)"""
+    if not os.path.exists(path):
+        return sparse.csr_matrix((0, 0), dtype=np.int64), 0, np.array([], dtype=np.int64)
+    with np.load(path) as state:
+        matrix = sparse.csr_matrix(
+            (state['data'], state['indices'], state['indptr']), shape=tuple(state['shape'])
+        )
+        return matrix, int(state['last_loan_id']), state['dirty']
+
+
+def save_state(path, matrix, last_loan_id, dirty):
+    """Write the state atomically, so a crash leaves the previous state intact"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory or None, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as handle:
+            np.savez(handle, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                     shape=np.array(matrix.shape), last_loan_id=last_loan_id, dirty=dirty)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def loan_pairs(loans):
+    """(user_id, book_id) pairs of a Loan queryset as an (n, 2) array"""
+    rows = loans.order_by().values_list('user_id', 'book_id').iterator(chunk_size=10000)
+    return np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64).reshape(-1, 2)
+
+
+def patron_matrix(pairs, users, size):
+    """Binary users x books matrix of `pairs`, with rows in the order of `users`"""
+    rows = np.searchsorted(users, pairs[:, 0])
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int64), (rows, pairs[:, 1])), shape=(len(users), size)
+    )
+    # Duplicate loans of the same book were summed; a patron counts once
+    matrix.data[:] = 1
+    return matrix
+
+
+def resize(matrix, size):
+    if matrix.shape[0] >= size:
+        return matrix
+    matrix = matrix.tocoo()
+    return sparse.csr_matrix((matrix.data, (matrix.row, matrix.col)), shape=(size, size))
+
+
+def cooccurrence_delta(old_pairs, new_pairs, size):
+    """Change of C caused by `new_pairs`, given the earlier loans of the same patrons"""
+    users = np.unique(new_pairs[:, 0])
+    old = patron_matrix(old_pairs, users, size)
+    new = patron_matrix(new_pairs, users, size)
+    # Pairs that were already in U add nothing
+    added = new - new.multiply(old)
+    added.eliminate_zeros()
+    delta = (added.T @ old + old.T @ added + added.T @ added).tocoo()
+    # A book is not its own neighbour
+    off_diagonal = delta.row != delta.col
+    return sparse.csr_matrix(
+        (delta.data[off_diagonal], (delta.row[off_diagonal], delta.col[off_diagonal])), shape=delta.shape
+    )
+
+
+def top_neighbours(matrix, books, alive, limit):
+    """(book, neighbour, rank, score) arrays of the `limit` best neighbours of `books`"""
+    rows = matrix[books].tocoo()
+    book, neighbour, score = books[rows.row], rows.col, rows.data
+    keep = alive[neighbour]
+    book, neighbour, score = book[keep], neighbour[keep], score[keep]
+    # Group by book, best score first, lower id first on ties
+    order = np.lexsort((neighbour, -score, book))
+    book, neighbour, score = book[order], neighbour[order], score[order]
+    first = np.searchsorted(book, book)
+    rank = np.arange(len(book)) - first
+    keep = rank < limit
+    return book[keep], neighbour[keep], rank[keep], score[keep]
+
+
+def write_recommendations(matrix, books):
+    """Replace the stored recommendations of `books`"""
+    existing = np.fromiter(Book.objects.order_by().values_list('id', flat=True).iterator(chunk_size=10000),
+                           dtype=np.int64)
+    alive = np.zeros(matrix.shape[0], dtype=bool)
+    alive[existing[existing < matrix.shape[0]]] = True
+    books = books[alive[books]]
+    for start in range(0, len(books), WRITE_CHUNK):
+        chunk = books[start:start + WRITE_CHUNK]
+        rows = top_neighbours(matrix, chunk, alive, settings.RECOMMENDATIONS_TOP_N)
+        with transaction.atomic():
+            BookRecommendation.objects.filter(book_id__in=chunk.tolist()).delete()
+            BookRecommendation.objects.bulk_create(
+                BookRecommendation(book_id=book, recommended_id=neighbour, rank=rank, score=score)
+                for book, neighbour, rank, score in zip(*(column.tolist() for column in rows))
+            )
+
+
+def settled_loan_id(after):
+    """The highest loan id up to which every loan is older than RECOMMENDATIONS_SETTLE_SECONDS"""
+    settled = timezone.now() - timedelta(seconds=settings.RECOMMENDATIONS_SETTLE_SECONDS)
+    young = Loan.objects.filter(id__gt=after, loan_date__gt=settled).aggregate(Min('id'))['id__min']
+    if young is not None:
+        return young - 1
+    return Loan.objects.aggregate(Max('id'))['id__max'] or 0
+
+
+def update_recommendations(path=None, rebuild=False):
+    """Fold the loans made since the last run into the matrix and refresh the affected books"""
+    with exclusive_run() as acquired:
+        if not acquired:
+            return {'skipped': 'another update is running'}
+        return run_update(path or settings.RECOMMENDATIONS_STATE, rebuild)
+
+
+def run_update(path, rebuild):
+    if rebuild and os.path.exists(path):
+        os.remove(path)
+    matrix, last_loan_id, dirty = load_state(path)
+    if rebuild:
+        # Rewrite the books that have recommendations now, even if they end up with none
+        stored = BookRecommendation.objects.order_by().values_list('book_id', flat=True).distinct()
+        dirty = np.union1d(dirty, np.fromiter(stored.iterator(), dtype=np.int64))
+
+    upto = max(settled_loan_id(last_loan_id), last_loan_id)
+    new_loans = Loan.objects.filter(id__gt=last_loan_id, id__lte=upto)
+    new_pairs = loan_pairs(new_loans)
+    if len(new_pairs):
+        old_pairs = loan_pairs(Loan.objects.filter(
+            id__lte=last_loan_id, user_id__in=new_loans.values('user_id')
+        ))
+        size = max(matrix.shape[0], int(new_pairs[:, 1].max()) + 1)
+        delta = cooccurrence_delta(old_pairs, new_pairs, size)
+        matrix = (resize(matrix, size) + delta).tocsr()
+        dirty = np.union1d(dirty, np.unique(delta.tocoo().row))
+        # Saved before the table is written: a crash in between is repaired by the next run
+        save_state(path, matrix, upto, dirty)
+
+    # Books left over from a rebuild may lie beyond the matrix
+    write_recommendations(resize(matrix, int(dirty.max(initial=-1)) + 1), dirty)
+    save_state(path, matrix, upto, np.array([], dtype=np.int64))
+    return {'loans': len(new_pairs), 'books': len(dirty), 'last_loan_id': upto}
@@ -0,0 +1,182 @@
+"""
+Reconciliation of `Book.availability` with open loans.
+
+A book should be unavailable exactly when it has a loan without a return date.
+The borrow and return views keep both in one transaction, but admin edits, raw
+SQL and older data can still leave them apart. `reconcile_chunk` checks one
+range of book ids with two set-based queries and, when repairing, fixes the
+drifted rows it can lock right away: rows locked by a borrow or return in
+progress are skipped and left to the next run. Each chunk is its own short
+transaction, so a run over the whole table never holds more than a few locks.
+
+`Reconciliation` runs the chunks on a thread pool and checkpoints the lowest id
+below which every chunk is done, so an interrupted run resumes from there.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.db import connection, transaction
+from django.db.models import Count, Exists, Max, Min, OuterRef
+
+from audit import log as audit_log
+from .cache import bump_catalogue_version
+from .models import Book, Loan
+from .outbox import record_book_event
+from .sync import record_change
+
+# Drifted ids kept per issue in the report
+EXAMPLES = 20
+
+
+def open_loans():
+    return Loan.objects.filter(book_id=OuterRef('pk'), return_date__isnull=True)
+
+
+def drifted(start, end):
+    """Books in [start, end) whose availability disagrees with their loans: (marked available, marked on loan)"""
+    books = Book.objects.filter(pk__gte=start, pk__lt=end).order_by()
+    return (
+        books.filter(Exists(open_loans()), availability=True),
+        books.filter(~Exists(open_loans()), availability=False),
+    )
+
+
+def repair(books, availability):
+    """Set `availability` on the rows of `books` not locked by someone else; returns their ids"""
+    with transaction.atomic():
+        rows = list(books.select_for_update(skip_locked=True))
+        if not rows:
+            return []
+        Book.objects.filter(pk__in=[book.pk for book in rows]).update(availability=availability)
+        for book in rows:
+            book.availability = availability
+            record_change(book.pk)
+            record_book_event('book.updated', book)
+            audit_log.record('book.availability_repaired', book.pk, availability=availability)
+    return [book.pk for book in rows]
+
+
+def reconcile_chunk(start, end, fix=False):
+    """Check (and with `fix`, repair) the books with ids in [start, end)"""
+    on_loan, not_on_loan = drifted(start, end)
+    result = {
+        'available_on_loan': list(on_loan.values_list('pk', flat=True)),
+        'unavailable_not_on_loan': list(not_on_loan.values_list('pk', flat=True)),
+        # Reported only: which loan is the real one takes a person to decide
+        'duplicate_open_loans': list(
+            Loan.objects.filter(book_id__gte=start, book_id__lt=end, return_date__isnull=True)
+            .order_by().values('book_id').annotate(loans=Count('id')).filter(loans__gt=1)
+            .values_list('book_id', flat=True)
+        ),
+        'repaired': [],
+    }
+    if fix:
+        if result['available_on_loan']:
+            result['repaired'] += repair(on_loan, False)
+        if result['unavailable_not_on_loan']:
+            result['repaired'] += repair(not_on_loan, True)
+    return result
+
+
+class Reconciliation:
+    """One run over all books, resumable through the JSON file at `state_path`"""
+
+    ISSUES = ('available_on_loan', 'unavailable_not_on_loan', 'duplicate_open_loans')
+
+    def __init__(self, state_path=None, chunk_size=10000, workers=4, fix=False):
+        self.state_path = state_path
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.fix = fix
+        self.state = self.load() or self.start()
+
+    def start(self):
+        # Books added after the run started are consistent by construction
+        ids = Book.objects.aggregate(first=Min('id'), last=Max('id'))
+        return {
+            'fix': self.fix,
+            'first': ids['first'] or 1,
+            'upto': ids['last'] or 0,
+            'done_below': (ids['first'] or 1) - 1,
+            'counts': dict.fromkeys(self.ISSUES + ('repaired',), 0),
+            'examples': {issue: [] for issue in self.ISSUES},
+        }
+
+    def load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path) as handle:
+            state = json.load(handle)
+        # A report-only run is not resumed as a repair, nor the other way round
+        return state if state.get('fix') == self.fix else None
+
+    def save(self):
+        if not self.state_path:
+            return
+        temporary = f'{self.state_path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump(self.state, handle)
+        os.replace(temporary, self.state_path)
+
+    @staticmethod
+    def discard(state_path):
+        if state_path and os.path.exists(state_path):
+            os.remove(state_path)
+
+    @property
+    def resumed(self):
+        return self.state['done_below'] >= self.state['first']
+
+    def chunks(self):
+        for start in range(self.state['done_below'] + 1, self.state['upto'] + 1, self.chunk_size):
+            yield start, min(start + self.chunk_size, self.state['upto'] + 1)
+
+    def add(self, result):
+        for issue in self.ISSUES:
+            self.state['counts'][issue] += len(result[issue])
+            examples = self.state['examples'][issue]
+            examples += result[issue][:EXAMPLES - len(examples)]
+        self.state['counts']['repaired'] += len(result['repaired'])
+
+    def run(self, progress=None):
+        """Reconcile the remaining chunks; returns the state with the totals"""
+        chunks = list(self.chunks())
+        if self.workers <= 1:
+            for start, end in chunks:
+                self.finish_chunk(start, end, reconcile_chunk(start, end, self.fix), {}, progress)
+        else:
+            done = {}
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {pool.submit(self.run_chunk, start, end): (start, end) for start, end in chunks}
+                try:
+                    for future in as_completed(futures):
+                        start, end = futures[future]
+                        self.finish_chunk(start, end, future.result(), done, progress)
+                except BaseException:
+                    pool.shutdown(cancel_futures=True)
+                    raise
+        if self.fix and self.state['counts']['repaired']:
+            bump_catalogue_version()
+        self.discard(self.state_path)
+        return self.state
+
+    def run_chunk(self, start, end):
+        try:
+            return reconcile_chunk(start, end, self.fix)
+        finally:
+            # Pool threads each opened their own connection
+            connection.close()
+
+    def finish_chunk(self, start, end, result, done, progress):
+        """Move the checkpoint past every chunk finished in order and count their results"""
+        done[start] = (end, result)
+        # Chunks finished out of order are counted once the checkpoint reaches
+        # them, so a resumed run never counts a chunk twice
+        while self.state['done_below'] + 1 in done:
+            chunk_end, chunk_result = done.pop(self.state['done_below'] + 1)
+            self.add(chunk_result)
+            self.state['done_below'] = chunk_end - 1
+        self.save()
+        if progress:
+            progress(start, end, result)
@@ -1,14 +1,24 @@
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Book, Loan
+from user.models import User
+from .covers import cover_urls
+from .isbn import normalize_isbn
+from .models import Book, Branch, Loan
 
 
 class BookSerializer(serializers.ModelSerializer):
     """Serializer for Book model"""
+    cover = serializers.SerializerMethodField()
     
     class Meta:
         model = Book
-        fields = ['id', 'title', 'author', 'isbn', 'page_count', 'availability', 'created', 'modified']
+        fields = ['id', 'title', 'author', 'isbn', 'page_count', 'availability', 'branch', 'cover', 'created', 'modified']
         read_only_fields = ['id', 'created', 'modified']
+
+    def get_cover(self, obj):
+        return cover_urls(obj)
     
 
 
@@ -17,11 +27,44 @@ class BookCreateUpdateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Book
-        fields = ['title', 'isbn', 'page_count', 'availability']
+        fields = ['title', 'isbn', 'page_count', 'availability', 'branch']
+
+    def validate_isbn(self, value):
+        """Store ISBNs as canonical ISBN-13 and keep them unique"""
+        try:
+            isbn13 = normalize_isbn(value)
+        except ValueError:
+            raise serializers.ValidationError("Enter a valid ISBN-10 or ISBN-13")
+        books = Book.objects.filter(isbn13=isbn13)
+        if self.instance is not None:
+            books = books.exclude(pk=self.instance.pk)
+        if books.exists():
+            raise serializers.ValidationError("A book with this ISBN already exists")
+        return isbn13
+
+    def validate_branch(self, value):
+        """A book's branch is set when it is created; moves go through a transfer"""
+        if self.instance is not None and value != self.instance.branch:
+            raise serializers.ValidationError("Move books between branches with a transfer")
+        return value
     
     
 
 
+class BranchSerializer(serializers.ModelSerializer):
+    """Serializer for Branch model"""
+
+    class Meta:
+        model = Branch
+        fields = ['id', 'code', 'name']
+
+
+class TransferSerializer(serializers.Serializer):
+    """Validates a request to move books to another branch"""
+    book_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=1, max_length=500)
+    to_branch = serializers.PrimaryKeyRelatedField(queryset=Branch.objects.all())
+
+
 class LoanSerializer(serializers.ModelSerializer):
     """Serializer for Loan model"""
     book_title = serializers.CharField(source='book.title', read_only=True)
@@ -29,6 +72,116 @@ class LoanSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Loan
-        fields = ['id', 'book_id', 'book_title', 'user_id', 'user_name', 'loan_date', 'return_date']
+        fields = ['id', 'book_id', 'book_title', 'user_id', 'user_name', 'branch_id', 'loan_date', 'return_date']
+
+
+class ActiveLoanSerializer(serializers.ModelSerializer):
+    """Serializer for a patron's open loan with its due date (expects `book` to be joined)"""
+    book_title = serializers.CharField(source='book.title', read_only=True)
+    book_isbn = serializers.CharField(source='book.isbn', read_only=True)
+    due_date = serializers.SerializerMethodField()
+    due_status = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Loan
+        fields = ['id', 'book_id', 'book_title', 'book_isbn', 'loan_date', 'due_date', 'due_status']
+
+    def get_due_date(self, loan):
+        return loan.due_date
+
+    def get_due_status(self, loan):
+        now = timezone.now()
+        if loan.due_date < now:
+            return 'overdue'
+        if loan.due_date - now <= timedelta(days=settings.LOAN_DUE_SOON_DAYS):
+            return 'due_soon'
+        return 'on_time'
+
+
+class BookFilterSerializer(serializers.Serializer):
+    """Validates the book list filters passed as query parameters"""
+    available = serializers.BooleanField(required=False, allow_null=True, default=None)
+    author = serializers.CharField(required=False, help_text='Author id, or several separated by commas')
+    min_pages = serializers.IntegerField(required=False, min_value=0)
+    max_pages = serializers.IntegerField(required=False, min_value=0)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def validate_author(self, value):
+        try:
+            return [int(author_id) for author_id in value.split(',') if author_id.strip()]
+        except ValueError:
+            raise serializers.ValidationError("author must be a comma separated list of ids")
+
+    def validate(self, data):
+        if data.get('min_pages') is not None and data.get('max_pages') is not None \
+                and data['min_pages'] > data['max_pages']:
+            raise serializers.ValidationError({"max_pages": "max_pages must not be below min_pages"})
+        return data
+
+    def filter_queryset(self, queryset):
+        """Apply the validated filters to a Book queryset"""
+        data = self.validated_data
+        if data.get('available') is not None:
+            queryset = queryset.filter(availability=data['available'])
+        if data.get('author'):
+            queryset = queryset.filter(author_id__in=data['author'])
+        if data.get('min_pages') is not None:
+            queryset = queryset.filter(page_count__gte=data['min_pages'])
+        if data.get('max_pages') is not None:
+            queryset = queryset.filter(page_count__lte=data['max_pages'])
+        if data.get('created_after'):
+            queryset = queryset.filter(created__gte=data['created_after'])
+        if data.get('created_before'):
+            queryset = queryset.filter(created__lt=data['created_before'])
+        return queryset
+
+
+class BookBulkSerializer(serializers.Serializer):
+    """Selects the books of a bulk change by id, by catalogue filters, or both"""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, min_length=1,
+                                max_length=settings.BULK_MAX_IDS)
+    filters = serializers.DictField(required=False, help_text='Same filters as the book list')
+    dry_run = serializers.BooleanField(default=False, help_text='Only count the books that would change')
+
+    def validate_filters(self, value):
+        filters = BookFilterSerializer(data=value)
+        if not filters.is_valid():
+            raise serializers.ValidationError(filters.errors)
+        if not any(filter_value not in (None, []) for filter_value in filters.validated_data.values()):
+            raise serializers.ValidationError("Give at least one filter")
+        return filters
+
+    def validate(self, data):
+        if 'ids' not in data and 'filters' not in data:
+            raise serializers.ValidationError("Select books with ids, filters or both")
+        return data
+
+    def get_queryset(self):
+        books = Book.objects.all()
+        if 'ids' in self.validated_data:
+            books = books.filter(pk__in=self.validated_data['ids'])
+        if 'filters' in self.validated_data:
+            books = self.validated_data['filters'].filter_queryset(books)
+        return books
+
+
+class BookBulkChangesSerializer(serializers.Serializer):
+    """Fields a bulk update may set; a new branch is applied as a transfer"""
+    availability = serializers.BooleanField(required=False)
+    page_count = serializers.IntegerField(required=False, min_value=1)
+    author = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), required=False)
+    branch = serializers.PrimaryKeyRelatedField(queryset=Branch.objects.all(), required=False)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError("Give at least one field to change")
+        # Keyed by column, so the changes can go straight into an UPDATE and the audit log
+        for field in ('author', 'branch'):
+            if field in data:
+                data[f'{field}_id'] = data.pop(field).pk
+        return data
 
 
+class BookBulkUpdateSerializer(BookBulkSerializer):
+    changes = BookBulkChangesSerializer()
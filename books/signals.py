@@ -0,0 +1,41 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .autocomplete import title_index
+from .cache import bump_catalogue_version
+from .models import Book
+from .sync import record_change
+
+# The catalogue cache and the title index are shared by every request, so they only
+# change once the change is committed; a rolled back save leaves them alone.
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_catalogue(sender, **kwargs):
+    transaction.on_commit(bump_catalogue_version)
+
+
+@receiver(post_save, sender=Book)
+def index_title(sender, instance, **kwargs):
+    if title_index.is_built:
+        transaction.on_commit(partial(title_index.add, instance.id, instance.title))
+
+
+@receiver(post_save, sender=Book)
+def log_change(sender, instance, **kwargs):
+    record_change(instance.id)
+
+
+@receiver(post_delete, sender=Book)
+def log_deletion(sender, instance, **kwargs):
+    record_change(instance.id, deleted=True)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_title(sender, instance, **kwargs):
+    if title_index.is_built:
+        transaction.on_commit(partial(title_index.remove, instance.id))
@@ -0,0 +1,94 @@
+"""
+Delta sync of the catalogue for offline clients.
+
+Every book write appends a row to `BookChange` and drops the older rows of the
+same book, so the log holds one row per book: its latest change, or a tombstone
+once the book is deleted. The row ids are the change sequence. A client sends
+back the token of its last sync and gets only the books changed after it, read
+from the primary key index.
+
+Tombstones are compacted away after SYNC_TOMBSTONE_RETENTION_DAYS. Tokens carry
+the time they were issued, and a token older than that window is rejected so
+the client knows it may have missed deletions and must sync from scratch.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Book, BookChange
+
+
+class SyncTokenExpired(Exception):
+    """Tombstones after this token may have been compacted away"""
+
+
+def record_change(book_id, deleted=False):
+    """Log a change of `book_id`; call inside the transaction making the change"""
+    change = BookChange.objects.create(book_id=book_id, deleted=deleted)
+    BookChange.objects.filter(book_id=book_id, id__lt=change.id).delete()
+    return change
+
+
+def record_changes(book_ids, deleted=False):
+    """`record_change` for many books with two statements"""
+    BookChange.objects.filter(book_id__in=book_ids).delete()
+    BookChange.objects.bulk_create(BookChange(book_id=book_id, deleted=deleted) for book_id in book_ids)
+
+
+def make_token(sequence, issued=None):
+    issued = int(time.time()) if issued is None else issued
+    return f'{sequence}-{issued}'
+
+
+def parse_token(token):
+    """(sequence, issued) from a token; raises ValueError when malformed"""
+    sequence, _, issued = token.partition('-')
+    sequence, issued = int(sequence), int(issued)
+    if sequence < 0 or issued < 0:
+        raise ValueError('Malformed sync token')
+    return sequence, issued
+
+
+def changes_since(token=None, limit=500):
+    """
+    Books changed after `token` and the ids of books deleted since, in sequence order.
+
+    Without a token the client has nothing yet: the whole catalogue is returned
+    in pages and tombstones are skipped. Changes younger than SYNC_SETTLE_SECONDS
+    are held back, because a transaction that took a lower sequence number may
+    not have committed yet and would otherwise be skipped for good.
+    """
+    now = time.time()
+    sequence = 0
+    if token is not None:
+        sequence, issued = parse_token(token)
+        # Changes are returned up to SYNC_SETTLE_SECONDS late, so count that in too
+        if issued - settings.SYNC_SETTLE_SECONDS < now - settings.SYNC_TOMBSTONE_RETENTION_DAYS * 86400:
+            raise SyncTokenExpired(token)
+
+    changes = BookChange.objects.filter(
+        id__gt=sequence, created__lte=timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    )
+    if token is None:
+        changes = changes.filter(deleted=False)
+    changes = list(changes.order_by('id').values_list('id', 'book_id', 'deleted')[:limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    changed_ids = [book_id for _, book_id, deleted in changes if not deleted]
+    books = Book.objects.in_bulk(changed_ids)
+    return {
+        # A book deleted after its change was read shows up as a tombstone on the next sync
+        'books': [books[book_id] for book_id in dict.fromkeys(changed_ids) if book_id in books],
+        'deleted': [book_id for _, book_id, deleted in changes if deleted],
+        'next_token': make_token(changes[-1][0] if changes else sequence, int(now)),
+        'has_more': has_more,
+    }
+
+
+def compact_tombstones(older_than):
+    """Delete tombstones of books deleted before `older_than`"""
+    deleted, _ = BookChange.objects.filter(deleted=True, created__lt=older_than).delete()
+    return deleted
@@ -0,0 +1,81 @@
+import csv
+import gzip
+import os
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from jobs.queue import task
+from .cache import bump_catalogue_version
+from .covers import render_variants
+from .models import Book
+from .outbox import purge_delivered
+from .sync import compact_tombstones, record_change
+
+
+@task(name='books.export_catalogue')
+def export_catalogue():
+    """
+    Write the whole catalogue as CSV under MEDIA_ROOT/exports and return its URL.
+    A gzipped copy is written next to it for servers that serve precompressed files.
+    """
+    directory = os.path.join(settings.MEDIA_ROOT, 'exports')
+    os.makedirs(directory, exist_ok=True)
+    filename = f"catalogue-{timezone.now():%Y%m%d-%H%M%S}.csv"
+    rows = (
+        Book.objects.order_by('id')
+        .values_list('id', 'title', 'author__username', 'isbn', 'page_count', 'availability')
+        .iterator(chunk_size=5000)
+    )
+    count = 0
+    path = os.path.join(directory, filename)
+    with open(path, 'w', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['id', 'title', 'author', 'isbn', 'page_count', 'availability'])
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    with open(path, 'rb') as source, gzip.open(f'{path}.gz', 'wb') as target:
+        shutil.copyfileobj(source, target)
+    return {'url': f'{settings.MEDIA_URL}exports/{filename}', 'rows': count}
+
+
+@task(name='books.purge_outbox')
+def purge_outbox(days=None):
+    """Delete delivered outbox events older than OUTBOX_RETENTION_DAYS"""
+    days = settings.OUTBOX_RETENTION_DAYS if days is None else days
+    return {'deleted': purge_delivered(timezone.now() - timedelta(days=days))}
+
+
+@task(name='books.compact_sync_log')
+def compact_sync_log(days=None):
+    """Delete sync tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS"""
+    days = settings.SYNC_TOMBSTONE_RETENTION_DAYS if days is None else days
+    return {'deleted': compact_tombstones(timezone.now() - timedelta(days=days))}
+
+
+@task(name='books.render_cover')
+def render_cover(book_id, cover):
+    """Render the thumbnails of an uploaded cover and attach them to the book"""
+    with default_storage.open(cover) as handle:
+        variants = render_variants(handle.read())
+    with transaction.atomic():
+        # A newer upload replaced the cover meanwhile; its own job renders it
+        updated = Book.objects.filter(pk=book_id, cover=cover).update(cover_variants=variants)
+        if updated:
+            record_change(book_id)
+    if updated:
+        bump_catalogue_version()
+    return {'variants': variants, 'attached': bool(updated)}
+
+
+@task(name='books.update_recommendations')
+def update_recommendations(rebuild=False):
+    """Fold new loans into the "borrowed together" matrix and refresh the affected books"""
+    # numpy and scipy are only loaded by the job workers that run this
+    from .recommendations import update_recommendations
+    return update_recommendations(rebuild=rebuild)
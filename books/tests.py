@@ -1,9 +1,52 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
-from rest_framework.test import APIClient
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
 from user.models import User
+from books.autocomplete import TitleIndex, title_index
+from books.cache import bump_catalogue_version
 from books.models import Book, Loan
+from books.views import BookAPIView, BorrowBookAPIView
+from library_app.db_router import read_from
+from library_app.idempotency import idempotent
+from library_app.testing import QueryBudgetMixin
+from books.management.commands.loadtest import summarize
+from books.management.commands.seed_library import COLUMNS, isbn13
+from books.isbn import normalize_isbn
+from books.models import BookChange, BookRecommendation, Branch, OutboxEvent, Transfer
+from books.outbox import RelayError, record_event, relay_batch
+from books.events import EventBroadcaster, EventFilter, event_availability, fetch_events, latest_event_id
+from asgiref.sync import async_to_sync, sync_to_async
+import asyncio
+import json
+import time
+from datetime import timedelta
+from books.sync import make_token
+from books.tasks import compact_sync_log
+from books.reconcile import Reconciliation
+from books import bulk
+from audit import log as audit_log
+from audit.log import AuditBuffer
+from user.dashboard import dashboard_cache_key
+from django.db import IntegrityError, connection, models, transaction
+from django.test.utils import CaptureQueriesContext
+from books import covers
+from django.core.files.uploadedfile import SimpleUploadedFile
+from jobs.models import Job
+from jobs.queue import registry
+from PIL import Image
+import hashlib
+import importlib.util
+import os
+import unittest
+import io
+import shutil
+import tempfile
 
 
 class BookListTests(TestCase):
@@ -38,6 +81,15 @@ class BookListTests(TestCase):
             availability=False
         )
     
+    def test_cache_is_filled_from_the_primary(self):
+        """Test a request routed to a replica fills the catalogue cache from the primary"""
+        request = APIRequestFactory().get(self.books_url)
+        # The replica alias isn't configured here, so reading from it would fail
+        with read_from('replica_1'):
+            response = BookAPIView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['count'], 2)
+
     def test_get_books_list_public(self):
         """Test getting books list without authentication"""
         response = self.client.get(self.books_url)
@@ -45,6 +97,283 @@ class BookListTests(TestCase):
         self.assertTrue(response.data['success'])
 
 
+class BookFilterTests(TestCase):
+    """Test cases for book list filters and facets"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.books_url = reverse('books')
+        self.author_one = User.objects.create_user(
+            username='author1',
+            email='author1@example.com',
+            password='Pass123!',
+            first_name='Author',
+            last_name='One'
+        )
+        self.author_two = User.objects.create_user(
+            username='author2',
+            email='author2@example.com',
+            password='Pass123!',
+            first_name='Author',
+            last_name='Two'
+        )
+        for index, (author, pages, available) in enumerate([
+            (self.author_one, 120, True),
+            (self.author_one, 450, False),
+            (self.author_two, 300, True),
+            (self.author_two, 800, True),
+        ]):
+            Book.objects.create(
+                title=f'Filtered Book {index}',
+                author=author,
+                isbn=f'{index:010d}',
+                page_count=pages,
+                availability=available
+            )
+
+    def test_filter_by_availability_and_pages(self):
+        """Test filtering on availability and page-count range"""
+        response = self.client.get(self.books_url, {'available': 'true', 'min_pages': 200, 'max_pages': 900})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data['data']
+        self.assertEqual(data['count'], 2)
+        self.assertEqual({book['page_count'] for book in data['books']}, {300, 800})
+
+    def test_filter_by_author(self):
+        """Test filtering on one or several authors"""
+        response = self.client.get(self.books_url, {'author': self.author_one.id})
+        self.assertEqual(response.data['data']['count'], 2)
+        response = self.client.get(self.books_url, {'author': f'{self.author_one.id},{self.author_two.id}'})
+        self.assertEqual(response.data['data']['count'], 4)
+
+    def test_filter_by_created_date(self):
+        """Test filtering on the created date"""
+        response = self.client.get(self.books_url, {'created_before': '2000-01-01T00:00:00Z'})
+        self.assertEqual(response.data['data']['count'], 0)
+        response = self.client.get(self.books_url, {'created_after': '2000-01-01T00:00:00Z'})
+        self.assertEqual(response.data['data']['count'], 4)
+
+    def test_facet_counts(self):
+        """Test availability and author facets describe the filtered books"""
+        response = self.client.get(self.books_url, {'min_pages': 200})
+        facets = response.data['data']['facets']
+        self.assertEqual(facets['availability'], {'available': 2, 'unavailable': 1})
+        self.assertEqual(facets['authors'], [
+            {'id': self.author_two.id, 'username': 'author2', 'count': 2},
+            {'id': self.author_one.id, 'username': 'author1', 'count': 1},
+        ])
+
+    def test_invalid_filters(self):
+        """Test malformed filters are rejected"""
+        response = self.client.get(self.books_url, {'author': 'abc', 'min_pages': 10, 'max_pages': 5})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(response.data['success'])
+
+    def test_filtered_browse_query_count(self):
+        """Test a filtered page costs two queries, then none while cached"""
+        params = {'available': 'true', 'author': self.author_two.id, 'page_size': 1}
+        with self.assertNumQueries(2):
+            first = self.client.get(self.books_url, params)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.books_url, params)
+        self.assertEqual(first.data, second.data)
+        self.assertIsNotNone(first.data['data']['next'])
+
+    def test_cache_invalidated_on_change(self):
+        """Test book changes are visible immediately"""
+        self.client.get(self.books_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(page_count=120).get().delete()
+        response = self.client.get(self.books_url)
+        self.assertEqual(response.data['data']['count'], 3)
+
+    def test_cache_kept_on_rollback(self):
+        """Test a change that is rolled back leaves the cached catalogue in place"""
+        self.client.get(self.books_url)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Book.objects.filter(page_count=120).get().delete()
+                raise IntegrityError
+        self.assertEqual(callbacks, [])
+        with self.assertNumQueries(0):
+            self.client.get(self.books_url)
+
+
+class TitleIndexTests(SimpleTestCase):
+    """Test cases for the in-memory title prefix index"""
+
+    def setUp(self):
+        self.index = TitleIndex()
+        self.index.build([(1, 'The Lord of the Rings'), (2, 'Les Misérables'), (3, 'The Hobbit')])
+
+    def test_prefix_of_title_and_words(self):
+        """Test prefixes of the title and of later words both match"""
+        self.assertEqual([book['id'] for book in self.index.search('the')], [3, 1])
+        self.assertEqual(self.index.search('rin'), [{'id': 1, 'title': 'The Lord of the Rings'}])
+        self.assertEqual([book['id'] for book in self.index.search('lord of')], [1])
+
+    def test_normalized_matching(self):
+        """Test matching ignores case, accents and extra spaces"""
+        self.assertEqual([book['id'] for book in self.index.search('  MISERA')], [2])
+        self.assertEqual(self.index.search(''), [])
+
+    def test_add_update_remove(self):
+        """Test incremental updates keep the index current"""
+        self.index.add(4, 'Dune')
+        self.index.add(3, 'The Silmarillion')
+        self.index.remove(1)
+        self.assertEqual([book['id'] for book in self.index.search('dun')], [4])
+        self.assertEqual(self.index.search('hobbit'), [])
+        self.assertEqual([book['id'] for book in self.index.search('the')], [3])
+
+    def test_limit(self):
+        """Test the number of suggestions is capped"""
+        self.assertEqual(len(self.index.search('the', limit=1)), 1)
+
+
+class BookAutocompleteTests(TestCase):
+    """Test cases for the title autocomplete API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('autocomplete_book')
+        self.superuser = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='AdminPass123!',
+            first_name='Admin',
+            last_name='User'
+        )
+        self.book = Book.objects.create(
+            title='Harry Potter',
+            author=self.superuser,
+            isbn='1234567890',
+            page_count=300
+        )
+        title_index.build_from_db()
+
+    def test_autocomplete_without_queries(self):
+        """Test suggestions are served without touching the database"""
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'q': 'harr'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], [{'id': self.book.id, 'title': 'Harry Potter'}])
+
+    def test_index_follows_book_changes(self):
+        """Test created, renamed and deleted books are reflected"""
+        self.client.force_authenticate(user=self.superuser)
+        # The index changes on commit; keep the audit events of the callbacks in a buffer of the test's own
+        with mock.patch.object(audit_log, 'buffer', AuditBuffer()), self.settings(AUDIT_FLUSH_INTERVAL=3600):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('books'), {'title': 'Harvest', 'isbn': '1111111111', 'page_count': 10},
+                                 format='json')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(reverse('books', kwargs={'pk': self.book.id}), {'title': 'Dune'}, format='json')
+            titles = [book['title'] for book in self.client.get(self.url, {'q': 'har'}).data['data']]
+            self.assertEqual(titles, ['Harvest'])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(reverse('books', kwargs={'pk': self.book.id}))
+        self.assertEqual(self.client.get(self.url, {'q': 'dune'}).data['data'], [])
+
+
+class ISBNNormalizationTests(SimpleTestCase):
+    """Test cases for ISBN normalization"""
+
+    def test_isbn10_converted(self):
+        """Test ISBN-10 in any formatting becomes ISBN-13"""
+        self.assertEqual(normalize_isbn('0-306-40615-2'), '9780306406157')
+        self.assertEqual(normalize_isbn('0 306 40615 2'), '9780306406157')
+        self.assertEqual(normalize_isbn('080442957x'), '9780804429573')
+
+    def test_isbn13_compacted(self):
+        """Test ISBN-13 with hyphens is compacted"""
+        self.assertEqual(normalize_isbn('978-0-306-40615-7'), '9780306406157')
+
+    def test_invalid_isbns(self):
+        """Test malformed values and bad check digits are rejected"""
+        for value in ['0-306-40615-3', '978-0-306-40615-8', '12345', 'abcdefghij', '1234567890123']:
+            with self.assertRaises(ValueError):
+                normalize_isbn(value)
+
+
+class BookISBNTests(TestCase):
+    """Test cases for ISBN storage and lookup"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.superuser = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='AdminPass123!',
+            first_name='Admin',
+            last_name='User'
+        )
+        self.book = Book.objects.create(
+            title='Normalized Book',
+            author=self.superuser,
+            isbn='0-306-40615-2',
+            page_count=200
+        )
+
+    def test_isbn13_derived_on_save(self):
+        """Test the canonical ISBN-13 is stored alongside the original"""
+        self.assertEqual(self.book.isbn13, '9780306406157')
+
+    def test_create_stores_canonical_isbn(self):
+        """Test the API stores ISBNs as ISBN-13 and rejects duplicates"""
+        self.client.force_authenticate(user=self.superuser)
+        data = {'title': 'Other Book', 'isbn': '0 8044 2957 X', 'page_count': 100}
+        response = self.client.post(reverse('books'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Book.objects.get(title='Other Book').isbn, '9780804429573')
+
+        data = {'title': 'Duplicate Book', 'isbn': '978-0-306-40615-7', 'page_count': 100}
+        response = self.client.post(reverse('books'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('isbn', response.data['data'])
+
+    def test_duplicate_isbn_saved_concurrently(self):
+        """Test an ISBN taken between validation and save is a 400, not a server error"""
+        self.client.force_authenticate(user=self.superuser)
+        other = Book.objects.create(title='Other', author=self.superuser, isbn='080442957X', page_count=10)
+        # What a concurrent request saving the same ISBN looks like to this one
+        with mock.patch('books.serializers.Book.objects.filter') as books:
+            books.return_value.exists.return_value = False
+            books.return_value.exclude.return_value.exists.return_value = False
+            created = self.client.post(reverse('books'), {'title': 'Race', 'isbn': '0306406152', 'page_count': 1},
+                                       format='json')
+            updated = self.client.patch(reverse('books', args=[other.id]), {'isbn': '0306406152'}, format='json')
+        for response, code in [(created, 'book_creation_failed'), (updated, 'book_update_failed')]:
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['code'], code)
+            self.assertIn('isbn', response.data['data'])
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_create_rejects_invalid_isbn(self):
+        """Test invalid ISBNs are rejected"""
+        self.client.force_authenticate(user=self.superuser)
+        data = {'title': 'Bad Book', 'isbn': '0-306-40615-3', 'page_count': 100}
+        response = self.client.post(reverse('books'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_lookup_many_in_one_query(self):
+        """Test several ISBNs are resolved with a single query"""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('isbn_lookup'), {'isbn': ['0306406152', '9780804429573,nonsense']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['data']
+        self.assertEqual(results[0]['isbn13'], '9780306406157')
+        self.assertEqual(results[0]['book']['id'], self.book.id)
+        self.assertIsNone(results[1]['book'])
+        self.assertIsNone(results[2]['isbn13'])
+
+    def test_lookup_requires_isbn(self):
+        """Test the isbn parameter is required"""
+        response = self.client.get(reverse('isbn_lookup'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class BookCreateTests(TestCase):
     """Test cases for book creation API"""
     
@@ -160,6 +489,251 @@ class BookUpdateDeleteTests(TestCase):
         self.assertEqual(Book.objects.count(), 1)
 
 
+class BookBulkTests(TestCase):
+    """Test cases for the bulk update and delete APIs"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='AdminPass123!')
+        self.reader = User.objects.create_user(username='reader', email='reader@example.com', password='Pass123!')
+        self.books = [
+            Book.objects.create(title=f'Book {n}', author=self.admin, isbn=isbn13(n), page_count=100 * (n + 1))
+            for n in range(5)
+        ]
+        BookChange.objects.all().delete()
+        self.client.force_authenticate(user=self.admin)
+
+    def lend(self, *books):
+        for book in books:
+            Loan.objects.create(book=self.books[book], user=self.reader)
+
+    def test_dry_run_counts_without_changing(self):
+        """Test a dry run only counts the books that would change"""
+        self.lend(0, 1)
+        Book.objects.filter(pk=self.books[0].id).update(availability=False)
+        response = self.client.post(reverse('books_bulk_update'), {
+            'filters': {'max_pages': 300}, 'changes': {'availability': False}, 'dry_run': True,
+        }, format='json')
+        self.assertEqual(response.data['data'], {'matched': 1, 'skipped': 1, 'skipped_ids': [self.books[2].id]})
+        self.assertEqual(Book.objects.filter(availability=False).count(), 1)
+
+    @override_settings(BULK_BATCH_SIZE=2)
+    def test_update_runs_in_batches(self):
+        """Test the selection is updated batch by batch and logged once per book"""
+        self.lend(1, 2, 3, 4)
+        self.client.get(reverse('books'))
+        with mock.patch.object(bulk, 'locked_batch', wraps=bulk.locked_batch) as batches:
+            response = self.client.post(reverse('books_bulk_update'), {
+                'filters': {'min_pages': 200}, 'changes': {'availability': False},
+            }, format='json')
+        self.assertEqual(response.data['data'], {'updated': 4, 'skipped': 0, 'skipped_ids': []})
+        # Two full batches, then one more that finds nothing left
+        self.assertEqual(batches.call_count, 3)
+        self.assertEqual(BookChange.objects.count(), 4)
+        self.assertEqual(OutboxEvent.objects.filter(topic='book.updated', payload__availability=False).count(), 4)
+        # The cached catalogue was invalidated
+        data = self.client.get(reverse('books')).data['data']
+        self.assertEqual(data['facets']['availability'], {'available': 1, 'unavailable': 4})
+
+    def test_update_follows_loans(self):
+        """Test books on loan are never made available, and are reported as skipped"""
+        self.lend(0)
+        Book.objects.filter(pk__in=[self.books[0].id, self.books[1].id]).update(availability=False)
+        response = self.client.post(reverse('books_bulk_update'), {
+            'ids': [self.books[0].id, self.books[1].id], 'changes': {'availability': True},
+        }, format='json')
+        self.assertEqual(response.data['data'], {'updated': 1, 'skipped': 1, 'skipped_ids': [self.books[0].id]})
+        self.assertEqual(list(Book.objects.filter(availability=False).values_list('id', flat=True)), [self.books[0].id])
+
+    def test_update_catalogue_fields(self):
+        """Test page count and author are set on every selected book, whatever its loans"""
+        self.lend(0)
+        response = self.client.post(reverse('books_bulk_update'), {
+            'ids': [self.books[0].id, self.books[1].id], 'changes': {'page_count': 42, 'author': self.reader.id},
+        }, format='json')
+        self.assertEqual(response.data['data'], {'updated': 2, 'skipped': 0, 'skipped_ids': []})
+        self.assertEqual(Book.objects.filter(page_count=42, author=self.reader).count(), 2)
+        self.assertEqual(OutboxEvent.objects.filter(topic='book.updated', payload__author_id=self.reader.id).count(), 2)
+
+    def test_update_branch_transfers(self):
+        """Test a new branch moves the books with a transfer, leaving books on loan where they are"""
+        branch = Branch.objects.create(code='north', name='North')
+        self.books[2].branch = branch
+        self.books[2].save()
+        self.lend(0)
+        ids = [book.id for book in self.books[:3]]
+        response = self.client.post(reverse('books_bulk_update'), {
+            'ids': ids, 'changes': {'branch': branch.id},
+        }, format='json')
+        self.assertEqual(response.data['data'], {'updated': 1, 'skipped': 1, 'skipped_ids': [self.books[0].id]})
+        self.assertEqual(set(Book.objects.filter(branch=branch).values_list('id', flat=True)), set(ids[1:]))
+        transfer = Transfer.objects.get()
+        self.assertEqual((transfer.book_id, transfer.from_branch_id, transfer.to_branch_id, transfer.user),
+                         (self.books[1].id, None, branch.id, self.admin))
+        event = OutboxEvent.objects.get(topic='book.transferred')
+        self.assertEqual(event.payload, {'from_branch_id': None, 'to_branch_id': branch.id})
+
+    def test_delete_by_ids_and_filters(self):
+        """Test only books matching both the ids and the filters are deleted, with their loans"""
+        self.lend(1)
+        cache.set(dashboard_cache_key(self.reader.id), {'loans': 1})
+        ids = [self.books[0].id, self.books[1].id, self.books[4].id]
+        # Keep the audit events of the callbacks in a buffer of the test's own
+        with mock.patch.object(audit_log, 'buffer', AuditBuffer()), \
+                self.settings(AUDIT_FLUSH_INTERVAL=3600), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('books_bulk_delete'), {
+                'ids': ids, 'filters': {'max_pages': 400},
+            }, format='json')
+        self.assertEqual(response.data['data'], {'deleted': 2})
+        self.assertEqual(set(Book.objects.values_list('id', flat=True)),
+                         {book.id for book in self.books[2:]})
+        self.assertFalse(Loan.objects.exists())
+        self.assertEqual(set(BookChange.objects.filter(deleted=True).values_list('book_id', flat=True)), set(ids[:2]))
+        self.assertEqual(OutboxEvent.objects.filter(topic='book.deleted').count(), 2)
+        # The borrower's dashboard no longer lists the deleted loan
+        self.assertIsNone(cache.get(dashboard_cache_key(self.reader.id)))
+
+    def test_delete_is_set_based(self):
+        """Test a batch costs the same queries whatever its size"""
+        def queries(ids):
+            with CaptureQueriesContext(connection) as captured:
+                bulk.bulk_delete(Book.objects.filter(pk__in=ids))
+            return len(captured)
+
+        self.lend(0, 1, 2, 3)
+        self.assertEqual(queries([self.books[0].id]), queries([book.id for book in self.books[1:]]))
+
+    def test_relations_cascade(self):
+        """Test delete_books may delete every row pointing at the deleted books"""
+        for relation in bulk.book_relations():
+            self.assertIs(relation.on_delete, models.CASCADE, relation)
+        self.assertIn(BookRecommendation, [relation.related_model for relation in bulk.book_relations()])
+
+    def test_delete_recommended_book(self):
+        """Test deleting a book that other books recommend removes those recommendations"""
+        BookRecommendation.objects.create(book=self.books[0], recommended=self.books[1], rank=0, score=2)
+        BookRecommendation.objects.create(book=self.books[1], recommended=self.books[2], rank=0, score=1)
+        response = self.client.post(reverse('books_bulk_delete'), {'ids': [self.books[1].id]}, format='json')
+        self.assertEqual(response.data['data'], {'deleted': 1})
+        self.assertFalse(BookRecommendation.objects.exists())
+        connection.check_constraints()
+
+    def test_rejects_missing_or_empty_selection(self):
+        """Test a bulk change must select books explicitly"""
+        for data in [{}, {'filters': {}}, {'filters': {'author': ''}}, {'ids': []}]:
+            response = self.client.post(reverse('books_bulk_delete'), data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('books_bulk_update'), {'ids': [self.books[0].id], 'changes': {}},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Book.objects.count(), 5)
+
+    def test_superuser_only(self):
+        """Test regular users can't change books in bulk"""
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.post(reverse('books_bulk_delete'), {'ids': [self.books[0].id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class IdempotencyKeyTests(TestCase):
+    """Test cases for Idempotency-Key handling on borrow, return and create"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='Pass123!',
+            first_name='Test',
+            last_name='User'
+        )
+        self.book = Book.objects.create(
+            title='Retried Book',
+            author=self.user,
+            isbn='1234567890',
+            page_count=200,
+            availability=True
+        )
+        self.client.force_authenticate(user=self.user)
+        self.borrow_url = reverse('borrow_book')
+
+    def test_retry_replays_response(self):
+        """Test a retried borrow returns the first response without borrowing again"""
+        first = self.client.post(self.borrow_url, {'book_id': self.book.id}, HTTP_IDEMPOTENCY_KEY='key-1')
+        second = self.client.post(self.borrow_url, {'book_id': self.book.id}, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Loan.objects.count(), 1)
+
+    def test_without_key_runs_again(self):
+        """Test requests without a key are not deduplicated"""
+        self.client.post(self.borrow_url, {'book_id': self.book.id})
+        response = self.client.post(self.borrow_url, {'book_id': self.book.id})
+        self.assertEqual(response.data['code'], 'book_not_available')
+
+    def test_key_reused_with_other_body(self):
+        """Test reusing a key for a different request is rejected"""
+        self.client.post(self.borrow_url, {'book_id': self.book.id}, HTTP_IDEMPOTENCY_KEY='key-1')
+        response = self.client.post(self.borrow_url, {'book_id': self.book.id + 1}, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_keys_scoped_per_user(self):
+        """Test another user's request with the same key is processed"""
+        self.client.post(self.borrow_url, {'book_id': self.book.id}, HTTP_IDEMPOTENCY_KEY='key-1')
+        other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='Pass123!',
+            first_name='Other',
+            last_name='User'
+        )
+        self.client.force_authenticate(user=other)
+        response = self.client.post(self.borrow_url, {'book_id': self.book.id}, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.data['code'], 'book_not_available')
+
+    def test_in_flight_duplicate_conflicts(self):
+        """Test a duplicate of a request still running gets 409 and Retry-After"""
+        original = BorrowBookAPIView.post.__wrapped__
+        responses = []
+
+        def slow_borrow(view, request):
+            # A retry arrives while the first request is still in the view
+            responses.append(self.client.post(self.borrow_url, {'book_id': self.book.id}, HTTP_IDEMPOTENCY_KEY='key-1'))
+            return original(view, request)
+
+        with mock.patch.object(BorrowBookAPIView, 'post', idempotent(slow_borrow)):
+            first = self.client.post(self.borrow_url, {'book_id': self.book.id}, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(responses[0].status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(responses[0]['Retry-After'], '1')
+
+    def test_return_and_create_are_idempotent(self):
+        """Test return and book creation replay as well"""
+        self.client.post(self.borrow_url, {'book_id': self.book.id})
+        return_url = reverse('return_book')
+        first = self.client.post(return_url, {'book_id': self.book.id}, HTTP_IDEMPOTENCY_KEY='return-1')
+        second = self.client.post(return_url, {'book_id': self.book.id}, HTTP_IDEMPOTENCY_KEY='return-1')
+        self.assertEqual(first.data, second.data)
+        self.assertTrue(second.data['success'])
+
+        superuser = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='AdminPass123!',
+            first_name='Admin',
+            last_name='User'
+        )
+        self.client.force_authenticate(user=superuser)
+        data = {'title': 'Once', 'isbn': '0-306-40615-2', 'page_count': 10}
+        for _ in range(2):
+            response = self.client.post(reverse('books'), data, format='json', HTTP_IDEMPOTENCY_KEY='create-1')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Book.objects.filter(title='Once').count(), 1)
+
+
 class BookBorrowTests(TestCase):
     """Test cases for book borrowing API"""
     
@@ -210,3 +784,947 @@ class BookBorrowTests(TestCase):
         response = self.client.post(url,{'book_id': book.id})
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+
+class OutboxTests(TestCase):
+    """Test cases for the transactional outbox and its relay"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='outboxuser', email='outbox@example.com', password='Pass123!',
+            first_name='Out', last_name='Box'
+        )
+        self.book = Book.objects.create(
+            title='Evented Book', author=self.user, isbn='1234567890', page_count=100, availability=True
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def borrow_and_return(self, book):
+        self.client.post(reverse('borrow_book'), {'book_id': book.id})
+        self.client.post(reverse('return_book'), {'book_id': book.id})
+
+    def test_borrow_and_return_record_events(self):
+        self.borrow_and_return(self.book)
+        events = list(OutboxEvent.objects.values_list('topic', 'book_id'))
+        self.assertEqual(events, [('loan.borrowed', self.book.id), ('loan.returned', self.book.id)])
+        self.assertEqual(OutboxEvent.objects.first().payload['user_id'], self.user.id)
+
+    def test_failed_borrow_records_nothing(self):
+        self.book.availability = False
+        self.book.save()
+        response = self.client.post(reverse('borrow_book'), {'book_id': self.book.id})
+        self.assertFalse(response.data['success'])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_relay_delivers_in_order_and_marks_delivered(self):
+        self.borrow_and_return(self.book)
+        sink = mock.Mock()
+        self.assertEqual(relay_batch(sink), 2)
+        sent = sink.send.call_args.args[0]
+        self.assertEqual([event['topic'] for event in sent], ['loan.borrowed', 'loan.returned'])
+        self.assertFalse(OutboxEvent.objects.filter(delivered_at__isnull=True).exists())
+        self.assertEqual(relay_batch(sink), 0)
+
+    def test_failing_sink_keeps_events_pending(self):
+        self.borrow_and_return(self.book)
+        sink = mock.Mock()
+        sink.send.side_effect = OSError('sink down')
+        with self.assertRaises(RelayError):
+            relay_batch(sink)
+        pending = OutboxEvent.objects.filter(delivered_at__isnull=True)
+        self.assertEqual(pending.count(), 2)
+        # The batch is retried from its first event, which alone is charged
+        self.assertEqual(list(pending.values_list('attempts', flat=True)), [1, 0])
+        self.assertEqual(pending.first().last_error, 'sink down')
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_poison_event_is_parked(self):
+        self.borrow_and_return(self.book)
+        self.borrow_and_return(self.book)
+        poison = OutboxEvent.objects.order_by('id')[1]
+        sent = []
+
+        def send(events):
+            if poison.id in [event['id'] for event in events]:
+                raise ValueError('rejected')
+            sent.extend(event['id'] for event in events)
+
+        sink = mock.Mock()
+        sink.send.side_effect = send
+        with self.assertRaises(RelayError):
+            relay_batch(sink)
+        # The first event of the failed batch is retried alone and goes through
+        self.assertEqual(relay_batch(sink), 1)
+        for _ in range(2):
+            with self.assertRaises(RelayError):
+                relay_batch(sink)
+        poison.refresh_from_db()
+        self.assertIsNotNone(poison.parked_at)
+        self.assertEqual(poison.last_error, 'rejected')
+        # The events behind it flow again
+        self.assertEqual(relay_batch(sink), 2)
+        self.assertEqual(relay_batch(sink), 0)
+        self.assertEqual(len(sent), 3)
+
+        sink.send.side_effect = None
+        call_command('relay_outbox', '--unpark', stdout=StringIO())
+        self.assertEqual(relay_batch(sink), 1)
+        self.assertFalse(OutboxEvent.objects.filter(delivered_at__isnull=True).exists())
+
+    def test_sink_called_outside_transactions(self):
+        self.borrow_and_return(self.book)
+        # The test case's own transaction is open throughout; the relay must not open another
+        savepoints = len(connection.savepoint_ids)
+        sink = mock.Mock()
+        sink.send.side_effect = lambda events: self.assertEqual(len(connection.savepoint_ids), savepoints)
+        self.assertEqual(relay_batch(sink), 2)
+
+    def test_relay_shards_by_book(self):
+        other = Book.objects.create(
+            title='Other Book', author=self.user, isbn='0306406152', page_count=100, availability=True
+        )
+        self.borrow_and_return(self.book)
+        self.borrow_and_return(other)
+        sink = mock.Mock()
+        relay_batch(sink, shard=(self.book.id % 2, 2))
+        sent = sink.send.call_args.args[0]
+        self.assertEqual({event['book_id'] for event in sent}, {self.book.id})
+
+    def test_relay_command_writes_file_sink(self):
+        import json, os, tempfile
+        self.borrow_and_return(self.book)
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        with self.settings(OUTBOX_FILE=path):
+            call_command('relay_outbox', '--once', stdout=StringIO())
+        with open(path) as events:
+            topics = [json.loads(line)['topic'] for line in events]
+        self.assertEqual(topics, ['loan.borrowed', 'loan.returned'])
+
+
+@override_settings(SSE_POLL_INTERVAL=0.01, SSE_HEARTBEAT=0.05)
+@override_settings(SSE_SETTLE_SECONDS=0)
+class BookEventsTests(TestCase):
+    """Test cases for the server-sent availability feed"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='AdminPass123!')
+        self.book = Book.objects.create(title='Live Book', author=self.admin, isbn='0306406152', page_count=10)
+        self.other = Book.objects.create(title='Other Book', author=self.admin, isbn='9780441172719', page_count=10)
+        self.url = reverse('book_events')
+
+    def test_book_crud_records_events(self):
+        """Test creating, updating and deleting books feeds the outbox"""
+        self.client.force_authenticate(user=self.admin)
+        created = self.client.post(reverse('books'), {'title': 'New', 'isbn': '080442957X', 'page_count': 5})
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.client.patch(reverse('books', args=[self.book.id]), {'availability': False})
+        self.client.delete(reverse('books', args=[self.other.id]))
+        events = list(OutboxEvent.objects.values_list('topic', 'book_id'))
+        self.assertEqual([topic for topic, _ in events], ['book.created', 'book.updated', 'book.deleted'])
+        self.assertFalse(OutboxEvent.objects.get(topic='book.updated').payload['availability'])
+
+    def test_filters(self):
+        """Test per-subscription filters"""
+        event_filter = EventFilter.from_query({'book': f'{self.book.id}', 'topic': 'loan.borrowed'})
+        self.assertTrue(event_filter.matches({'book_id': self.book.id, 'topic': 'loan.borrowed'}))
+        self.assertFalse(event_filter.matches({'book_id': self.other.id, 'topic': 'loan.borrowed'}))
+        self.assertFalse(event_filter.matches({'book_id': self.book.id, 'topic': 'loan.returned'}))
+        with self.assertRaises(ValueError):
+            EventFilter.from_query({'topic': 'bogus'})
+        self.assertFalse(event_availability('loan.borrowed', {}))
+        self.assertTrue(event_availability('book.updated', {'availability': True}))
+
+    def test_wsgi_requests_get_missed_events(self):
+        """Test WSGI requests are answered with the missed events and closed"""
+        first = record_event('loan.borrowed', self.book.id)
+        record_event('loan.borrowed', self.other.id)
+        response = self.client.get(self.url, {'last_event_id': first.id - 1, 'book': self.book.id})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertIn(f'id: {first.id}\nevent: loan.borrowed', body)
+        self.assertNotIn(f'"book_id": {self.other.id}', body)
+
+    def test_bad_filters(self):
+        """Test malformed filters are rejected"""
+        self.assertEqual(self.client.get(self.url, {'book': 'x'}).status_code, 400)
+
+    @override_settings(SSE_SETTLE_SECONDS=60)
+    def test_young_events_hold_back_the_cursor(self):
+        """Test an event committed after a higher id is still sent once it settles"""
+        late = record_event('loan.borrowed', self.book.id)
+        early = record_event('loan.returned', self.other.id)
+        # The higher id is settled while the lower one has only just become visible
+        OutboxEvent.objects.filter(pk=early.id).update(created=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(async_to_sync(fetch_events)(late.id - 1, 10), [])
+        self.assertEqual(async_to_sync(latest_event_id)(), late.id - 1)
+
+        OutboxEvent.objects.filter(pk=late.id).update(created=timezone.now() - timedelta(minutes=5))
+        self.assertEqual([data['id'] for data in async_to_sync(fetch_events)(late.id - 1, 10)], [late.id, early.id])
+        self.assertEqual(async_to_sync(latest_event_id)(), early.id)
+
+    @override_settings(SSE_POLL_INTERVAL=0.01)
+    async def test_idle_feed_restarts_from_the_present(self):
+        """Test events committed while nobody listened are not replayed as live"""
+        broadcaster = EventBroadcaster()
+        queue = await broadcaster.subscribe()
+        broadcaster.unsubscribe(queue)
+        await asyncio.wait_for(broadcaster.task, 2)
+
+        idle = await sync_to_async(record_event)('loan.borrowed', self.book.id)
+        queue = await broadcaster.subscribe()
+        try:
+            self.assertEqual(broadcaster.last_id, idle.id)
+        finally:
+            broadcaster.unsubscribe(queue)
+            await asyncio.wait_for(broadcaster.task, 2)
+
+    async def read_events(self, stream, count):
+        messages = []
+        while len(messages) < count:
+            chunk = await asyncio.wait_for(anext(stream), 2)
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith('id: '):
+                messages.append(json.loads(chunk.split('data: ', 1)[1]))
+        return messages
+
+    async def test_stream_resumes_then_goes_live(self):
+        """Test a reconnecting client gets missed events and then live ones"""
+        missed = await sync_to_async(record_event)('loan.borrowed', self.book.id)
+        response = await self.async_client.get(self.url, {'last_event_id': missed.id - 1})
+        stream = aiter(response.streaming_content)
+        try:
+            first, = await self.read_events(stream, 1)
+            self.assertEqual((first['id'], first['available']), (missed.id, False))
+
+            live = await sync_to_async(record_event)('loan.returned', self.book.id)
+            second, = await self.read_events(stream, 1)
+            self.assertEqual((second['id'], second['available']), (live.id, True))
+        finally:
+            await stream.aclose()
+
+    async def test_stream_filters_live_events(self):
+        """Test live events are filtered per subscription"""
+        response = await self.async_client.get(self.url, {'book': self.other.id})
+        stream = aiter(response.streaming_content)
+        try:
+            # Wait for the subscription before producing events
+            await asyncio.wait_for(anext(stream), 2)
+            await sync_to_async(record_event)('loan.borrowed', self.book.id)
+            expected = await sync_to_async(record_event)('loan.borrowed', self.other.id)
+            event, = await self.read_events(stream, 1)
+            self.assertEqual(event['id'], expected.id)
+        finally:
+            await stream.aclose()
+
+    async def test_expired_token_gets_reset(self):
+        """Test tokens older than the retained outbox ask the client to reload"""
+        event = await sync_to_async(record_event)('loan.borrowed', self.book.id)
+        response = await self.async_client.get(self.url, headers={'Last-Event-ID': str(event.id - 5)})
+        stream = aiter(response.streaming_content)
+        try:
+            chunks = [await asyncio.wait_for(anext(stream), 2) for _ in range(2)]
+        finally:
+            await stream.aclose()
+        self.assertIn('event: reset', ''.join(chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in chunks))
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class BookSyncTests(TestCase):
+    """Test cases for the delta sync endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='AdminPass123!')
+        self.first = Book.objects.create(title='First', author=self.admin, isbn='0306406152', page_count=10)
+        self.second = Book.objects.create(title='Second', author=self.admin, isbn='9780441172719', page_count=10)
+        self.url = reverse('book_sync')
+
+    def sync(self, token=None, **params):
+        if token is not None:
+            params['changed_since'] = token
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['data']
+
+    def test_first_sync_pages_through_catalogue(self):
+        """Test a sync without a token returns every book, page by page"""
+        Book.objects.create(title='Gone', author=self.admin, isbn='080442957X', page_count=10).delete()
+        page = self.sync(limit=1)
+        self.assertEqual([book['id'] for book in page['books']], [self.first.id])
+        self.assertTrue(page['has_more'])
+        page = self.sync(page['next_token'], limit=1)
+        self.assertEqual([book['id'] for book in page['books']], [self.second.id])
+        self.assertEqual(page['deleted'], [])
+
+    def test_returns_only_changes_with_tombstones(self):
+        """Test a follow-up sync gets changed books once and deleted ids"""
+        token = self.sync()['next_token']
+        self.assertEqual(self.sync(token)['books'], [])
+
+        self.client.force_authenticate(user=self.admin)
+        self.client.patch(reverse('books', args=[self.first.id]), {'title': 'Renamed'})
+        self.client.post(reverse('borrow_book'), {'book_id': self.first.id})
+        self.client.delete(reverse('books', args=[self.second.id]))
+        page = self.sync(token)
+        self.assertEqual([(book['id'], book['title'], book['availability']) for book in page['books']],
+                         [(self.first.id, 'Renamed', False)])
+        self.assertEqual(page['deleted'], [self.second.id])
+        self.assertFalse(page['has_more'])
+        # Only the latest change of each book is kept
+        self.assertEqual(BookChange.objects.count(), 2)
+
+    @override_settings(SYNC_SETTLE_SECONDS=60)
+    def test_recent_changes_are_held_back(self):
+        """Test changes are served only once concurrent commits have settled"""
+        page = self.sync()
+        self.assertEqual(page['books'], [])
+        self.assertEqual(page['next_token'].split('-')[0], '0')
+
+    def test_rejects_bad_and_expired_tokens(self):
+        """Test malformed tokens are rejected and stale ones must resync"""
+        response = self.client.get(self.url, {'changed_since': 'abc'})
+        self.assertEqual(response.data['code'], 'invalid_sync_request')
+        stale = make_token(1, int(time.time()) - 31 * 86400)
+        response = self.client.get(self.url, {'changed_since': stale})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_compaction_drops_old_tombstones(self):
+        """Test the compaction task keeps live books and recent tombstones"""
+        first_id, second_id = self.first.id, self.second.id
+        self.first.delete()
+        self.second.delete()
+        BookChange.objects.filter(book_id=first_id).update(created=timezone.now() - timedelta(days=40))
+        self.assertEqual(compact_sync_log(), {'deleted': 1})
+        self.assertEqual(list(BookChange.objects.values_list('book_id', flat=True)), [second_id])
+
+
+class BranchTests(TestCase):
+    """Test cases for branch-scoped catalogue, search, loans and transfers"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='AdminPass123!')
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='Pass123!')
+        self.north = Branch.objects.create(code='north', name='North')
+        self.south = Branch.objects.create(code='south', name='South')
+        self.north_book = Book.objects.create(title='Northern Lights', author=self.admin, isbn='0306406152',
+                                              page_count=10, branch=self.north)
+        self.south_book = Book.objects.create(title='Southern Lights', author=self.admin, isbn='9780441172719',
+                                              page_count=10, branch=self.south)
+
+    def test_branch_catalogue_and_search(self):
+        """Test branch endpoints only return the branch's own books"""
+        data = self.client.get(reverse('branch_books', args=[self.north.id])).data['data']
+        self.assertEqual([book['id'] for book in data['books']], [self.north_book.id])
+        self.assertEqual(data['facets']['availability'], {'available': 1, 'unavailable': 0})
+        self.assertEqual(self.client.get(reverse('books')).data['data']['count'], 2)
+
+        data = self.client.get(reverse('branch_search', args=[self.south.id]), {'title': 'lights'}).data['data']
+        self.assertEqual([book['id'] for book in data], [self.south_book.id])
+
+    def test_branch_borrow(self):
+        """Test borrowing at a branch only claims that branch's books and books the loan to it"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('branch_borrow', args=[self.north.id]), {'book_id': self.south_book.id})
+        self.assertEqual(response.data['code'], 'book_not_available')
+        response = self.client.post(reverse('branch_borrow', args=[self.north.id]), {'book_id': self.north_book.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.post(reverse('borrow_book'), {'book_id': self.south_book.id})
+        self.assertEqual(
+            dict(Loan.objects.values_list('book_id', 'branch_id')),
+            {self.north_book.id: self.north.id, self.south_book.id: self.south.id}
+        )
+
+        self.client.force_authenticate(user=self.admin)
+        loans = self.client.get(reverse('branch_borrow', args=[self.south.id])).data['data']
+        self.assertEqual([loan['book_id'] for loan in loans], [self.south_book.id])
+
+    def test_transfer_moves_available_books(self):
+        """Test transfers move available books, skip loaned ones and keep a history"""
+        spare = Book.objects.create(title='Spare', author=self.admin, isbn='080442957X', page_count=10,
+                                    branch=self.north, availability=False)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(reverse('branch_transfers'), {
+            'book_ids': [self.north_book.id, spare.id, self.south_book.id], 'to_branch': self.south.id
+        }, format='json')
+        self.assertEqual(response.data['data'], {'transferred': [self.north_book.id],
+                                                 'skipped': sorted([spare.id, self.south_book.id])})
+        self.north_book.refresh_from_db()
+        self.assertEqual(self.north_book.branch, self.south)
+        transfer = Transfer.objects.get()
+        self.assertEqual((transfer.from_branch, transfer.to_branch), (self.north, self.south))
+        self.assertTrue(OutboxEvent.objects.filter(topic='book.transferred', book_id=self.north_book.id).exists())
+        self.assertTrue(BookChange.objects.filter(book_id=self.north_book.id).exists())
+
+        data = self.client.get(reverse('branch_books', args=[self.south.id])).data['data']
+        self.assertEqual(data['count'], 2)
+        history = self.client.get(reverse('branch_transfers'), {'branch': self.north.id}).data['data']
+        self.assertEqual([row['book_id'] for row in history['transfers']], [self.north_book.id])
+
+    def test_branch_is_not_changed_by_an_update(self):
+        """Test a book update cannot move the book; moves go through transfers"""
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('books', args=[self.north_book.id])
+        response = self.client.patch(url, {'branch': self.south.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('branch', response.data['data'])
+        response = self.client.patch(url, {'branch': self.north.id, 'title': 'Northern Lights II'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.north_book.refresh_from_db()
+        self.assertEqual((self.north_book.branch, self.north_book.title), (self.north, 'Northern Lights II'))
+
+    def test_branch_queries_use_composite_indexes(self):
+        """Test branch-scoped lookups are answered from the (branch, ...) indexes"""
+        plan = Book.objects.filter(branch=self.north, availability=True).order_by('-created').explain()
+        self.assertRegex(plan, r'book_branch(_availability)?_idx')
+        plan = Loan.objects.filter(branch=self.north).order_by('-loan_date').explain()
+        self.assertIn('loan_branch_idx', plan)
+
+
+@override_settings(RECOMMENDATIONS_SETTLE_SECONDS=0)
+class BookRecommendationTests(TestCase):
+    """Test cases for "borrowed together" recommendations"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='Pass123!')
+        self.books = [
+            Book.objects.create(title=f'Book {n}', author=self.author, isbn=isbn13(n), page_count=10)
+            for n in range(4)
+        ]
+        self.readers = [
+            User.objects.create_user(username=f'reader{n}', email=f'reader{n}@example.com', password='Pass123!')
+            for n in range(3)
+        ]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.state = os.path.join(directory, 'cooccurrence.npz')
+
+    def borrow(self, reader, *books):
+        for book in books:
+            Loan.objects.create(book=self.books[book], user=self.readers[reader])
+
+    def recommended(self, book):
+        response = self.client.get(reverse('book_recommendations', args=[self.books[book].id]))
+        return [(row['id'], row['score']) for row in response.data['data']]
+
+    def update(self, **kwargs):
+        from books.recommendations import update_recommendations
+        return update_recommendations(path=self.state, **kwargs)
+
+    def test_served_in_one_query(self):
+        """Test recommendations are read from the precomputed table in one query"""
+        BookRecommendation.objects.create(book=self.books[0], recommended=self.books[2], rank=1, score=1)
+        BookRecommendation.objects.create(book=self.books[0], recommended=self.books[1], rank=0, score=3)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.recommended(0), [(self.books[1].id, 3), (self.books[2].id, 1)])
+
+    @unittest.skipUnless(importlib.util.find_spec('scipy'), 'numpy/scipy are not installed')
+    def test_incremental_updates_match_rebuild(self):
+        """Test new loans are folded in incrementally with the same result as a rebuild"""
+        self.borrow(0, 0, 1, 2)
+        self.borrow(1, 0, 1, 1)
+        self.assertEqual(self.update()['loans'], 6)
+        self.assertEqual(self.recommended(0), [(self.books[1].id, 2), (self.books[2].id, 1)])
+        self.assertEqual(self.recommended(3), [])
+
+        # Only the new loans are read; ties go to the lower book id
+        self.borrow(2, 0, 2, 3)
+        self.assertEqual(self.update()['loans'], 3)
+        self.assertEqual(self.recommended(0), [(self.books[1].id, 2), (self.books[2].id, 2), (self.books[3].id, 1)])
+        incremental = list(BookRecommendation.objects.values_list('book_id', 'recommended_id', 'rank', 'score'))
+
+        self.update(rebuild=True)
+        rebuilt = list(BookRecommendation.objects.values_list('book_id', 'recommended_id', 'rank', 'score'))
+        self.assertEqual(incremental, rebuilt)
+
+    @unittest.skipUnless(importlib.util.find_spec('scipy'), 'numpy/scipy are not installed')
+    @override_settings(RECOMMENDATIONS_TOP_N=1)
+    def test_top_n_and_deleted_books(self):
+        """Test only the top N neighbours are stored and deleted books are left out"""
+        self.borrow(0, 0, 1, 2)
+        self.borrow(1, 0, 2)
+        self.books[2].delete()
+        self.update()
+        self.assertEqual(self.recommended(0), [(self.books[1].id, 1)])
+
+    @unittest.skipUnless(importlib.util.find_spec('scipy'), 'numpy/scipy are not installed')
+    @override_settings(RECOMMENDATIONS_SETTLE_SECONDS=60)
+    def test_young_loans_wait_for_the_next_run(self):
+        """Test loans still inside the settle window, and every later id, are left for the next run"""
+        self.borrow(0, 0, 1)
+        self.borrow(1, 0, 2)
+        loans = list(Loan.objects.order_by('id'))
+        Loan.objects.exclude(pk=loans[1].pk).update(loan_date=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.update(), {'loans': 1, 'books': 0, 'last_loan_id': loans[0].id})
+
+        Loan.objects.filter(pk=loans[1].pk).update(loan_date=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.update()['loans'], 3)
+        self.assertEqual(self.recommended(0), [(self.books[1].id, 1), (self.books[2].id, 1)])
+
+    @unittest.skipUnless(importlib.util.find_spec('scipy'), 'numpy/scipy are not installed')
+    def test_one_run_at_a_time(self):
+        """Test an update started while another is running returns without touching the state"""
+        from books.recommendations import exclusive_run
+        self.borrow(0, 0, 1)
+        with exclusive_run() as acquired:
+            self.assertTrue(acquired)
+            self.assertEqual(self.update(), {'skipped': 'another update is running'})
+        self.assertFalse(os.path.exists(self.state))
+        self.assertEqual(self.update()['loans'], 2)
+        self.assertEqual(os.listdir(os.path.dirname(self.state)), ['cooccurrence.npz'])
+
+
+def make_image(size=(800, 1200), image_format='PNG'):
+    output = io.BytesIO()
+    Image.new('RGB', size, 'navy').save(output, image_format)
+    return output.getvalue()
+
+
+class ReconcileAvailabilityTests(TestCase):
+    """Test cases for reconciling book availability with open loans"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='Pass123!')
+        self.reader = User.objects.create_user(username='reader', email='reader@example.com', password='Pass123!')
+        # Available but on loan, on loan without a loan, consistent, two open loans
+        self.books = [
+            Book.objects.create(title=f'Book {n}', author=self.author, isbn=isbn13(n), page_count=10,
+                                availability=availability)
+            for n, availability in enumerate([True, False, False, False, True])
+        ]
+        for book in [0, 2, 3, 3]:
+            Loan.objects.create(book=self.books[book], user=self.reader)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.state = os.path.join(directory, 'reconcile.json')
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_availability', *args, '--workers=1', '--chunk-size=2', f'--state={self.state}',
+                     stdout=out)
+        return out.getvalue()
+
+    def availability(self):
+        return [book.availability for book in Book.objects.order_by('id')]
+
+    def test_report_only(self):
+        """Test drifted books are reported and left alone"""
+        output = self.reconcile()
+        self.assertIn(f'available_on_loan: 1 (e.g. {self.books[0].id})', output)
+        self.assertIn(f'unavailable_not_on_loan: 1 (e.g. {self.books[1].id})', output)
+        self.assertIn(f'duplicate_open_loans: 1 (e.g. {self.books[3].id})', output)
+        self.assertEqual(self.availability(), [True, False, False, False, True])
+        self.assertFalse(os.path.exists(self.state))
+
+    def test_repair(self):
+        """Test repairs are set-based and logged for sync and event consumers"""
+        BookChange.objects.all().delete()
+        output = self.reconcile('--repair')
+        self.assertIn('repaired: 2', output)
+        self.assertEqual(self.availability(), [False, True, False, False, True])
+        self.assertEqual(set(BookChange.objects.values_list('book_id', flat=True)),
+                         {self.books[0].id, self.books[1].id})
+        self.assertEqual(OutboxEvent.objects.filter(topic='book.updated').count(), 2)
+        self.assertIn('available_on_loan: 0', self.reconcile())
+
+    def test_resumes_after_interruption(self):
+        """Test an interrupted run continues after its checkpoint without counting chunks twice"""
+        def interrupt(start, end, result):
+            raise KeyboardInterrupt
+
+        first = self.books[0].id
+        with self.assertRaises(KeyboardInterrupt):
+            Reconciliation(state_path=self.state, chunk_size=2, workers=1).run(progress=interrupt)
+        with open(self.state) as handle:
+            self.assertEqual(json.load(handle)['done_below'], first + 1)
+
+        output = self.reconcile()
+        self.assertIn(f'Resuming after book {first + 1}', output)
+        self.assertIn('available_on_loan: 1', output)
+        self.assertIn('duplicate_open_loans: 1', output)
+
+    def test_checkpoint_waits_for_earlier_chunks(self):
+        """Test chunks finished out of order only move the checkpoint once the gap is filled"""
+        reconciliation = Reconciliation(chunk_size=2, workers=1)
+        reconciliation.state['done_below'] = 0
+        empty = {issue: [] for issue in Reconciliation.ISSUES + ('repaired',)}
+        done = {}
+        reconciliation.finish_chunk(3, 5, dict(empty, available_on_loan=[3]), done, None)
+        self.assertEqual(reconciliation.state['done_below'], 0)
+        self.assertEqual(reconciliation.state['counts']['available_on_loan'], 0)
+        reconciliation.finish_chunk(1, 3, empty, done, None)
+        self.assertEqual(reconciliation.state['done_below'], 4)
+        self.assertEqual(reconciliation.state['counts']['available_on_loan'], 1)
+
+
+@override_settings(COVER_THUMBNAIL_PROCESSES=0)
+class BookCoverTests(TestCase):
+    """Test cases for cover uploads, thumbnails and cover files"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = self.settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='AdminPass123!')
+        self.book = Book.objects.create(title='Covered', author=self.admin, isbn='0306406152', page_count=10)
+        self.client.force_authenticate(user=self.admin)
+
+    def upload(self, data, name='cover.png'):
+        return self.client.put(reverse('book_cover', args=[self.book.id]),
+                               {'cover': SimpleUploadedFile(name, data)}, format='multipart')
+
+    def test_upload_renders_thumbnails_in_a_job(self):
+        """Test uploads are stored by content hash and resized by the job"""
+        data = make_image()
+        response = self.upload(data)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.cover.name, f'covers/{hashlib.sha256(data).hexdigest()}.png')
+        self.assertEqual(self.book.cover_variants, {})
+
+        job = Job.objects.get(pk=response.data['data']['job'])
+        result = registry[job.name](**job.kwargs)
+        self.assertTrue(result['attached'])
+        self.book.refresh_from_db()
+        self.assertEqual(set(self.book.cover_variants), {'small', 'medium', 'large'})
+        with self.book.cover.storage.open(self.book.cover_variants['small']) as handle:
+            self.assertEqual(Image.open(handle).size, (160, 240))
+
+        listed = self.client.get(reverse('books')).data['data']['books'][0]['cover']
+        self.assertEqual(listed['original'], f'/books/covers/{hashlib.sha256(data).hexdigest()}.png')
+        self.assertTrue(listed['small'].endswith('.webp'))
+
+    def test_replaced_cover_ignores_stale_job(self):
+        """Test a job for a replaced cover does not attach its thumbnails"""
+        first = self.upload(make_image()).data['data']['job']
+        self.upload(make_image(image_format='JPEG'), 'cover.jpg')
+        job = Job.objects.get(pk=first)
+        self.assertFalse(registry[job.name](**job.kwargs)['attached'])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.cover_variants, {})
+
+    def test_rejects_invalid_uploads(self):
+        """Test non-images and oversized uploads are rejected"""
+        self.assertEqual(self.upload(b'not an image').data['code'], 'invalid_cover')
+        with self.settings(COVER_MAX_UPLOAD_BYTES=10):
+            self.assertEqual(self.upload(make_image()).data['code'], 'cover_too_large')
+        with self.settings(COVER_MAX_PIXELS=100):
+            self.assertEqual(self.upload(make_image()).data['code'], 'invalid_cover')
+
+    def test_cover_files_are_cached_for_good(self):
+        """Test cover files are served immutable with an ETag"""
+        self.upload(make_image())
+        self.book.refresh_from_db()
+        url = covers.cover_url(self.book.cover.name)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'image/png')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        for name in ['missing.png', f'{"0" * 64}.png', '..', '.']:
+            response = self.client.get(reverse('cover_file', args=[name]))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, name)
+
+    def test_remove_cover(self):
+        """Test removing a cover clears it from the book"""
+        self.upload(make_image())
+        self.client.delete(reverse('book_cover', args=[self.book.id]))
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.cover)
+        self.assertIsNone(covers.cover_urls(self.book))
+
+    @override_settings(COVER_THUMBNAIL_PROCESSES=1)
+    def test_process_pool(self):
+        """Test thumbnails are rendered by the process pool"""
+        def shutdown():
+            covers.get_pool().shutdown()
+            covers._pool = None
+        self.addCleanup(shutdown)
+        variants = covers.render_variants(make_image((100, 100)))
+        self.assertEqual(len(set(variants.values())), 1)
+
+
+class BookQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Query counts of the books endpoints must not grow with the data"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.superuser = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='AdminPass123!',
+            first_name='Admin',
+            last_name='User'
+        )
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='Pass123!',
+            first_name='Test',
+            last_name='User'
+        )
+
+    def add_books(self, count, availability=True, branch=None):
+        start = Book.objects.count()
+        books = Book.objects.bulk_create(
+            Book(
+                title=f'Budget Book {start + index}',
+                author=self.superuser,
+                isbn=f'{start + index:010d}',
+                page_count=100 + index,
+                availability=availability,
+                branch=branch
+            )
+            for index in range(count)
+        )
+        bump_catalogue_version()
+        return books
+
+    def add_loans(self, count):
+        start = User.objects.count()
+        borrowers = User.objects.bulk_create(
+            User(username=f'borrower{start + index}', email=f'borrower{start + index}@example.com')
+            for index in range(count)
+        )
+        self.add_books(count, availability=False)
+        books = Book.objects.order_by('-id')[:count]
+        Loan.objects.bulk_create(Loan(book=book, user=user) for book, user in zip(books, borrowers))
+
+    def test_list_books(self):
+        """Test listing books"""
+        url = reverse('books')
+        self.assertConstantQueries(self.add_books, lambda: self.client.get(url, {'page_size': 20}))
+
+    def test_autocomplete_books(self):
+        """Test title autocomplete"""
+        url = reverse('autocomplete_book')
+        title_index.build_from_db()
+        self.assertConstantQueries(self.add_books, lambda: self.client.get(url, {'q': 'budget'}))
+
+    def test_isbn_lookup(self):
+        """Test ISBN lookup"""
+        url = reverse('isbn_lookup')
+        isbns = ','.join(isbn13(n) for n in range(100))
+        self.assertConstantQueries(self.add_books, lambda: self.client.get(url, {'isbn': isbns}))
+
+    def test_search_books(self):
+        """Test searching books by title"""
+        url = reverse('search_book')
+        self.assertConstantQueries(self.add_books, lambda: self.client.get(url, {'title': 'Budget'}))
+
+    @override_settings(SYNC_SETTLE_SECONDS=0)
+    def test_sync_books(self):
+        """Test delta sync"""
+        url = reverse('book_sync')
+
+        def add_rows(count):
+            ids = [book.pk for book in self.add_books(count)]
+            bulk.record_changes(ids)
+            bulk.record_changes(ids, deleted=True)
+
+        self.assertConstantQueries(add_rows, lambda: self.client.get(url, {'limit': 500}))
+        self.assertConstantQueries(
+            add_rows, lambda: self.client.get(url, {'changed_since': make_token(0), 'limit': 500}),
+            row_counts=(101, 110, 200)
+        )
+
+    def test_branch_books_and_search(self):
+        """Test a branch's catalogue and search"""
+        branch = Branch.objects.create(code='north', name='North')
+        add_rows = lambda count: self.add_books(count, branch=branch)
+        url = reverse('branch_books', args=[branch.id])
+        self.assertConstantQueries(add_rows, lambda: self.client.get(url, {'page_size': 20}))
+        url = reverse('branch_search', args=[branch.id])
+        self.assertConstantQueries(add_rows, lambda: self.client.get(url, {'title': 'Budget'}),
+                                   row_counts=(101, 110, 200))
+
+    def test_transfer_history(self):
+        """Test listing transfers as superuser"""
+        self.client.force_authenticate(user=self.superuser)
+        north = Branch.objects.create(code='north', name='North')
+        south = Branch.objects.create(code='south', name='South')
+
+        def add_rows(count):
+            Transfer.objects.bulk_create(
+                Transfer(book=book, from_branch=north, to_branch=south, user=self.superuser)
+                for book in self.add_books(count, branch=south)
+            )
+
+        url = reverse('branch_transfers')
+        self.assertConstantQueries(add_rows, lambda: self.client.get(url))
+        self.assertConstantQueries(add_rows, lambda: self.client.get(url, {'branch': north.id}),
+                                   row_counts=(101, 110, 200))
+
+    def test_recommendations(self):
+        """Test reading a book's recommendations"""
+        book = self.add_books(1)[0]
+
+        def add_rows(count):
+            start = BookRecommendation.objects.count()
+            BookRecommendation.objects.bulk_create(
+                BookRecommendation(book=book, recommended=recommended, rank=start + rank, score=1)
+                for rank, recommended in enumerate(self.add_books(count))
+            )
+
+        url = reverse('book_recommendations', args=[book.id])
+        self.assertConstantQueries(add_rows, lambda: self.client.get(url))
+
+    def test_list_loans(self):
+        """Test listing loans as superuser"""
+        self.client.force_authenticate(user=self.superuser)
+        url = reverse('borrow_book')
+        self.assertConstantQueries(self.add_loans, lambda: self.client.get(url))
+
+    def test_admin_book_changelist(self):
+        """Test the Book admin changelist"""
+        self.client.force_login(self.superuser)
+        url = reverse('admin:books_book_changelist')
+        self.assertConstantQueries(self.add_books, lambda: self.client.get(url))
+
+    def test_admin_loan_changelist(self):
+        """Test the Loan admin changelist"""
+        self.client.force_login(self.superuser)
+        url = reverse('admin:books_loan_changelist')
+        self.assertConstantQueries(self.add_loans, lambda: self.client.get(url))
+
+    def test_borrow_book(self):
+        """Test borrowing a book"""
+        self.client.force_authenticate(user=self.user)
+        url = reverse('borrow_book')
+        borrow = lambda: self.client.post(url, {'book_id': Book.objects.filter(availability=True).first().id})
+        self.assertConstantQueries(self.add_books, borrow)
+
+    def test_return_book(self):
+        """Test returning a book"""
+        self.client.force_authenticate(user=self.user)
+        url = reverse('return_book')
+
+        def add_rows(count):
+            self.add_books(count, availability=False)
+            Loan.objects.bulk_create(
+                Loan(book=book, user=self.user) for book in Book.objects.order_by('-id')[:count]
+            )
+
+        def return_book():
+            loan = Loan.objects.filter(return_date__isnull=True).first()
+            return self.client.post(url, {'book_id': loan.book_id})
+
+        self.assertConstantQueries(add_rows, return_book)
+
+    def test_create_update_delete_book(self):
+        """Test book create, update and delete as superuser"""
+        self.client.force_authenticate(user=self.superuser)
+        url = reverse('books')
+        created = []
+
+        def create():
+            created.append(isbn13(900000 + len(created)))
+            data = {'title': 'New Book', 'isbn': created[-1], 'page_count': 250}
+            return self.client.post(url, data, format='json')
+
+        self.assertConstantQueries(self.add_books, create)
+        detail = lambda: reverse('books', kwargs={'pk': Book.objects.first().id})
+        self.assertConstantQueries(
+            self.add_books,
+            lambda: self.client.patch(detail(), {'page_count': 300}, format='json'),
+            row_counts=(101, 110, 200)
+        )
+        self.assertConstantQueries(
+            self.add_books, lambda: self.client.delete(detail()), row_counts=(201, 210, 300)
+        )
+
+
+class BookAdminTests(TestCase):
+    """Test cases for the Book and Loan admin on large tables"""
+
+    def setUp(self):
+        self.superuser = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123!'
+        )
+        self.client.force_login(self.superuser)
+        self.book = Book.objects.create(
+            title='Dune Messiah', author=self.superuser, isbn='0-306-40615-2', page_count=300
+        )
+        Book.objects.create(title='Children of Dune', author=self.superuser, isbn='9780441172719', page_count=400)
+        self.reader = User.objects.create_user(username='reader', email='reader@example.com', password='Pass123!')
+        Loan.objects.create(book=self.book, user=self.reader)
+
+    def search(self, model, term):
+        response = self.client.get(reverse(f'admin:books_{model}_changelist'), {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['cl'].result_list)
+
+    def test_book_search_uses_prefix_isbn_and_username(self):
+        self.assertEqual(self.search('book', 'dune m'), [self.book])
+        self.assertEqual(self.search('book', 'Messiah'), [])
+        self.assertEqual(self.search('book', '9780306406157'), [self.book])
+        self.assertEqual(len(self.search('book', 'admin')), 2)
+
+    def test_loan_search(self):
+        self.assertEqual(len(self.search('loan', 'reader')), 1)
+        self.assertEqual(len(self.search('loan', '0306406152')), 1)
+        self.assertEqual(self.search('loan', 'nobody'), [])
+
+    def test_count_stops_at_limit(self):
+        with self.settings(ADMIN_EXACT_COUNT_LIMIT=1):
+            response = self.client.get(reverse('admin:books_book_changelist'), {'availability__exact': '1'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_date_filter_lists_years(self):
+        response = self.client.get(reverse('admin:books_book_changelist'))
+        created_filter = response.context['cl'].filter_specs[1]
+        titles = [title for title, _ in created_filter.links]
+        self.assertIn(str(timezone.now().year), titles)
+
+    def test_loan_book_autocomplete(self):
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'books', 'model_name': 'loan', 'field_name': 'book', 'term': 'children',
+        })
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Children of Dune'])
+
+
+class LoadTestToolingTests(TestCase):
+    """Test cases for the seeding command and load-test reporting"""
+
+    def test_seed_library(self):
+        """Test seeded availability matches the open loans"""
+        call_command('seed_library', users=5, books=30, loans=40, authors=2, batch_size=7, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 7)
+        self.assertEqual(Book.objects.count(), 30)
+        self.assertEqual(Loan.objects.count(), 40)
+        open_loans = Loan.objects.filter(return_date__isnull=True)
+        self.assertEqual(open_loans.count(), 4)
+        self.assertEqual(
+            set(open_loans.values_list('book_id', flat=True)),
+            set(Book.objects.filter(availability=False).values_list('id', flat=True))
+        )
+
+    def test_copy_columns_cover_required_columns(self):
+        """Test COPY writes every NOT NULL column without a database default"""
+        for model, columns in COLUMNS.items():
+            required = [
+                field.column for field in model._meta.concrete_fields
+                if not field.primary_key and not field.null and field.db_default is models.NOT_PROVIDED
+            ]
+            self.assertEqual([column for column in required if column not in columns], [], model)
+
+    def test_summarize_report(self):
+        """Test percentiles, throughput and error counts in the report"""
+        samples = {'browse': [(index / 1000, 200) for index in range(1, 101)] + [(0.5, 503)]}
+        report = summarize(samples, elapsed=10)
+        browse = report['endpoints']['browse']
+        self.assertEqual(browse['requests'], 101)
+        self.assertEqual(browse['errors'], 1)
+        self.assertEqual(browse['rps'], 10.1)
+        self.assertEqual(browse['p50_ms'], 51.0)
+        self.assertEqual(browse['p99_ms'], 100.0)
+        self.assertEqual(browse['status'], {'200': 100, '503': 1})
+        self.assertEqual(report['total']['requests'], 101)
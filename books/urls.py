@@ -1,11 +1,25 @@
 from django.urls import path
-from .views import BookAPIView, BorrowBookAPIView , ReturnBookAPIView, BookSearchAPIView
+from .views import BookAPIView, BorrowBookAPIView , ReturnBookAPIView, BookSearchAPIView, BookAutocompleteAPIView, BookISBNLookupAPIView, BookEventsView, BookSyncAPIView, BookCoverAPIView, CoverFileView, BranchAPIView, BranchBookAPIView, TransferAPIView, BookRecommendationAPIView, BookBulkUpdateAPIView, BookBulkDeleteAPIView
 
 urlpatterns = [
     path('', BookAPIView.as_view(), name='books'),
     path('<int:pk>/', BookAPIView.as_view(), name='books'),
+    path('bulk/update/', BookBulkUpdateAPIView.as_view(), name='books_bulk_update'),
+    path('bulk/delete/', BookBulkDeleteAPIView.as_view(), name='books_bulk_delete'),
     path('borrow/', BorrowBookAPIView.as_view(), name='borrow_book'),
     path('return/', ReturnBookAPIView.as_view(), name='return_book'),
     path('search/', BookSearchAPIView.as_view(), name='search_book'),
+    path('autocomplete/', BookAutocompleteAPIView.as_view(), name='autocomplete_book'),
+    path('isbn/', BookISBNLookupAPIView.as_view(), name='isbn_lookup'),
+    path('events/', BookEventsView.as_view(), name='book_events'),
+    path('sync/', BookSyncAPIView.as_view(), name='book_sync'),
+    path('<int:pk>/cover/', BookCoverAPIView.as_view(), name='book_cover'),
+    path('<int:pk>/recommendations/', BookRecommendationAPIView.as_view(), name='book_recommendations'),
+    path('covers/<str:name>', CoverFileView.as_view(), name='cover_file'),
+    path('branches/', BranchAPIView.as_view(), name='branches'),
+    path('branches/transfers/', TransferAPIView.as_view(), name='branch_transfers'),
+    path('branches/<int:branch_id>/books/', BranchBookAPIView.as_view(), name='branch_books'),
+    path('branches/<int:branch_id>/search/', BookSearchAPIView.as_view(), name='branch_search'),
+    path('branches/<int:branch_id>/borrow/', BorrowBookAPIView.as_view(), name='branch_borrow'),
     
 ]
@@ -3,18 +3,123 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from library_app.utils import wrap_response
+from library_app.idempotency import idempotent
 from rest_framework.permissions import IsAuthenticated , AllowAny
 from library_app.permissions import IsSuperUser
-from .models import Book , Loan
-from .serializers import BookSerializer, BookCreateUpdateSerializer, LoanSerializer
+from .models import Book , BookRecommendation , Branch , Loan , Transfer
+from .serializers import BookSerializer, BookCreateUpdateSerializer, LoanSerializer, BookFilterSerializer, BranchSerializer, TransferSerializer, BookBulkSerializer, BookBulkUpdateSerializer
+from .autocomplete import title_index
+from .bulk import bulk_delete, bulk_update, plan_update
+from .isbn import normalize_isbn
+from .covers import DIRECTORY as COVER_DIRECTORY, NAME_PATTERN as COVER_NAME_PATTERN, cover_urls, inspect_cover, store as store_cover
+from .outbox import record_book_event, record_event
+from .sync import SyncTokenExpired, changes_since, record_change
+from .events import EventFilter, event_stream, latest_event_id, missed_events
+from .cache import bump_catalogue_version, cache_compressed_body, catalogue_cache_key, get_catalogue_entry, set_catalogue_entry
+from user.dashboard import invalidate_dashboard
+from jobs.queue import enqueue
+from library_app.db_router import read_from
+from audit import log as audit_log
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views import View
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
 from django.utils import timezone
+from functools import partial
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import FormParser, MultiPartParser
+
+
+# isbn13 is the only unique field a client sets
+DUPLICATE_ISBN_ERRORS = {"isbn": ["A book with this ISBN already exists"]}
+
+
+class CountedPaginator(Paginator):
+    """Paginator that trusts a row count computed elsewhere instead of running COUNT(*)"""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
 
 class BookPagination(PageNumberPagination):
     page_size = 10 
     page_size_query_param = 'page_size' 
     max_page_size = 20 
 
+    def paginate_queryset(self, queryset, request, view=None, count=None):
+        self.django_paginator_class = partial(CountedPaginator, count=count)
+        return super().paginate_queryset(queryset, request, view)
+
+
+def book_facets(books):
+    """Total, availability and per-author counts of a Book queryset in one GROUP BY query"""
+    rows = (
+        books.order_by()
+        .values('availability', 'author_id', 'author__username')
+        .annotate(total=Count('id'))
+    )
+    availability = {'available': 0, 'unavailable': 0}
+    authors = {}
+    for row in rows:
+        availability['available' if row['availability'] else 'unavailable'] += row['total']
+        author = authors.setdefault(row['author_id'], {
+            'id': row['author_id'], 'username': row['author__username'], 'count': 0,
+        })
+        author['count'] += row['total']
+    return {
+        'count': availability['available'] + availability['unavailable'],
+        'availability': availability,
+        'authors': sorted(authors.values(), key=lambda author: (-author['count'], author['id'])),
+    }
+
+
+def catalogue_page(request , books):
+    """One page of an already filtered Book queryset, with its facets"""
+    facets = book_facets(books)
+    paginator = BookPagination()
+    result_page = paginator.paginate_queryset(books , request , count=facets['count'])
+    serializer = BookSerializer(result_page , many=True)
+    return {
+        "count": facets['count'],
+        "next": paginator.get_next_link(),
+        "previous": paginator.get_previous_link(),
+        "books": serializer.data,
+        "facets": {
+            "availability": facets['availability'],
+            "authors": facets['authors'],
+        },
+    }
+
+
+def catalogue_response(request , books , cache_name='books'):
+    """A filtered page of `books` with its facets; both are cached together, under `cache_name`, until the catalogue changes"""
+    filters = BookFilterSerializer(data=request.query_params.dict())
+    if not filters.is_valid():
+        return wrap_response(success=False , code="invalid_filters" , message='Invalid filters' , errors=filters.errors , status_code=status.HTTP_400_BAD_REQUEST)
+
+    cache_key = catalogue_cache_key(cache_name , request)
+    data = get_catalogue_entry(cache_key)
+    if data is None:
+        # Entries outlive the request, so fill them from the primary: a lagging
+        # replica would store a page older than the version it is keyed under
+        with read_from(None):
+            data = catalogue_page(request , filters.filter_queryset(books))
+        set_catalogue_entry(cache_key, data)
+    response = wrap_response(
+        success=True,
+        code="books_retrieved",
+        data=data , 
+        status_code=status.HTTP_200_OK)
+    return cache_compressed_body(response , cache_key)
+
+
 class BookAPIView(APIView):
     def get_permissions(self):
         if self.request.method == 'GET':
@@ -24,25 +129,20 @@ class BookAPIView(APIView):
 
 
     def get(self , request):
-        books = Book.objects.all()
-        paginator = BookPagination()
-        result_page = paginator.paginate_queryset(books,request)
-        serializer = BookSerializer(result_page , many=True)
-        return wrap_response(
-            success=True,
-            code="books_retrieved",
-            data={
-                "count": paginator.page.paginator.count,
-                "next": paginator.get_next_link(),
-                "previous": paginator.get_previous_link(),
-                "books": serializer.data,
-            } , 
-            status_code=status.HTTP_200_OK)
+        return catalogue_response(request , Book.objects.all())
     
+    @idempotent
     def post(self , request):
         serializer = BookCreateUpdateSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(author=request.user)
+            try:
+                with transaction.atomic():
+                    book = serializer.save(author=request.user)
+                    record_book_event('book.created' , book)
+                    audit_log.record('book.created' , book.id , request.user , fields=serializer.data)
+            except IntegrityError:
+                # A concurrent request saved the same ISBN after validation
+                return wrap_response(success=False , code="book_creation_failed" , message='Book creation failed' , data=DUPLICATE_ISBN_ERRORS , status_code=status.HTTP_400_BAD_REQUEST)
             return wrap_response(success=True , code="book_created" , message='Book created successfully' , data=serializer.data , status_code=status.HTTP_201_CREATED)
         return wrap_response(success=False , code="book_creation_failed" , message='Book creation failed' , data=serializer.errors , status_code=status.HTTP_400_BAD_REQUEST)
 
@@ -50,15 +150,65 @@ class BookAPIView(APIView):
         book = Book.objects.get(pk=pk)
         serializer = BookCreateUpdateSerializer(book , data=request.data , partial=True)    
         if serializer.is_valid():
-            serializer.save()
+            try:
+                with transaction.atomic():
+                    serializer.save()
+                    record_book_event('book.updated' , book)
+                    audit_log.record('book.updated' , book.id , request.user , changes={field: serializer.data[field] for field in serializer.validated_data})
+            except IntegrityError:
+                return wrap_response(success=False , code="book_update_failed" , message='Book update failed' , data=DUPLICATE_ISBN_ERRORS , status_code=status.HTTP_400_BAD_REQUEST)
             return wrap_response(success=True , code="book_updated" , message='Book updated successfully' , data=serializer.data , status_code=status.HTTP_200_OK)
         return wrap_response(success=False , code="book_update_failed" , message='Book update failed' , data=serializer.errors , status_code=status.HTTP_400_BAD_REQUEST)
 
     def delete(self , request , pk):
         book = Book.objects.get(pk=pk)
-        book.delete()
+        with transaction.atomic():
+            record_event('book.deleted' , book.id)
+            audit_log.record('book.deleted' , book.id , request.user , title=book.title , isbn=book.isbn)
+            book.delete()
         return wrap_response(success=True , code="book_deleted" , message='Book deleted successfully' , status_code=status.HTTP_200_OK)
 
+
+# Skipped book ids listed in a bulk update response
+SKIPPED_IDS = 100
+
+
+class BookBulkUpdateAPIView(APIView):
+    """Change many books at once, selected by id or by the catalogue filters"""
+    permission_classes = [IsAuthenticated , IsSuperUser]
+
+    @idempotent
+    def post(self , request):
+        serializer = BookBulkUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return wrap_response(success=False , code="invalid_bulk_update" , message='Invalid bulk update' , errors=serializer.errors)
+        changes = serializer.validated_data['changes']
+        books , skipped = plan_update(serializer.get_queryset() , changes)
+        # Books the changes can't apply to because of their loans are left alone
+        skipped = {"skipped": skipped.count() , "skipped_ids": list(skipped.order_by('pk').values_list('pk' , flat=True)[:SKIPPED_IDS])}
+        if serializer.validated_data['dry_run']:
+            matched = books.count()
+            return wrap_response(success=True , code="bulk_update_dry_run" , message=f'{matched} books would be updated' , data={"matched": matched , **skipped} , status_code=status.HTTP_200_OK)
+        updated = bulk_update(serializer.get_queryset() , changes , request.user)
+        return wrap_response(success=True , code="books_updated" , message=f'{updated} books updated' , data={"updated": updated , **skipped} , status_code=status.HTTP_200_OK)
+
+
+class BookBulkDeleteAPIView(APIView):
+    """Delete many books at once, selected by id or by the catalogue filters"""
+    permission_classes = [IsAuthenticated , IsSuperUser]
+
+    @idempotent
+    def post(self , request):
+        serializer = BookBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return wrap_response(success=False , code="invalid_bulk_delete" , message='Invalid bulk delete' , errors=serializer.errors)
+        books = serializer.get_queryset()
+        if serializer.validated_data['dry_run']:
+            matched = books.count()
+            return wrap_response(success=True , code="bulk_delete_dry_run" , message=f'{matched} books would be deleted' , data={"matched": matched} , status_code=status.HTTP_200_OK)
+        deleted = bulk_delete(books , request.user)
+        return wrap_response(success=True , code="books_deleted" , message=f'{deleted} books deleted' , data={"deleted": deleted} , status_code=status.HTTP_200_OK)
+
 class BorrowBookAPIView(APIView):
     def get_permissions(self):
         if self.request.method == 'GET':
@@ -66,21 +216,36 @@ class BorrowBookAPIView(APIView):
         else:
             return [IsAuthenticated()]
     
-    def post(self , request):
+    @idempotent
+    def post(self , request , branch_id=None):
         book_id = request.data.get('book_id')
         if not book_id:
             return wrap_response(success=False , code="book_id_required" , message='Book id is required' , status_code=status.HTTP_400_BAD_REQUEST)
-        try:
-            book = Book.objects.get(pk=book_id,availability=True)
-        except Book.DoesNotExist:
-            return wrap_response(success=False , code="book_not_available" , message='Book not available' , status_code=status.HTTP_400_BAD_REQUEST)
-        book.availability = False
-        book.save()
-        Loan.objects.create(book=book , user=request.user)
+        # The loan and its outbox event commit together with the availability change
+        with transaction.atomic():
+            # Claim the book only if it is still available, so concurrent borrows can't both win
+            books = Book.objects.filter(pk=book_id , availability=True)
+            if branch_id is not None:
+                books = books.filter(branch_id=branch_id)
+            claimed = books.update(availability=False)
+            if not claimed:
+                return wrap_response(success=False , code="book_not_available" , message='Book not available' , status_code=status.HTTP_400_BAD_REQUEST)
+            if branch_id is None:
+                # Loans are booked to the branch holding the book
+                branch_id = Book.objects.filter(pk=book_id).values_list('branch_id' , flat=True).get()
+            loan = Loan.objects.create(book_id=book_id , user=request.user , branch_id=branch_id)
+            record_event('loan.borrowed' , loan.book_id , loan_id=loan.id , user_id=request.user.id , loan_date=loan.loan_date)
+            # The availability update bypasses the model signals that log changes
+            record_change(loan.book_id)
+            audit_log.record('loan.borrowed' , loan.book_id , request.user , loan_id=loan.id , branch_id=branch_id)
+        bump_catalogue_version()
+        invalidate_dashboard(request.user.id)
         return wrap_response(success=True , code="book_borrowed" , message='Book borrowed successfully' , status_code=status.HTTP_200_OK)
 
-    def get(self , request):
-        loans = Loan.objects.all()
+    def get(self , request , branch_id=None):
+        loans = Loan.objects.select_related('book', 'user')
+        if branch_id is not None:
+            loans = loans.filter(branch_id=branch_id).order_by('-loan_date')
         serializer = LoanSerializer(loans , many=True)
         return wrap_response(success=True , code="loans_retrieved" , message='Loans retrieved successfully' , data=serializer.data , status_code=status.HTTP_200_OK)
 
@@ -88,34 +253,42 @@ class BorrowBookAPIView(APIView):
 class ReturnBookAPIView(APIView):
     permission_classes = [IsAuthenticated]
     
+    @idempotent
     def post(self , request):
         book_id = request.data.get('book_id')
         if not book_id:
             return wrap_response(success=False , code="book_id_required" , message='Book id is required' , status_code=status.HTTP_400_BAD_REQUEST)
-        # Update loan only if not already returned
-        updated_loan = (
-            Loan.objects
-            .filter(
-                user=request.user,
-                book_id=book_id,
-                return_date__isnull=True
+        returned_at = timezone.now()
+        with transaction.atomic():
+            # Update loan only if not already returned
+            updated_loan = (
+                Loan.objects
+                .filter(
+                    user=request.user,
+                    book_id=book_id,
+                    return_date__isnull=True
+                )
+                .update(return_date=returned_at)
             )
-            .update(return_date=timezone.now())
-        )
 
-        if updated_loan == 0:
-            return wrap_response(
-                success=False,
-                code="book_not_found",
-                message="book not found or already returned",
-                status_code=status.HTTP_400_BAD_REQUEST
-            )
+            if updated_loan == 0:
+                return wrap_response(
+                    success=False,
+                    code="book_not_found",
+                    message="book not found or already returned",
+                    status_code=status.HTTP_400_BAD_REQUEST
+                )
 
-        # Update book availability only if currently unavailable
-        Book.objects.filter(
-            id=book_id,
-            availability=False
-        ).update(availability=True)
+            # Update book availability only if currently unavailable
+            Book.objects.filter(
+                id=book_id,
+                availability=False
+            ).update(availability=True)
+            record_event('loan.returned', int(book_id), user_id=request.user.id, return_date=returned_at)
+            record_change(int(book_id))
+            audit_log.record('loan.returned' , int(book_id) , request.user)
+        bump_catalogue_version()
+        invalidate_dashboard(request.user.id)
 
         return wrap_response(
             success=True,
@@ -126,7 +299,7 @@ class ReturnBookAPIView(APIView):
 
 class BookSearchAPIView(APIView):
     permission_classes = [AllowAny]
-    def get(self, request):
+    def get(self, request, branch_id=None):
         title = request.query_params.get("title")
 
         if not title:
@@ -137,10 +310,285 @@ class BookSearchAPIView(APIView):
             )
 
         books = Book.objects.filter(title__icontains=title, availability=True)
+        if branch_id is not None:
+            books = books.filter(branch_id=branch_id)
         serializer = BookSerializer(books, many=True)
         return wrap_response(
             success=True,
             code = "books_retrieved",
             message="Books retrieved successfully",
             data=serializer.data
-        )
\ No newline at end of file
+        )
+
+
+class BookAutocompleteAPIView(APIView):
+    """Title suggestions for the search box, served from the in-memory index"""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    max_limit = 20
+
+    def get(self, request):
+        query = request.query_params.get("q", "")
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), self.max_limit)
+        except ValueError:
+            limit = 10
+        title_index.ensure_built()
+        return wrap_response(
+            success=True,
+            code="suggestions_retrieved",
+            data=title_index.search(query, limit=max(limit, 1))
+        )
+
+
+class BookISBNLookupAPIView(APIView):
+    """Resolve one or many ISBNs (ISBN-10 or ISBN-13, any formatting) in one indexed query"""
+    permission_classes = [AllowAny]
+    max_isbns = 100
+
+    def get(self, request):
+        isbns = [
+            isbn.strip()
+            for value in request.query_params.getlist("isbn")
+            for isbn in value.split(",")
+            if isbn.strip()
+        ]
+        if not isbns:
+            return wrap_response(
+                success=False,
+                code="isbn_required",
+                message="isbn query param is required"
+            )
+        if len(isbns) > self.max_isbns:
+            return wrap_response(
+                success=False,
+                code="too_many_isbns",
+                message=f"At most {self.max_isbns} ISBNs can be looked up at once"
+            )
+
+        normalized = {}
+        for isbn in isbns:
+            try:
+                normalized[isbn] = normalize_isbn(isbn)
+            except ValueError:
+                normalized[isbn] = None
+        books = {
+            book.isbn13: book
+            for book in Book.objects.filter(isbn13__in={value for value in normalized.values() if value})
+        }
+        return wrap_response(
+            success=True,
+            code="books_retrieved",
+            message="Books retrieved successfully",
+            data=[
+                {
+                    "isbn": isbn,
+                    "isbn13": normalized[isbn],
+                    "book": BookSerializer(books[normalized[isbn]]).data if normalized[isbn] in books else None,
+                }
+                for isbn in isbns
+            ]
+        )
+
+
+class BookRecommendationAPIView(APIView):
+    """Books often borrowed by patrons who borrowed this one, precomputed by books.update_recommendations"""
+    permission_classes = [AllowAny]
+
+    def get(self , request , pk):
+        recommendations = (
+            BookRecommendation.objects.filter(book_id=pk)
+            .order_by('rank')
+            .values('recommended_id' , 'recommended__title' , 'score')
+        )
+        data = [
+            {"id": row['recommended_id'] , "title": row['recommended__title'] , "score": row['score']}
+            for row in recommendations
+        ]
+        return wrap_response(success=True , code="recommendations_retrieved" , data=data , status_code=status.HTTP_200_OK)
+
+
+class BranchAPIView(APIView):
+    def get_permissions(self):
+        if self.request.method == 'GET':
+            return [AllowAny()]
+        return [IsAuthenticated() , IsSuperUser()]
+
+    def get(self , request):
+        serializer = BranchSerializer(Branch.objects.all() , many=True)
+        return wrap_response(success=True , code="branches_retrieved" , data=serializer.data , status_code=status.HTTP_200_OK)
+
+    def post(self , request):
+        serializer = BranchSerializer(data=request.data)
+        if serializer.is_valid():
+            with transaction.atomic():
+                branch = serializer.save()
+                audit_log.record('branch.created' , branch.id , request.user , code=branch.code)
+            return wrap_response(success=True , code="branch_created" , message='Branch created successfully' , data=serializer.data , status_code=status.HTTP_201_CREATED)
+        return wrap_response(success=False , code="branch_creation_failed" , message='Branch creation failed' , data=serializer.errors , status_code=status.HTTP_400_BAD_REQUEST)
+
+
+class BranchBookAPIView(APIView):
+    """One branch's catalogue, with the same filters and facets as the network-wide list"""
+    permission_classes = [AllowAny]
+
+    def get(self , request , branch_id):
+        return catalogue_response(request , Book.objects.filter(branch_id=branch_id) , f'branch:{branch_id}:books')
+
+
+class TransferAPIView(APIView):
+    """Move books to another branch and list past transfers"""
+    permission_classes = [IsAuthenticated , IsSuperUser]
+
+    def get(self , request):
+        transfers = Transfer.objects.all()
+        branch_id = request.query_params.get('branch')
+        if branch_id:
+            if not branch_id.isdigit():
+                return wrap_response(success=False , code="invalid_filters" , message='branch must be a branch id')
+            transfers = transfers.filter(Q(from_branch_id=branch_id) | Q(to_branch_id=branch_id))
+        paginator = BookPagination()
+        page = paginator.paginate_queryset(transfers.values('id' , 'book_id' , 'from_branch_id' , 'to_branch_id' , 'user_id' , 'created') , request)
+        return wrap_response(success=True , code="transfers_retrieved" , data={"next": paginator.get_next_link() , "transfers": page} , status_code=status.HTTP_200_OK)
+
+    @idempotent
+    def post(self , request):
+        serializer = TransferSerializer(data=request.data)
+        if not serializer.is_valid():
+            return wrap_response(success=False , code="invalid_transfer" , message='Invalid transfer' , errors=serializer.errors)
+        book_ids = serializer.validated_data['book_ids']
+        to_branch = serializer.validated_data['to_branch']
+        with transaction.atomic():
+            # Lock the books so a concurrent borrow can't check one out while it moves;
+            # books on loan stay where they are until they are returned
+            moving = dict(
+                Book.objects.select_for_update()
+                .filter(pk__in=book_ids , availability=True)
+                .exclude(branch=to_branch)
+                .values_list('id' , 'branch_id')
+            )
+            Book.objects.filter(pk__in=moving).update(branch=to_branch)
+            Transfer.objects.bulk_create(
+                Transfer(book_id=book_id , from_branch_id=from_branch_id , to_branch=to_branch , user=request.user)
+                for book_id , from_branch_id in moving.items()
+            )
+            for book_id , from_branch_id in moving.items():
+                record_event('book.transferred' , book_id , from_branch_id=from_branch_id , to_branch_id=to_branch.id)
+                record_change(book_id)
+                audit_log.record('book.transferred' , book_id , request.user , from_branch_id=from_branch_id , to_branch_id=to_branch.id)
+        if moving:
+            bump_catalogue_version()
+        data = {"transferred": sorted(moving) , "skipped": sorted(set(book_ids) - set(moving))}
+        return wrap_response(success=True , code="books_transferred" , message=f'{len(moving)} books transferred' , data=data , status_code=status.HTTP_200_OK)
+
+
+class BookCoverAPIView(APIView):
+    """Upload or remove a book's cover; thumbnails are rendered by a background job"""
+    permission_classes = [IsAuthenticated , IsSuperUser]
+    parser_classes = [MultiPartParser , FormParser]
+
+    def put(self , request , pk):
+        book = Book.objects.filter(pk=pk).first()
+        if book is None:
+            return wrap_response(success=False , code="book_not_found" , message='Book not found' , status_code=status.HTTP_404_NOT_FOUND)
+        upload = request.FILES.get('cover')
+        if upload is None:
+            return wrap_response(success=False , code="cover_required" , message='Upload the image as the cover field')
+        if upload.size > settings.COVER_MAX_UPLOAD_BYTES:
+            return wrap_response(success=False , code="cover_too_large" , message=f'Cover must be at most {settings.COVER_MAX_UPLOAD_BYTES} bytes')
+        data = upload.read()
+        try:
+            extension = inspect_cover(data)
+        except ValueError as error:
+            return wrap_response(success=False , code="invalid_cover" , message=str(error))
+
+        name = store_cover(data , extension)
+        with transaction.atomic():
+            book.cover = name
+            book.cover_variants = {}
+            book.save(update_fields=['cover' , 'cover_variants' , 'modified'])
+            audit_log.record('book.cover_uploaded' , book.id , request.user , cover=name)
+            job = enqueue('books.render_cover' , {'book_id': book.id , 'cover': name} , user=request.user)
+        return wrap_response(success=True , code="cover_uploaded" , message='Cover uploaded, thumbnails are being rendered' , data={'cover': cover_urls(book) , 'job': job.id} , status_code=status.HTTP_202_ACCEPTED)
+
+    def delete(self , request , pk):
+        book = Book.objects.filter(pk=pk).first()
+        if book is None:
+            return wrap_response(success=False , code="book_not_found" , message='Book not found' , status_code=status.HTTP_404_NOT_FOUND)
+        # Files stay in storage: other books may share the same content-hashed file
+        book.cover = ''
+        book.cover_variants = {}
+        with transaction.atomic():
+            book.save(update_fields=['cover' , 'cover_variants' , 'modified'])
+            audit_log.record('book.cover_removed' , book.id , request.user)
+        return wrap_response(success=True , code="cover_deleted" , message='Cover removed successfully' , status_code=status.HTTP_200_OK)
+
+
+class CoverFileView(View):
+    """Serve a cover file; names are content hashes, so responses are cacheable for good"""
+
+    def get(self , request , name):
+        if not COVER_NAME_PATTERN.fullmatch(name):
+            raise Http404('No such cover')
+        etag = f'"{name}"'
+        if etag in request.headers.get('If-None-Match' , ''):
+            response = HttpResponseNotModified()
+        else:
+            path = f'{COVER_DIRECTORY}/{name}'
+            if not default_storage.exists(path):
+                raise Http404('No such cover')
+            response = FileResponse(default_storage.open(path) , filename=name)
+        response['ETag'] = etag
+        patch_cache_control(response , public=True , max_age=settings.COVER_MAX_AGE , immutable=True)
+        return response
+
+
+class BookSyncAPIView(APIView):
+    """Books created, modified or deleted since the client's last sync"""
+    permission_classes = [AllowAny]
+
+    def get(self , request):
+        token = request.query_params.get('changed_since') or None
+        try:
+            limit = min(int(request.query_params.get('limit', settings.SYNC_PAGE_SIZE)) , settings.SYNC_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError(limit)
+            changes = changes_since(token , limit)
+        except ValueError:
+            return wrap_response(success=False , code="invalid_sync_request" , message='changed_since must be a token from a previous sync and limit a positive number')
+        except SyncTokenExpired:
+            return wrap_response(success=False , code="sync_token_expired" , message='Sync token expired, sync again without changed_since' , status_code=status.HTTP_410_GONE)
+        data = {
+            "books": BookSerializer(changes['books'] , many=True).data,
+            "deleted": changes['deleted'],
+            "next_token": changes['next_token'],
+            "has_more": changes['has_more'],
+        }
+        return wrap_response(success=True , code="books_synced" , data=data , status_code=status.HTTP_200_OK)
+
+
+class BookEventsView(View):
+    """Server-sent events feed of availability changes; streams when served over ASGI"""
+
+    async def get(self , request):
+        try:
+            event_filter = EventFilter.from_query(request.GET)
+            token = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+            token = int(token) if token else None
+        except ValueError as error:
+            return JsonResponse({"success": False, "code": "invalid_filters", "message": str(error)}, status=400)
+
+        if isinstance(request , ASGIRequest):
+            response = StreamingHttpResponse(event_stream(event_filter , token) , content_type='text/event-stream')
+        else:
+            # A WSGI worker can't hold the connection open: send what was missed and
+            # let EventSource reconnect after the retry delay
+            if token is None:
+                token = await latest_event_id()
+            messages = [message async for message, _ in missed_events(token , event_filter)]
+            body = f'retry: {settings.SSE_RETRY_MS}\n\n' + ''.join(messages)
+            response = HttpResponse(body , content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
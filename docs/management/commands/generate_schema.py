@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from docs.schema import write_artifacts
+
+
+class Command(BaseCommand):
+    help = 'Build the OpenAPI schema artifacts served at /swagger.json and /swagger.yaml.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', default=str(settings.OPENAPI_SCHEMA_DIR))
+        parser.add_argument('--force', action='store_true', help='Rebuild even if the code is unchanged')
+
+    def handle(self, *args, **options):
+        fingerprint, written = write_artifacts(options['output_dir'], force=options['force'])
+        if written:
+            self.stdout.write(self.style.SUCCESS(f'Wrote schema {fingerprint} to {options["output_dir"]}'))
+        else:
+            self.stdout.write(f'Schema {fingerprint} is up to date')
@@ -0,0 +1,173 @@
+"""
+Prebuilt OpenAPI schema.
+
+Introspecting every view to build the schema takes longer than anything else
+the API serves, so `python manage.py generate_schema` builds it once and
+writes JSON and YAML artifacts (plain and gzipped) named after a fingerprint
+of the source code, next to a manifest pointing at the current version. The
+command does nothing while the fingerprint is unchanged.
+
+Workers read the manifest on the first docs request. If it is missing or was
+built from other code, the schema is generated once in memory instead, so a
+stale artifact is never served.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import threading
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'yaml': 'application/yaml',
+}
+
+
+def api_info():
+    # drf_yasg is imported on first use only; serving a prebuilt schema never needs it
+    from drf_yasg import openapi
+    return openapi.Info(
+        title="Library Management API",
+        default_version='v1',
+        description="""
+        A comprehensive Library Management System API with JWT authentication.
+    
+        ## Features
+        - User registration and authentication with JWT tokens
+        - Book management (CRUD operations)
+        - Book borrowing system
+        - Role-based access control (User, Admin)
+    
+        ## Authentication
+        Most endpoints require JWT authentication. To authenticate:
+        1. Register or login to get access token
+        2. Click 'Authorize' button and enter: `Bearer <your_access_token>`
+    
+        ## User Roles
+        - **Anonymous**: Can browse books only
+        - **Registered User**: Can browse and borrow books
+        - **Superuser**: Full access to manage books and users
+        """,
+        terms_of_service="https://www.example.com/terms/",
+        contact=openapi.Contact(email="contact@library.local"),
+        license=openapi.License(name="MIT License"),
+    )
+
+
+def code_fingerprint():
+    """Hash of the project's Python sources and the schema-relevant package versions"""
+    digest = hashlib.sha256()
+    base_dir = Path(settings.BASE_DIR).resolve()
+    roots = {Path(settings.ROOT_URLCONF.split('.')[0]).resolve()} | {
+        Path(config.path).resolve() for config in apps.get_app_configs()
+    }
+    local = (
+        root for root in roots
+        if root.is_relative_to(base_dir) and 'site-packages' not in root.parts
+    )
+    for root in sorted(local):
+        for path in sorted(root.rglob('*.py')):
+            digest.update(str(path.relative_to(base_dir)).encode())
+            digest.update(path.read_bytes())
+    for package in ('django', 'djangorestframework', 'drf-yasg'):
+        try:
+            digest.update(f'{package}=={version(package)}'.encode())
+        except PackageNotFoundError:
+            pass
+    return digest.hexdigest()[:16]
+
+
+def build_schema():
+    """Introspect the URLconf and return {'json': bytes, 'yaml': bytes}"""
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    schema = OpenAPISchemaGenerator(api_info()).get_schema(request=None, public=True)
+    return {'json': OpenAPICodecJson([]).encode(schema), 'yaml': OpenAPICodecYaml([]).encode(schema)}
+
+
+def write_artifacts(directory, force=False):
+    """Write the schema artifacts unless they already match the code; return (fingerprint, written)"""
+    directory = Path(directory)
+    fingerprint = code_fingerprint()
+    manifest = _read_manifest(directory)
+    if not force and manifest and manifest['fingerprint'] == fingerprint:
+        return fingerprint, False
+
+    directory.mkdir(parents=True, exist_ok=True)
+    files = {}
+    for fmt, body in build_schema().items():
+        name = f'openapi-{fingerprint}.{fmt}'
+        (directory / name).write_bytes(body)
+        (directory / f'{name}.gz').write_bytes(gzip.compress(body, mtime=0))
+        files[fmt] = name
+    # Replace the manifest last so readers never see it point at missing files
+    temporary = directory / f'{MANIFEST}.tmp'
+    temporary.write_text(json.dumps({'fingerprint': fingerprint, 'files': files}, indent=2))
+    temporary.replace(directory / MANIFEST)
+    return fingerprint, True
+
+
+def _read_manifest(directory):
+    try:
+        return json.loads((Path(directory) / MANIFEST).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+class SchemaArtifact:
+    """Schema body in one format, plain and gzipped, with its ETag"""
+
+    def __init__(self, fmt, body, gzipped, fingerprint):
+        self.content_type = CONTENT_TYPES[fmt]
+        self.body = body
+        self.gzipped = gzipped
+        self.etag = f'"{fingerprint}-{fmt}"'
+
+
+_artifacts = {}
+_lock = threading.Lock()
+
+
+def get_artifact(fmt):
+    """The schema artifact for `fmt`, loaded or generated once per process"""
+    if not _artifacts:
+        with _lock:
+            if not _artifacts:
+                _artifacts.update(_load_artifacts())
+    return _artifacts[fmt]
+
+
+def reset():
+    _artifacts.clear()
+
+
+def _load_artifacts():
+    directory = Path(settings.OPENAPI_SCHEMA_DIR)
+    fingerprint = code_fingerprint()
+    manifest = _read_manifest(directory)
+    if manifest and manifest['fingerprint'] == fingerprint:
+        try:
+            return {
+                fmt: SchemaArtifact(
+                    fmt,
+                    (directory / name).read_bytes(),
+                    (directory / f'{name}.gz').read_bytes(),
+                    fingerprint,
+                )
+                for fmt, name in manifest['files'].items()
+            }
+        except OSError:
+            pass
+    logger.warning('OpenAPI schema artifact missing or stale; run `manage.py generate_schema` at build time')
+    return {
+        fmt: SchemaArtifact(fmt, body, gzip.compress(body, mtime=0), fingerprint)
+        for fmt, body in build_schema().items()
+    }
@@ -0,0 +1,80 @@
+import gzip
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from docs import schema
+
+
+def mock_build_schema():
+    return mock.patch('docs.schema.build_schema', wraps=schema.build_schema)
+
+
+class SchemaTests(TestCase):
+    """Test cases for the prebuilt OpenAPI schema"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = self.settings(OPENAPI_SCHEMA_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        schema.reset()
+        self.addCleanup(schema.reset)
+
+    def generate(self, *args):
+        output = StringIO()
+        call_command('generate_schema', *args, stdout=output)
+        return output.getvalue()
+
+    def test_command_writes_versioned_artifacts_once(self):
+        self.assertIn('Wrote schema', self.generate())
+        manifest = json.loads((Path(self.directory) / 'manifest.json').read_text())
+        self.assertEqual(manifest['fingerprint'], schema.code_fingerprint())
+        body = (Path(self.directory) / manifest['files']['json']).read_bytes()
+        self.assertIn('/books/', json.loads(body)['paths'])
+        self.assertIn('up to date', self.generate())
+        self.assertIn('Wrote schema', self.generate('--force'))
+
+    def test_serves_artifact_with_cache_headers(self):
+        self.generate()
+        with mock_build_schema() as build:
+            response = self.client.get(reverse('schema-json', args=['.json']))
+        build.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('/books/', json.loads(response.content)['paths'])
+
+        repeat = self.client.get(reverse('schema-json', args=['.json']), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_serves_gzip_when_accepted(self):
+        with self.assertLogs('docs.schema', 'WARNING'):
+            response = self.client.get(reverse('schema-json', args=['.yaml']), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'swagger:', gzip.decompress(response.content))
+
+    def test_stale_artifact_is_not_served(self):
+        self.generate()
+        manifest_path = Path(self.directory) / 'manifest.json'
+        manifest = json.loads(manifest_path.read_text())
+        manifest['fingerprint'] = 'old'
+        manifest_path.write_text(json.dumps(manifest))
+        with mock_build_schema() as build, self.assertLogs('docs.schema', 'WARNING'):
+            build.return_value = {'json': b'{"fresh": true}', 'yaml': b'fresh: true'}
+            response = self.client.get(reverse('schema-json', args=['.json']))
+        self.assertEqual(json.loads(response.content), {'fresh': True})
+
+    def test_ui_loads_prebuilt_schema(self):
+        with mock_build_schema() as build:
+            response = self.client.get(reverse('schema-swagger-ui'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/swagger.json', response.content.decode())
+        build.assert_not_called()
@@ -0,0 +1,31 @@
+from django.urls import path, re_path
+from rest_framework import permissions
+from .schema import api_info
+from .views import SchemaFileView
+
+
+def ui_view(renderer):
+    """
+    Swagger UI / ReDoc page, built on first use so workers don't import drf_yasg
+    at startup. The page loads the schema from SWAGGER_SETTINGS['SPEC_URL'],
+    which SchemaFileView serves prebuilt.
+    """
+    view = None
+
+    def dispatch(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            from drf_yasg.views import get_schema_view
+            schema_view = get_schema_view(api_info(), public=True, permission_classes=(permissions.AllowAny,))
+            view = schema_view.with_ui(renderer, cache_timeout=0)
+        return view(request, *args, **kwargs)
+
+    return dispatch
+
+
+urlpatterns = [
+    # Swagger/ReDoc API Documentation
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', SchemaFileView.as_view(), name='schema-json'),
+    path('swagger/', ui_view('swagger'), name='schema-swagger-ui'),
+    path('redoc/', ui_view('redoc'), name='schema-redoc'),
+]
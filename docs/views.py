@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views import View
+
+from .schema import get_artifact
+
+
+class SchemaFileView(View):
+    """Serve the prebuilt OpenAPI schema with ETag, cache headers and gzip"""
+
+    def get(self, request, format):
+        artifact = get_artifact(format.lstrip('.'))
+        if artifact.etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(artifact.gzipped, content_type=artifact.content_type)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(artifact.body, content_type=artifact.content_type)
+        response['ETag'] = artifact.etag
+        patch_cache_control(response, public=True, max_age=settings.OPENAPI_SCHEMA_MAX_AGE)
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
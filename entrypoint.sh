@@ -27,6 +27,10 @@ END
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
+# Build the OpenAPI schema served to /swagger/ and /redoc/
+echo "Generating API schema..."
+python manage.py generate_schema
+
 # Start server
 echo "Starting server..."
 python manage.py runserver 0.0.0.0:8000
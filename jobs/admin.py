@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Admin interface for Job model"""
+    list_display = ['id', 'name', 'status', 'attempts', 'run_at', 'finished_at', 'created_by']
+    list_filter = ['status', 'name']
+    search_fields = ['name']
+    raw_id_fields = ['created_by']
+    ordering = ['-id']
@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from jobs.queue import work
+
+
+def run_threads(threads, poll_interval, burst):
+    """Run `threads` job loops in this process until SIGTERM/SIGINT or, with `burst`, until idle"""
+    stop = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            # Let running jobs finish, then exit
+            signal.signal(signum, lambda *args: stop.set())
+
+    prefix = f'{socket.gethostname()}:{os.getpid()}'
+    pool = [
+        threading.Thread(target=work, args=(f'{prefix}:{index}', stop, poll_interval, burst))
+        for index in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs with a pool of worker processes and threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.JOB_WORKER_PROCESSES,
+                            help='Worker processes; use several for CPU-bound tasks')
+        parser.add_argument('--threads', type=int, default=settings.JOB_WORKER_THREADS,
+                            help='Threads per process; I/O-bound tasks overlap within a process')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+                            help='Seconds to wait when no job is due')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        processes, threads = options['processes'], options['threads']
+        if processes < 1 or threads < 1:
+            raise CommandError('--processes and --threads must be at least 1')
+        job_args = (threads, options['poll_interval'], options['burst'])
+
+        self.stdout.write(f'Starting {processes} process(es) x {threads} thread(s)')
+        if processes == 1:
+            run_threads(*job_args)
+            return
+
+        # Children must open their own connections rather than share the parent's sockets
+        connections.close_all()
+        children = [
+            multiprocessing.Process(target=run_threads, args=job_args, daemon=False)
+            for _ in range(processes)
+        ]
+        for child in children:
+            child.start()
+
+        def forward(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    os.kill(child.pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for child in children:
+            child.join()
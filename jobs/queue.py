@@ -0,0 +1,169 @@
+"""
+Background jobs stored in the database.
+
+Functions decorated with `@task` (kept in an app's tasks.py) are queued with
+`enqueue()` and run by `python manage.py worker`. Workers claim due jobs with
+SELECT ... FOR UPDATE SKIP LOCKED where the database supports it, so any number
+of them can share the table without running a job twice. Because jobs live in
+the application database, a job enqueued inside a transaction only becomes
+visible to workers if that transaction commits.
+
+Keyword arguments are checked against the task's signature when the job is
+queued. A job that raises is retried after an exponential backoff until it has
+used `max_attempts`. A job whose worker died is picked up again once its lease
+(JOB_LEASE_TIMEOUT seconds) has expired; workers look for expired leases every
+JOB_REQUEUE_INTERVAL seconds, however busy they are. A worker only records the
+outcome of a job while it still holds the lease, so a job that outlived its
+lease and was handed to another worker keeps that worker's outcome.
+"""
+import inspect
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def task(name=None, max_attempts=None):
+    """Register a function as a job; its keyword arguments must be JSON-serializable"""
+    def register(func):
+        func.task_name = name or f'{func.__module__}.{func.__name__}'
+        func.max_attempts = max_attempts
+        registry[func.task_name] = func
+        return func
+    return register
+
+
+def check_kwargs(func, kwargs):
+    """Raise TypeError if the task `func` can't be called with `kwargs`"""
+    inspect.signature(func).bind(**kwargs)
+
+
+def enqueue(name, kwargs=None, user=None, run_at=None, priority=0):
+    func = registry.get(name)
+    if func is None:
+        raise LookupError(f'No task registered as {name!r}')
+    check_kwargs(func, kwargs or {})
+    return Job.objects.create(
+        name=name,
+        kwargs=kwargs or {},
+        created_by=user,
+        run_at=run_at or timezone.now(),
+        priority=priority,
+        max_attempts=func.max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt, doubling after every failure"""
+    seconds = settings.JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.JOB_RETRY_MAX_DELAY))
+
+
+def claim(worker):
+    """Take the most urgent due job for `worker`, or return None"""
+    now = timezone.now()
+    with transaction.atomic():
+        due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('-priority', 'run_at')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        job = due.first()
+        if job is None:
+            return None
+        # Conditional update, so databases without row locks can't hand the job out twice
+        claimed = Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=job.attempts + 1
+        )
+    if not claimed:
+        return None
+    job.status, job.locked_by, job.locked_at = Job.RUNNING, worker, now
+    job.attempts += 1
+    return job
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome, unless the job's lease was lost meanwhile"""
+    func = registry.get(job.name)
+    lease = {'status': Job.RUNNING, 'locked_by': job.locked_by, 'locked_at': job.locked_at}
+    try:
+        if func is None:
+            raise LookupError(f'No task registered as {job.name!r}')
+        result = func(**job.kwargs)
+    except Exception:
+        job.last_error = traceback.format_exc()[-4000:]
+        if func is not None and job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.SUCCEEDED
+        job.result = result
+        job.finished_at = timezone.now()
+    job.locked_by, job.locked_at = '', None
+    job.modified = timezone.now()
+    fields = ['status', 'run_at', 'result', 'last_error', 'finished_at', 'locked_by', 'locked_at', 'modified']
+    # Conditional update: once the lease expired, the job was requeued and may be running elsewhere
+    recorded = Job.objects.filter(pk=job.pk, **lease).update(**{field: getattr(job, field) for field in fields})
+    if not recorded:
+        logger.warning('Dropped the outcome of job %s: its lease expired while %s ran it', job.pk, lease['locked_by'])
+        job.refresh_from_db()
+    return job
+
+
+def requeue_expired():
+    """Release jobs held by workers that stopped without finishing them"""
+    expired = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(seconds=settings.JOB_LEASE_TIMEOUT),
+    )
+    lease_error = 'Worker lease expired'
+    released = {'locked_by': '', 'locked_at': None, 'last_error': lease_error}
+    failed = 0
+    for job in expired.only('id', 'attempts', 'max_attempts'):
+        if job.attempts >= job.max_attempts:
+            failed += Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(
+                status=Job.FAILED, finished_at=timezone.now(), **released
+            )
+        else:
+            Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(
+                status=Job.QUEUED, run_at=timezone.now(), **released
+            )
+    return failed
+
+
+def work(worker, stop, poll_interval, burst=False):
+    """Claim and run jobs until `stop` is set; with `burst`, until none are due"""
+    requeued = 0.0
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                # A worker that always finds jobs due still releases expired leases
+                if time.monotonic() - requeued >= settings.JOB_REQUEUE_INTERVAL:
+                    requeue_expired()
+                    requeued = time.monotonic()
+                job = claim(worker)
+            except DatabaseError:
+                # e.g. the database restarting; keep the worker alive and poll again
+                logger.exception('Worker %s could not claim a job', worker)
+                stop.wait(poll_interval)
+                continue
+            if job is not None:
+                run_job(job)
+                continue
+            if burst:
+                break
+            stop.wait(poll_interval)
+    finally:
+        connection.close()
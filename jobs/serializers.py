@@ -0,0 +1,35 @@
+from rest_framework import serializers
+from .models import Job
+from .queue import check_kwargs, registry
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for Job status"""
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'name', 'kwargs', 'status', 'priority', 'attempts', 'max_attempts',
+            'run_at', 'result', 'last_error', 'created', 'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class JobCreateSerializer(serializers.Serializer):
+    """Serializer for queueing a registered task (admin only)"""
+    name = serializers.CharField(max_length=100)
+    kwargs = serializers.DictField(required=False, default=dict)
+    run_at = serializers.DateTimeField(required=False)
+    priority = serializers.IntegerField(required=False, default=0, min_value=-100, max_value=100)
+
+    def validate_name(self, value):
+        if value not in registry:
+            raise serializers.ValidationError('Unknown task')
+        return value
+
+    def validate(self, attrs):
+        try:
+            check_kwargs(registry[attrs['name']], attrs['kwargs'])
+        except TypeError as error:
+            raise serializers.ValidationError({'kwargs': [str(error)]})
+        return attrs
@@ -0,0 +1,208 @@
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from user.models import User
+from books.models import Book
+from jobs.models import Job
+from jobs.queue import claim, enqueue, registry, requeue_expired, run_job, task, work
+from library_app.testing import QueryBudgetMixin
+
+calls = []
+
+
+@task(name='tests.record')
+def record(value=None):
+    calls.append(value)
+    return {'value': value}
+
+
+@task(name='tests.flaky', max_attempts=2)
+def flaky():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    """Test cases for the database job queue"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_unknown_task(self):
+        with self.assertRaises(LookupError):
+            enqueue('tests.missing')
+
+    def test_claim_takes_due_jobs_by_priority(self):
+        later = enqueue('tests.record', {'value': 'later'}, run_at=timezone.now() + timedelta(hours=1))
+        low = enqueue('tests.record', {'value': 'low'})
+        high = enqueue('tests.record', {'value': 'high'}, priority=5)
+        self.assertEqual(claim('w1').pk, high.pk)
+        self.assertEqual(claim('w1').pk, low.pk)
+        self.assertIsNone(claim('w1'))
+        later.refresh_from_db()
+        self.assertEqual(later.status, Job.QUEUED)
+
+    def test_run_job_records_result(self):
+        enqueue('tests.record', {'value': 7})
+        job = run_job(claim('w1'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, {'value': 7})
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(calls, [7])
+
+    @override_settings(JOB_RETRY_BASE_DELAY=10)
+    def test_failures_retry_with_backoff_then_fail(self):
+        job = enqueue('tests.flaky')
+        self.assertEqual(job.max_attempts, 2)
+        run_job(claim('w1'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+        self.assertIn('boom', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        run_job(claim('w1'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+
+    @override_settings(JOB_LEASE_TIMEOUT=60)
+    def test_expired_lease_is_requeued(self):
+        enqueue('tests.record')
+        job = claim('dead-worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(minutes=5))
+        requeue_expired()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.locked_by, '')
+
+    @override_settings(JOB_LEASE_TIMEOUT=60)
+    def test_outcome_dropped_after_lease_lost(self):
+        enqueue('tests.record', {'value': 'slow'})
+        slow = claim('slow-worker')
+        # The lease expires while the job runs, and another worker takes it over
+        Job.objects.filter(pk=slow.pk).update(locked_at=timezone.now() - timedelta(minutes=5))
+        requeue_expired()
+        claim('w2')
+        job = run_job(slow)
+        self.assertEqual(calls, ['slow'])
+        self.assertEqual((job.status, job.locked_by, job.result), (Job.RUNNING, 'w2', None))
+
+    def test_work_burst_drains_queue(self):
+        for value in range(3):
+            enqueue('tests.record', {'value': value})
+        work('w1', threading.Event(), poll_interval=0, burst=True)
+        self.assertEqual(calls, [0, 1, 2])
+        self.assertEqual(Job.objects.filter(status=Job.SUCCEEDED).count(), 3)
+
+    @override_settings(JOB_LEASE_TIMEOUT=60)
+    def test_busy_worker_requeues_expired_leases(self):
+        enqueue('tests.record', {'value': 'orphan'})
+        orphan = claim('dead-worker')
+        Job.objects.filter(pk=orphan.pk).update(locked_at=timezone.now() - timedelta(minutes=5))
+        enqueue('tests.record', {'value': 'due'})
+        work('w1', threading.Event(), poll_interval=0, burst=True)
+        self.assertEqual(sorted(calls), ['due', 'orphan'])
+
+    def test_kwargs_checked_at_enqueue(self):
+        with self.assertRaises(TypeError):
+            enqueue('tests.record', {'values': 1})
+        self.assertFalse(Job.objects.exists())
+
+    def test_export_catalogue_task(self):
+        self.assertIn('books.export_catalogue', registry)
+        author = User.objects.create_user(username='exporter', email='exporter@example.com', password='Pass123!')
+        Book.objects.create(title='Exported', author=author, isbn='1234567890', page_count=10)
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with self.settings(MEDIA_ROOT=media):
+            result = registry['books.export_catalogue']()
+        self.assertEqual(result['rows'], 1)
+        exported = sorted(os.listdir(os.path.join(media, 'exports')))
+        self.assertEqual(len(exported), 2)
+        self.assertEqual(exported[1], exported[0] + '.gz')
+
+
+class WorkerCommandTests(TransactionTestCase):
+    """Test cases for the worker command; its threads need committed jobs"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_worker_command_burst(self):
+        for value in range(4):
+            enqueue('tests.record', {'value': value})
+        call_command('worker', '--burst', '--threads', '2', stdout=StringIO())
+        self.assertEqual(sorted(calls), [0, 1, 2, 3])
+        self.assertEqual(Job.objects.filter(status=Job.SUCCEEDED).count(), 4)
+
+
+class JobAPITests(QueryBudgetMixin, TestCase):
+    """Test cases for job status endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='Pass123!')
+        self.user = User.objects.create_user(username='member', email='member@example.com', password='Pass123!')
+
+    def test_superuser_queues_job(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(reverse('jobs'), {'name': 'tests.record', 'kwargs': {'value': 1}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['data']['status'], Job.QUEUED)
+        self.assertEqual(Job.objects.get().created_by, self.admin)
+
+    def test_unknown_task_rejected(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(reverse('jobs'), {'name': 'tests.missing'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bad_kwargs_rejected(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(reverse('jobs'), {'name': 'tests.record', 'kwargs': {'values': 1}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('kwargs', response.data['errors'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_regular_user_cannot_queue(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('jobs'), {'name': 'tests.record'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_users_only_see_their_jobs(self):
+        own = enqueue('tests.record', user=self.user)
+        other = enqueue('tests.record', user=self.admin)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('jobs'))
+        self.assertEqual([job['id'] for job in response.data['data']['jobs']], [own.pk])
+        response = self.client.get(reverse('job_detail', args=[other.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('job_detail', args=[own.pk]))
+        self.assertEqual(response.data['data']['status'], Job.QUEUED)
+
+    def test_filter_by_status(self):
+        enqueue('tests.record', user=self.admin)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('jobs'), {'status': 'failed'})
+        self.assertEqual(response.data['data']['count'], 0)
+        response = self.client.get(reverse('jobs'), {'status': 'bogus'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_query_count(self):
+        """Test listing jobs runs a constant number of queries"""
+        add_rows = lambda count: Job.objects.bulk_create(
+            Job(name='tests.record', run_at=timezone.now(), created_by=self.user) for _ in range(count)
+        )
+        for user in (self.admin, self.user):
+            self.client.force_authenticate(user=user)
+            self.assertConstantQueries(add_rows, lambda: self.client.get(reverse('jobs')))
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import JobAPIView, JobDetailAPIView
+
+urlpatterns = [
+    path('', JobAPIView.as_view(), name='jobs'),
+    path('<int:pk>/', JobDetailAPIView.as_view(), name='job_detail'),
+]
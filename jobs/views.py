@@ -0,0 +1,64 @@
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import PageNumberPagination
+from library_app.utils import wrap_response
+from library_app.idempotency import idempotent
+from library_app.permissions import IsSuperUser
+from .models import Job
+from .queue import enqueue
+from .serializers import JobSerializer, JobCreateSerializer
+
+
+class JobPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def visible_jobs(user):
+    """Superusers see every job, other users the jobs they started"""
+    jobs = Job.objects.all()
+    return jobs if user.is_superuser else jobs.filter(created_by=user)
+
+
+class JobAPIView(APIView):
+    def get_permissions(self):
+        if self.request.method == 'GET':
+            return [IsAuthenticated()]
+        return [IsAuthenticated(), IsSuperUser()]
+
+    def get(self, request):
+        jobs = visible_jobs(request.user)
+        job_status = request.query_params.get('status')
+        if job_status:
+            if job_status not in dict(Job.STATUS_CHOICES):
+                return wrap_response(success=False, code="invalid_status", message='Invalid job status', status_code=status.HTTP_400_BAD_REQUEST)
+            jobs = jobs.filter(status=job_status)
+        paginator = JobPagination()
+        page = paginator.paginate_queryset(jobs, request)
+        data = {
+            "count": paginator.page.paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "jobs": JobSerializer(page, many=True).data,
+        }
+        return wrap_response(success=True, code="jobs_retrieved", data=data, status_code=status.HTTP_200_OK)
+
+    @idempotent
+    def post(self, request):
+        serializer = JobCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return wrap_response(success=False, code="job_creation_failed", message='Job creation failed', errors=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
+        job = enqueue(user=request.user, **serializer.validated_data)
+        return wrap_response(success=True, code="job_queued", message='Job queued', data=JobSerializer(job).data, status_code=status.HTTP_202_ACCEPTED)
+
+
+class JobDetailAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = visible_jobs(request.user).filter(pk=pk).first()
+        if job is None:
+            return wrap_response(success=False, code="job_not_found", message='Job not found', status_code=status.HTTP_404_NOT_FOUND)
+        return wrap_response(success=True, code="job_retrieved", data=JobSerializer(job).data, status_code=status.HTTP_200_OK)
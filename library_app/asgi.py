@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_app.settings')
 
 application = get_asgi_application()
+
+# Build in-memory indexes before the first request needs them
+from books.autocomplete import warm_title_index  # noqa: E402
+
+warm_title_index()
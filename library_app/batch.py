@@ -0,0 +1,198 @@
+"""
+Batch endpoint: several API calls in one HTTP request.
+
+POST /batch/ with {"requests": [{"id": "a", "method": "GET", "path": "/books/?page=2"}, ...]}
+runs each sub-request against the existing DRF views and returns
+{"responses": [{"id": "a", "status": 200, "body": {...}}, ...]} in the same order.
+
+The caller is authenticated once, for the batch; sub-requests reuse that user
+instead of decoding the JWT again. Consecutive GET sub-requests run concurrently
+on a shared pool of BATCH_WORKERS threads, while writes run one at a time in the
+order given, so a read listed after a write sees its result. Each sub-request
+still passes through its view's permissions and throttles, is recorded in the
+request metrics under its own route, and counts towards load shedding as a
+request of its own: an anonymous batch has its catalogue reads shed one by one
+while the worker is overloaded.
+"""
+import contextvars
+import io
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.urls import Resolver404, resolve
+from rest_framework import serializers, status
+from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
+
+from library_app import metrics
+from library_app.utils import wrap_response
+
+logger = logging.getLogger(__name__)
+
+# Sub-requests may set these; everything else is inherited from the batch request
+FORWARDED_HEADERS = ('Idempotency-Key', 'If-None-Match', 'Accept-Language')
+# Taken from the batch request only when they describe the sub-request itself
+DROPPED_META = (
+    'HTTP_AUTHORIZATION', 'CONTENT_TYPE', 'CONTENT_LENGTH', 'wsgi.input',
+    *(f"HTTP_{header.upper().replace('-', '_')}" for header in FORWARDED_HEADERS),
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(settings.BATCH_WORKERS, thread_name_prefix='batch')
+    return _executor
+
+
+class SubRequestSerializer(serializers.Serializer):
+    id = serializers.CharField(max_length=100, required=False)
+    method = serializers.ChoiceField(choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'], default='GET')
+    path = serializers.RegexField(r'^/', max_length=2000)
+    headers = serializers.DictField(child=serializers.CharField(max_length=255), required=False, default=dict)
+    body = serializers.JSONField(required=False, default=None)
+
+    def validate_headers(self, value):
+        allowed = {header.lower(): header for header in FORWARDED_HEADERS}
+        unknown = [name for name in value if name.lower() not in allowed]
+        if unknown:
+            raise serializers.ValidationError(f"Headers not allowed: {', '.join(unknown)}")
+        return {allowed[name.lower()]: header for name, header in value.items()}
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = SubRequestSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(f'At most {settings.BATCH_MAX_REQUESTS} requests per batch')
+        return value
+
+
+def build_subrequest(request, item):
+    path, _, query = item['path'].partition('?')
+    body = b'' if item['body'] is None else json.dumps(item['body']).encode()
+    environ = {key: value for key, value in request.META.items() if key not in DROPPED_META}
+    environ.update({
+        'REQUEST_METHOD': item['method'],
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+    })
+    for name, value in item['headers'].items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    subrequest = WSGIRequest(environ)
+    if request.user and request.user.is_authenticated:
+        # Picked up by DRF instead of running the authentication classes again
+        subrequest._force_auth_user = request.user
+        subrequest._force_auth_token = request.auth
+    return subrequest
+
+
+def error_entry(item, status_code, code, message):
+    return {'id': item.get('id'), 'status': status_code, 'body': {'success': False, 'code': code, 'message': message}}
+
+
+def run_subrequest(request, item):
+    try:
+        match = resolve(item['path'].partition('?')[0])
+    except Resolver404:
+        return error_entry(item, status.HTTP_404_NOT_FOUND, 'not_found', 'No route matches this path')
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None or not issubclass(view_class, APIView) or issubclass(view_class, BatchAPIView):
+        return error_entry(item, status.HTTP_400_BAD_REQUEST, 'not_batchable', 'This route cannot be batched')
+
+    subrequest = build_subrequest(request, item)
+    subrequest.resolver_match = match
+
+    def get_response(subrequest):
+        return match.func(subrequest, *match.args, **match.kwargs)
+
+    load_shedding = getattr(request, 'load_shedding', None)
+    if load_shedding is not None:
+        # Sub-requests carry no Authorization header; a signed-in batch is never shed
+        low_priority = not request.user.is_authenticated and load_shedding.is_low_priority(subrequest)
+        serve = get_response
+        get_response = lambda subrequest: load_shedding.serve(subrequest, serve, low_priority)
+    try:
+        if settings.METRICS_ENABLED:
+            response = metrics.measure(subrequest, get_response)
+        else:
+            response = get_response(subrequest)
+    except Exception:
+        logger.exception('Batch sub-request %s %s failed', item['method'], item['path'])
+        return error_entry(item, status.HTTP_500_INTERNAL_SERVER_ERROR, 'server_error', 'Sub-request failed')
+
+    entry = {'id': item.get('id'), 'status': response.status_code}
+    headers = {name: response[name] for name in ('ETag', 'Retry-After', 'Idempotent-Replayed') if response.has_header(name)}
+    if headers:
+        entry['headers'] = headers
+    if hasattr(response, 'data'):
+        entry['body'] = response.data
+    else:
+        # Plain JSON answers, such as a shed request's 503
+        entry['body'] = json.loads(response.content) if response.get('Content-Type') == 'application/json' else None
+    return entry
+
+
+def run_in_pool(request, item):
+    """run_subrequest on a pool thread, keeping the caller's context (e.g. the chosen replica)"""
+    context = contextvars.copy_context()
+
+    def task():
+        close_old_connections()
+        try:
+            return context.run(run_subrequest, request, item)
+        finally:
+            close_old_connections()
+
+    return get_executor().submit(task)
+
+
+class BatchAPIView(APIView):
+    """API endpoint running several API calls in one request"""
+    permission_classes = [AllowAny]
+    # Every sub-request is throttled by its own view
+    throttle_classes = []
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return wrap_response(success=False, code="invalid_batch", message='Invalid batch', errors=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
+
+        items = serializer.validated_data['requests']
+        results = [None] * len(items)
+        reads = []
+
+        def flush_reads():
+            if settings.BATCH_WORKERS > 1 and len(reads) > 1:
+                futures = [(index, run_in_pool(request, items[index])) for index in reads]
+                for index, future in futures:
+                    results[index] = future.result()
+            else:
+                for index in reads:
+                    results[index] = run_subrequest(request, items[index])
+            reads.clear()
+
+        for index, item in enumerate(items):
+            if item['method'] == 'GET':
+                reads.append(index)
+                continue
+            # A write waits for the reads before it, and the reads after it wait for the write
+            flush_reads()
+            results[index] = run_subrequest(request, item)
+        flush_reads()
+
+        return wrap_response(success=True, code="batch_completed", data={'responses': results}, status_code=status.HTTP_200_OK)
@@ -0,0 +1,161 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+`CompressionMiddleware` compresses text-like responses of at least
+COMPRESSION_MIN_SIZE bytes with brotli (when the `brotli` package is installed
+and the client accepts it) or gzip. Streaming responses are compressed chunk
+by chunk and flushed after every chunk, so clients still receive each chunk
+as soon as it is produced.
+
+Views serving cacheable pages can set `response.compressed_cache = (key, timeout)`;
+the compressed JSON body is then kept in the cache under that key, so a hot
+page is compressed once rather than on every request.
+"""
+import gzip
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/yaml', 'application/javascript',
+    'application/xml', 'image/svg+xml',
+)
+# Dynamic bodies favour speed; bodies kept in the cache are compressed harder
+GZIP_LEVEL, GZIP_CACHED_LEVEL = 6, 9
+BROTLI_QUALITY, BROTLI_CACHED_QUALITY = 5, 9
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding):
+    """The supported coding the client prefers, brotli on ties, or None for identity"""
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, *params = (piece.strip() for piece in part.split(';'))
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.lower()] = weight
+
+    best, best_weight = None, 0.0
+    for coding in supported_encodings():
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress(body, encoding, cached=False):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_CACHED_QUALITY if cached else BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_CACHED_LEVEL if cached else GZIP_LEVEL, mtime=0)
+
+
+class StreamCompressor:
+    """Incremental compressor that flushes after every chunk"""
+
+    def __init__(self, encoding):
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._chunk = lambda data: self._compressor.process(data) + self._compressor.flush()
+            self._finish = self._compressor.finish
+        else:
+            # wbits 31: deflate with a gzip header and trailer
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._chunk = lambda data: self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._compressor.flush
+
+    def chunk(self, data):
+        return self._chunk(data.encode() if isinstance(data, str) else data)
+
+    def finish(self):
+        return self._finish()
+
+
+def compress_stream(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    for data in chunks:
+        if data:
+            yield compressor.chunk(data)
+    yield compressor.finish()
+
+
+async def acompress_stream(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    async for data in chunks:
+        if data:
+            yield compressor.chunk(data)
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compress responses with the best coding the client accepts"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not settings.COMPRESSION_ENABLED or not self.is_compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            body = self.compressed_body(response, encoding)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response['Content-Length'] = str(len(body))
+
+        # The compressed body is a different representation of the resource
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def is_compressible(self, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return False
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return False
+        return response.streaming or len(response.content) >= settings.COMPRESSION_MIN_SIZE
+
+    def compressed_body(self, response, encoding):
+        cached = getattr(response, 'compressed_cache', None)
+        # Only JSON bodies are identical across requests; HTML pages embed CSRF tokens
+        if cached is None or not response['Content-Type'].startswith('application/json'):
+            return compress(response.content, encoding)
+        key, timeout = cached
+        cache_key = f'compressed:{encoding}:{key}'
+        body = cache.get(cache_key)
+        if body is None:
+            body = compress(response.content, encoding, cached=True)
+            cache.set(cache_key, body, timeout)
+        return body
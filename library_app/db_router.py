@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Replica alias chosen for the current request, or None to read from the primary.
+# Only ReplicaRoutingMiddleware (or an explicit `read_from`) sets it, so management
+# commands, the shell and anything outside a request keep using the primary.
+_read_alias = ContextVar('read_alias', default=None)
+
+
+@contextmanager
+def read_from(alias):
+    """Route reads inside the block to `alias` (None means the primary)"""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Send writes to the primary and reads to the replica picked for the request"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data, so objects can always be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
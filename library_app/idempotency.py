@@ -0,0 +1,109 @@
+"""
+Idempotency-Key support for unsafe API calls.
+
+The first request with a given key runs the view and its response is kept in
+the cache for IDEMPOTENCY_KEY_TTL seconds; retries with the same key get that
+response back without running the view again. While the first request is still
+running, duplicates are answered with 409 and Retry-After instead of doing the
+work twice. Keys are scoped to the user, method and path, and reusing a key
+with a different body is rejected.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from library_app.utils import wrap_response
+
+IN_FLIGHT = 'in_flight'
+COMPLETED = 'completed'
+MAX_KEY_LENGTH = 255
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _cache_key(request, key):
+    user = request.user.pk if request.user and request.user.is_authenticated else 'anonymous'
+    scope = f'{user}|{request.method}|{request.path}|{key}'
+    return 'idempotency:' + hashlib.sha256(scope.encode()).hexdigest()
+
+
+def _replay(record, fingerprint):
+    if record['fingerprint'] != fingerprint:
+        return wrap_response(
+            success=False,
+            code="idempotency_key_reused",
+            message='Idempotency-Key was already used with a different request body',
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if record['state'] == IN_FLIGHT:
+        response = wrap_response(
+            success=False,
+            code="request_in_progress",
+            message='A request with this Idempotency-Key is still being processed',
+            status_code=status.HTTP_409_CONFLICT
+        )
+        response['Retry-After'] = '1'
+        return response
+    response = Response(record['data'], status=record['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """Decorator for APIView handlers honouring the Idempotency-Key header"""
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return wrap_response(
+                success=False,
+                code="invalid_idempotency_key",
+                message=f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'
+            )
+
+        cache_key = _cache_key(request, key)
+        fingerprint = _fingerprint(request)
+        # cache.add is atomic, so exactly one of several concurrent duplicates claims the key
+        claimed = cache.add(
+            cache_key,
+            {'state': IN_FLIGHT, 'fingerprint': fingerprint},
+            settings.IDEMPOTENCY_LOCK_TIMEOUT
+        )
+        if not claimed:
+            record = cache.get(cache_key)
+            if record is not None:
+                return _replay(record, fingerprint)
+            # The previous claim expired between add() and get(); run the request
+            cache.set(cache_key, {'state': IN_FLIGHT, 'fingerprint': fingerprint},
+                      settings.IDEMPOTENCY_LOCK_TIMEOUT)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+
+        if response.status_code >= 500 or not hasattr(response, 'data'):
+            # Server errors are worth retrying for real
+            cache.delete(cache_key)
+        else:
+            cache.set(cache_key, {
+                'state': COMPLETED,
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+            }, settings.IDEMPOTENCY_KEY_TTL)
+        return response
+
+    return wrapper
@@ -0,0 +1,41 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from library_app.startup import by_package, measure_startup
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure how long a fresh worker takes to import, run django.setup() and load '
+        'the URLconf, and which packages and modules the time goes to.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--role', choices=['full', 'api'], help='DEPLOYMENT_ROLE to measure')
+        parser.add_argument('--top', type=int, default=20, help='Rows per table')
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+
+    def handle(self, *args, **options):
+        env = {'DEPLOYMENT_ROLE': options['role']} if options['role'] else {}
+        report = measure_startup(env)
+        if options['json']:
+            del report['modules']
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        budget = settings.STARTUP_TIME_BUDGET
+        style = self.style.SUCCESS if report['total_seconds'] <= budget else self.style.ERROR
+        self.stdout.write(f"django.setup(): {report['setup_seconds'] * 1000:8.1f} ms")
+        self.stdout.write(f"URLconf:        {report['urlconf_seconds'] * 1000:8.1f} ms")
+        self.stdout.write(style(f"Total:          {report['total_seconds'] * 1000:8.1f} ms (budget {budget * 1000:.0f} ms)"))
+
+        self.stdout.write('\nSelf import time by package:')
+        for package, self_us in by_package(report['imports'])[:options['top']]:
+            self.stdout.write(f'{self_us / 1000:8.1f} ms  {package}')
+
+        self.stdout.write('\nSlowest modules (cumulative):')
+        slowest = sorted(report['imports'], key=lambda row: -row[2])[:options['top']]
+        for name, _, cumulative_us in slowest:
+            self.stdout.write(f'{cumulative_us / 1000:8.1f} ms  {name}')
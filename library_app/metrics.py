@@ -0,0 +1,322 @@
+"""
+Per-route request metrics exposed in Prometheus text format.
+
+Every worker accumulates counters in memory and, when METRICS_DIR is set,
+writes a snapshot to `<METRICS_DIR>/metrics-<worker>.json` every
+METRICS_FLUSH_INTERVAL seconds, where <worker> is unique across hosts,
+containers and restarts. The /metrics endpoint merges the snapshots of all
+workers sharing the directory, so any worker can answer a scrape for the whole
+host.
+
+Counters must never go down, so snapshots are never thrown away. One that has
+not been rewritten for METRICS_STALE_AFTER seconds belongs to a worker that
+exited; a scrape moves it into `archive.json`, which keeps adding it to the
+totals. Archived snapshots are kept per worker for METRICS_RETIRE_AFTER
+seconds, so a worker that was only stalled replaces its archived counts when it
+writes again, and are then folded into one retired total. Every series is a
+counter or a histogram; there are no gauges to drop.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from hmac import compare_digest
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: scrapes don't lock the archive
+    fcntl = None
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from library_app.permissions import IsSuperUser, HasMetricsToken
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Layout of the per-series sample list
+COUNT, LATENCY_SUM, DB_QUERIES, DB_SECONDS, RESPONSE_BYTES, FIRST_BUCKET = range(6)
+
+ARCHIVE = 'archive.json'
+
+
+def add_series(total, series):
+    """Add the samples of `series` into `total`"""
+    for key, sample in series.items():
+        merged = total.setdefault(key, [0] * len(sample))
+        for index, value in enumerate(sample):
+            merged[index] += value
+    return total
+
+
+class MetricsRegistry:
+    """Thread-safe accumulator of request samples keyed by (route, method, status)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._series = {}
+        self._last_flush = 0.0
+        # (pid, worker id) and the pid the flusher thread runs in; both change in forked children
+        self._worker = None
+        self._flusher = None
+
+    def observe(self, route, method, status, latency, db_queries, db_seconds, response_bytes):
+        key = f'{route}\t{method}\t{status}'
+        with self._lock:
+            sample = self._series.get(key)
+            if sample is None:
+                sample = self._series[key] = [0, 0.0, 0, 0.0, 0] + [0] * len(LATENCY_BUCKETS)
+            sample[COUNT] += 1
+            sample[LATENCY_SUM] += latency
+            sample[DB_QUERIES] += db_queries
+            sample[DB_SECONDS] += db_seconds
+            sample[RESPONSE_BYTES] += response_bytes
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    sample[FIRST_BUCKET + index] += 1
+                    break
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(sample) for key, sample in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._last_flush = 0.0
+
+    @property
+    def worker_id(self):
+        pid = os.getpid()
+        if self._worker is None or self._worker[0] != pid:
+            self._worker = (pid, f'{socket.gethostname()}-{pid}-{uuid.uuid4().hex[:8]}')
+        return self._worker[1]
+
+    def maybe_flush(self):
+        """Write this worker's snapshot to METRICS_DIR if the flush interval elapsed"""
+        if not settings.METRICS_DIR:
+            return
+        with self._lock:
+            start = self._flusher != os.getpid()
+            self._flusher = os.getpid()
+        if start:
+            # Keeps the snapshot fresh while no requests come in, so only exited workers go stale
+            threading.Thread(target=self.run_flusher, name='metrics-flusher', daemon=True).start()
+        now = time.monotonic()
+        if now - self._last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        self.flush()
+
+    def run_flusher(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                if settings.METRICS_DIR:
+                    self.flush()
+            except Exception:
+                logger.exception('Could not write the metrics snapshot')
+
+    def flush(self):
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'metrics-{self.worker_id}.json'
+        temporary = path.with_suffix('.tmp')
+        with self._flush_lock:
+            temporary.write_text(json.dumps(self.snapshot()))
+            os.replace(temporary, path)
+
+    def collect(self):
+        """Merge the snapshots of every worker, using live data for this one"""
+        merged = add_series({}, self.snapshot())
+        if not settings.METRICS_DIR:
+            return merged
+        directory = Path(settings.METRICS_DIR)
+        own = f'metrics-{self.worker_id}'
+        live, stale = {}, []
+        for path in directory.glob('metrics-*.json'):
+            if path.stem == own:
+                continue
+            try:
+                if time.time() - path.stat().st_mtime > settings.METRICS_STALE_AFTER:
+                    stale.append(path)
+                else:
+                    live[path.stem] = json.loads(path.read_text())
+            except (OSError, ValueError):
+                # The worker is rewriting its file; the next scrape picks it up
+                continue
+        archive = archive_snapshots(directory, stale)
+        for series in live.values():
+            add_series(merged, series)
+        add_series(merged, archive['retired'])
+        for worker, entry in archive['workers'].items():
+            # A stalled worker that wrote again counts with its live snapshot only
+            if worker not in live and worker != own:
+                add_series(merged, entry['series'])
+        return merged
+
+
+def read_archive(path):
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return {'retired': {}, 'workers': {}}
+
+
+def archive_snapshots(directory, stale):
+    """Move the snapshot files `stale` into the archive of `directory` and return the archive"""
+    path = directory / ARCHIVE
+    if not stale:
+        return read_archive(path)
+    with open(directory / 'archive.lock', 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = read_archive(path)
+        now = time.time()
+        archived = []
+        for snapshot in stale:
+            try:
+                series = json.loads(snapshot.read_text())
+            except (OSError, ValueError):
+                # Archived by a concurrent scrape
+                continue
+            archive['workers'][snapshot.stem] = {'archived_at': now, 'series': series}
+            archived.append(snapshot)
+        for worker, entry in list(archive['workers'].items()):
+            if now - entry['archived_at'] > settings.METRICS_RETIRE_AFTER:
+                add_series(archive['retired'], archive['workers'].pop(worker)['series'])
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(archive))
+        os.replace(temporary, path)
+        # Only removed once the archive holding them is on disk
+        for snapshot in archived:
+            snapshot.unlink(missing_ok=True)
+    return archive
+
+
+registry = MetricsRegistry()
+
+
+class _QueryTimer:
+    """Execute wrapper counting queries and the time spent in them"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """Record latency, DB usage, response size and status for every request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        return measure(request, self.get_response)
+
+
+def measure(request, get_response):
+    """Answer `request` with `get_response` and record the request in the registry"""
+    timer = _QueryTimer()
+    # Inner middleware (load shedding) reads the DB timings of the request from here
+    request.query_timer = timer
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        response = get_response(request)
+    latency = time.perf_counter() - start
+
+    match = request.resolver_match
+    route = match.route if match is not None else 'unmatched'
+    # Batch sub-responses are never rendered on their own; their bytes count towards the batch
+    rendered = getattr(response, 'is_rendered', True) and not response.streaming
+    size = len(response.content) if rendered else 0
+    registry.observe(route, request.method, response.status_code, latency,
+                     timer.queries, timer.seconds, size)
+    registry.maybe_flush()
+    return response
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(series):
+    """Render merged samples in the Prometheus text exposition format"""
+    histogram = [
+        '# HELP http_request_duration_seconds Request latency by route, method and status.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    counters = {
+        'http_db_queries_total': ('Database queries issued while serving requests.', DB_QUERIES, []),
+        'http_db_query_seconds_total': ('Time spent in database queries.', DB_SECONDS, []),
+        'http_response_bytes_total': ('Bytes of response bodies sent.', RESPONSE_BYTES, []),
+    }
+    for key in sorted(series):
+        sample = series[key]
+        route, method, status = key.split('\t')
+        labels = f'route="{_escape(route)}",method="{method}",status="{status}"'
+        cumulative = 0
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            cumulative += sample[FIRST_BUCKET + index]
+            histogram.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        histogram.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {sample[COUNT]}')
+        histogram.append(f'http_request_duration_seconds_sum{{{labels}}} {sample[LATENCY_SUM]}')
+        histogram.append(f'http_request_duration_seconds_count{{{labels}}} {sample[COUNT]}')
+        for name, (_, index, lines) in counters.items():
+            lines.append(f'{name}{{{labels}}} {sample[index]}')
+
+    output = histogram
+    for name, (help_text, _, lines) in counters.items():
+        output += [f'# HELP {name} {help_text}', f'# TYPE {name} counter'] + lines
+    return '\n'.join(output) + '\n'
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """Accept the static METRICS_TOKEN bearer token used by scrapers"""
+
+    def authenticate(self, request):
+        token = settings.METRICS_TOKEN
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if token and compare_digest(header, f'Bearer {token}'):
+            return (AnonymousUser(), token)
+        return None
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="metrics"'
+
+
+class MetricsAPIView(APIView):
+    """Prometheus scrape endpoint (metrics token or superuser only)"""
+    authentication_classes = [MetricsTokenAuthentication, JWTAuthentication]
+    permission_classes = [HasMetricsToken | IsSuperUser]
+
+    def get(self, request):
+        return HttpResponse(
+            render_prometheus(registry.collect()),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
@@ -0,0 +1,132 @@
+import hashlib
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework.permissions import SAFE_METHODS
+
+from library_app.db_router import read_from
+
+
+PIN_COOKIE = 'db_pin'
+PIN_SALT = 'library_app.db-pin'
+
+
+def _pin_key(request):
+    """Cache key pinning the credentials of the request, or None for anonymous requests"""
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    return f"db-pin:auth:{hashlib.sha256(authorization.encode()).hexdigest()}"
+
+
+def _is_pinned(request):
+    if request.get_signed_cookie(PIN_COOKIE, default=None, salt=PIN_SALT,
+                                 max_age=settings.READ_YOUR_WRITES_WINDOW):
+        return True
+    key = _pin_key(request)
+    return key is not None and bool(cache.get(key))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serve safe requests from a read replica.
+
+    Clients that wrote successfully within READ_YOUR_WRITES_WINDOW seconds are
+    pinned to the primary and never see stale data. They are recognised by their
+    token and by a signed cookie set on the write response, so a freshly
+    registered user can use their new token straight away. Clients are never
+    recognised by address: everyone behind one proxy or NAT would be pinned.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            return self.get_response(request)
+
+        alias = None
+        if request.method in SAFE_METHODS and not _is_pinned(request):
+            alias = random.choice(replicas)
+
+        with read_from(alias):
+            response = self.get_response(request)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            key = _pin_key(request)
+            if key is not None:
+                cache.set(key, True, settings.READ_YOUR_WRITES_WINDOW)
+            response.set_signed_cookie(PIN_COOKIE, '1', salt=PIN_SALT, max_age=settings.READ_YOUR_WRITES_WINDOW,
+                                       httponly=True, samesite='Lax')
+        return response
+
+
+class LoadSheddingMiddleware:
+    """
+    Turn away low-priority requests with 503 while this worker is overloaded.
+
+    Low-priority requests are anonymous reads under LOAD_SHEDDING_PATHS; signed-in
+    traffic, and therefore borrow and return, is never shed. The worker counts as
+    overloaded while more than LOAD_SHEDDING_MAX_IN_FLIGHT requests are being served
+    (threaded/ASGI workers) or while the moving average of DB query latency, taken
+    from MetricsMiddleware, is above LOAD_SHEDDING_DB_LATENCY seconds.
+    """
+    smoothing = 0.2
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.db_latency = 0.0
+        self.db_latency_updated = 0.0
+
+    def is_low_priority(self, request):
+        return (
+            request.method in SAFE_METHODS
+            and 'HTTP_AUTHORIZATION' not in request.META
+            and request.path.startswith(tuple(settings.LOAD_SHEDDING_PATHS))
+        )
+
+    def is_overloaded(self):
+        if self.in_flight >= settings.LOAD_SHEDDING_MAX_IN_FLIGHT:
+            return True
+        # Shed requests do not measure the DB, so without fresh samples the
+        # latency reading expires and traffic is let through again to re-probe
+        fresh = time.monotonic() - self.db_latency_updated < settings.LOAD_SHEDDING_RETRY_AFTER
+        return fresh and self.db_latency > settings.LOAD_SHEDDING_DB_LATENCY
+
+    def __call__(self, request):
+        # Batch sub-requests are served through `serve` as well
+        request.load_shedding = self
+        return self.serve(request, self.get_response, self.is_low_priority(request))
+
+    def serve(self, request, get_response, low_priority):
+        """Answer `request` with `get_response`, or with 503 if it is low priority and the worker is overloaded"""
+        if settings.LOAD_SHEDDING_ENABLED and low_priority and self.is_overloaded():
+            response = JsonResponse(
+                {"success": False, "code": "server_busy", "message": "Server is busy, please retry shortly"},
+                status=503
+            )
+            response['Retry-After'] = str(settings.LOAD_SHEDDING_RETRY_AFTER)
+            return response
+
+        with self.lock:
+            self.in_flight += 1
+        try:
+            response = get_response(request)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+        timer = getattr(request, 'query_timer', None)
+        if timer is not None and timer.queries:
+            latency = timer.seconds / timer.queries
+            with self.lock:
+                self.db_latency += self.smoothing * (latency - self.db_latency)
+                self.db_latency_updated = time.monotonic()
+        return response
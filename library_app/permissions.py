@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework.permissions import BasePermission
 
 
@@ -6,3 +7,10 @@ class IsSuperUser(BasePermission):
     
     def has_permission(self, request, view):
         return request.user and request.user.is_superuser
+
+
+class HasMetricsToken(BasePermission):
+    """Permission class for scrapers presenting the configured METRICS_TOKEN"""
+
+    def has_permission(self, request, view):
+        return bool(settings.METRICS_TOKEN) and request.auth == settings.METRICS_TOKEN
@@ -49,11 +49,18 @@ INSTALLED_APPS = [
     'drf_yasg',  # Swagger API documentation
     
     # Local apps
+    'library_app',  # project-wide management commands
     'user',
     'books',
+    'jobs',
+    'docs',
+    'audit',
 ]
 
 MIDDLEWARE = [
+    'library_app.metrics.MetricsMiddleware',
+    'library_app.middleware.LoadSheddingMiddleware',
+    'library_app.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -62,8 +69,28 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'library_app.middleware.ReplicaRoutingMiddleware',
 ]
 
+# 'full' serves everything; 'api' leaves out the admin, the API docs and static file
+# serving so API-only workers start faster. The token blacklist stays: refresh
+# token rotation depends on it.
+DEPLOYMENT_ROLE = config('DEPLOYMENT_ROLE', default='full')
+if DEPLOYMENT_ROLE == 'api':
+    INSTALLED_APPS = [
+        app for app in INSTALLED_APPS
+        if app not in ('django.contrib.admin', 'django.contrib.messages', 'drf_yasg', 'docs')
+    ]
+    MIDDLEWARE = [
+        middleware for middleware in MIDDLEWARE
+        if middleware not in (
+            'whitenoise.middleware.WhiteNoiseMiddleware',
+            'django.contrib.messages.middleware.MessageMiddleware',
+        )
+    ]
+# Seconds a new worker may spend on imports, django.setup() and the URLconf
+STARTUP_TIME_BUDGET = config('STARTUP_TIME_BUDGET', default=2.0, cast=float)
+
 ROOT_URLCONF = 'library_app.urls'
 
 TEMPLATES = [
@@ -89,15 +116,162 @@ WSGI_APPLICATION = 'library_app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': config('DB_ENGINE', default='django.db.backends.postgresql'),
         'NAME': config('DB_NAME', default='library'),
         'USER': config('DB_USER', default='postgres'),
         'PASSWORD': config('DB_PASSWORD', default='postgres'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        # Keep connections open between requests and ping them before reuse
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Read replicas share the primary's credentials; each entry of DB_REPLICA_HOSTS
+# ("host" or "host:port") becomes a `replica_<n>` alias. Pointing one replica at
+# the primary itself is enough to exercise the routing locally.
+DATABASE_REPLICAS = []
+for _index, _replica in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+    _host, _, _port = _replica.partition(':')
+    _alias = f'replica_{_index}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(_alias)
+
+DATABASE_ROUTERS = ['library_app.db_router.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after a successful write
+READ_YOUR_WRITES_WINDOW = config('READ_YOUR_WRITES_WINDOW', default=5, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Use a shared backend (e.g. django.core.cache.backends.redis.RedisCache) when
+# running several workers so that state such as replica pinning is shared.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='library-app'),
     }
 }
 
+# Seconds a cached catalogue page stays valid; book changes invalidate it sooner
+CATALOGUE_CACHE_TIMEOUT = config('CATALOGUE_CACHE_TIMEOUT', default=60, cast=int)
+
+# Seconds before a worker rebuilds its title autocomplete index to pick up
+# changes made by other workers
+AUTOCOMPLETE_REFRESH_INTERVAL = config('AUTOCOMPLETE_REFRESH_INTERVAL', default=300, cast=int)
+
+# Idempotency-Key handling: how long responses are replayed, and how long a
+# request may run before its key can be claimed again
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=30, cast=int)
+
+# Transactional outbox relay (python manage.py relay_outbox)
+OUTBOX_SINK = config('OUTBOX_SINK', default='books.outbox.FileSink')
+OUTBOX_FILE = config('OUTBOX_FILE', default=str(BASE_DIR / 'outbox.jsonl'))
+OUTBOX_HTTP_URL = config('OUTBOX_HTTP_URL', default='http://localhost:9000/events')
+OUTBOX_RETENTION_DAYS = config('OUTBOX_RETENTION_DAYS', default=7, cast=int)
+# An event the sink rejects this many times in a row is parked so its shard moves on
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=20, cast=int)
+
+# Background jobs (python manage.py worker)
+JOB_WORKER_PROCESSES = config('JOB_WORKER_PROCESSES', default=1, cast=int)
+JOB_WORKER_THREADS = config('JOB_WORKER_THREADS', default=4, cast=int)
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=1, cast=float)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=3, cast=int)
+JOB_RETRY_BASE_DELAY = config('JOB_RETRY_BASE_DELAY', default=10, cast=float)
+JOB_RETRY_MAX_DELAY = config('JOB_RETRY_MAX_DELAY', default=3600, cast=float)
+# A running job whose worker has not finished it after this many seconds is run again
+JOB_LEASE_TIMEOUT = config('JOB_LEASE_TIMEOUT', default=1800, cast=int)
+# How often each worker thread looks for expired leases, busy or not
+JOB_REQUEUE_INTERVAL = config('JOB_REQUEUE_INTERVAL', default=60, cast=float)
+
+# Admin changelists stop counting rows past this number
+ADMIN_EXACT_COUNT_LIMIT = config('ADMIN_EXACT_COUNT_LIMIT', default=10000, cast=int)
+
+# Prebuilt OpenAPI schema (python manage.py generate_schema)
+OPENAPI_SCHEMA_DIR = config('OPENAPI_SCHEMA_DIR', default=str(BASE_DIR / 'openapi'))
+OPENAPI_SCHEMA_MAX_AGE = config('OPENAPI_SCHEMA_MAX_AGE', default=3600, cast=int)
+SWAGGER_SETTINGS = {'SPEC_URL': '/swagger.json'}
+REDOC_SETTINGS = {'SPEC_URL': '/swagger.json'}
+
+# Response compression (gzip, or brotli when the package is installed)
+COMPRESSION_ENABLED = config('COMPRESSION_ENABLED', default=True, cast=bool)
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+
+# Loans are due LOAN_PERIOD_DAYS after borrowing; the dashboard flags them "due_soon"
+# LOAN_DUE_SOON_DAYS before that
+LOAN_PERIOD_DAYS = config('LOAN_PERIOD_DAYS', default=14, cast=int)
+LOAN_DUE_SOON_DAYS = config('LOAN_DUE_SOON_DAYS', default=2, cast=int)
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=30, cast=int)
+
+# POST /batch/ limits; concurrent GET sub-requests share BATCH_WORKERS threads
+BATCH_MAX_REQUESTS = config('BATCH_MAX_REQUESTS', default=20, cast=int)
+BATCH_WORKERS = config('BATCH_WORKERS', default=4, cast=int)
+
+# Server-sent availability events (GET /books/events/, streamed under ASGI)
+SSE_POLL_INTERVAL = config('SSE_POLL_INTERVAL', default=1, cast=float)
+SSE_HEARTBEAT = config('SSE_HEARTBEAT', default=15, cast=float)
+# Streams end after this many seconds and clients resume with Last-Event-ID
+SSE_MAX_DURATION = config('SSE_MAX_DURATION', default=300, cast=float)
+SSE_RETRY_MS = config('SSE_RETRY_MS', default=3000, cast=int)
+SSE_BATCH_SIZE = config('SSE_BATCH_SIZE', default=500, cast=int)
+SSE_QUEUE_SIZE = config('SSE_QUEUE_SIZE', default=1000, cast=int)
+# Events are sent once they are this old, so one committed late with a lower id isn't skipped
+SSE_SETTLE_SECONDS = config('SSE_SETTLE_SECONDS', default=1, cast=float)
+
+# Delta sync (GET /books/sync/?changed_since=<token>)
+SYNC_PAGE_SIZE = config('SYNC_PAGE_SIZE', default=500, cast=int)
+SYNC_MAX_PAGE_SIZE = config('SYNC_MAX_PAGE_SIZE', default=2000, cast=int)
+# Changes are served once they are this old, so slower concurrent commits are not skipped
+SYNC_SETTLE_SECONDS = config('SYNC_SETTLE_SECONDS', default=2, cast=float)
+# Deletions are kept this long; older tokens must sync from scratch
+SYNC_TOMBSTONE_RETENTION_DAYS = config('SYNC_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+
+# Book covers; thumbnails (size name -> width in px) are rendered by the books.render_cover job
+COVER_MAX_UPLOAD_BYTES = config('COVER_MAX_UPLOAD_BYTES', default=5 * 1024 * 1024, cast=int)
+COVER_MAX_PIXELS = config('COVER_MAX_PIXELS', default=25_000_000, cast=int)
+COVER_THUMBNAIL_SIZES = {'small': 160, 'medium': 320, 'large': 640}
+COVER_THUMBNAIL_QUALITY = config('COVER_THUMBNAIL_QUALITY', default=80, cast=int)
+# Processes resizing thumbnails in each job worker; 0 resizes in the job's own thread
+COVER_THUMBNAIL_PROCESSES = config('COVER_THUMBNAIL_PROCESSES', default=2, cast=int)
+# Prefix of cover URLs, e.g. a CDN in front of /books/covers/
+COVER_URL = config('COVER_URL', default='/books/covers/')
+# Cover file names change with their content, so clients may cache them for good
+COVER_MAX_AGE = config('COVER_MAX_AGE', default=365 * 24 * 3600, cast=int)
+
+# "Borrowed together" recommendations (books.update_recommendations job)
+RECOMMENDATIONS_TOP_N = config('RECOMMENDATIONS_TOP_N', default=10, cast=int)
+# Co-occurrence matrix and progress, kept between runs by the job workers
+RECOMMENDATIONS_STATE = config('RECOMMENDATIONS_STATE', default=str(BASE_DIR / 'cooccurrence.npz'))
+# Loans younger than this wait for the next run, in case one with a lower id is still committing
+RECOMMENDATIONS_SETTLE_SECONDS = config('RECOMMENDATIONS_SETTLE_SECONDS', default=60, cast=int)
+# Bulk book updates and deletes: rows changed per transaction, and ids accepted per request
+BULK_BATCH_SIZE = config('BULK_BATCH_SIZE', default=1000, cast=int)
+BULK_MAX_IDS = config('BULK_MAX_IDS', default=10000, cast=int)
+
+# Checkpoint of an interrupted `manage.py reconcile_availability` run
+RECONCILE_STATE = config('RECONCILE_STATE', default=str(BASE_DIR / 'reconcile_availability.json'))
+
+# Audit log: each worker buffers events and writes them in batches of
+# AUDIT_BUFFER_SIZE, at least every AUDIT_FLUSH_INTERVAL seconds and on exit
+AUDIT_BUFFER_SIZE = config('AUDIT_BUFFER_SIZE', default=500, cast=int)
+AUDIT_FLUSH_INTERVAL = config('AUDIT_FLUSH_INTERVAL', default=2, cast=float)
+# Events kept in memory while the database is unavailable; older ones are dropped
+AUDIT_MAX_BUFFER = config('AUDIT_MAX_BUFFER', default=50000, cast=int)
+# Monthly partitions created ahead (PostgreSQL) and dropped after AUDIT_RETENTION_MONTHS (0 keeps all)
+AUDIT_PARTITIONS_AHEAD = config('AUDIT_PARTITIONS_AHEAD', default=2, cast=int)
+AUDIT_RETENTION_MONTHS = config('AUDIT_RETENTION_MONTHS', default=0, cast=int)
+# Longest time range one GET /audit/ query may cover
+AUDIT_MAX_QUERY_DAYS = config('AUDIT_MAX_QUERY_DAYS', default=31, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -135,6 +309,20 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# collectstatic writes .gz/.br copies of every asset (.br needs the brotli package)
+# and content-hashed names, which WhiteNoise serves with year-long immutable caching.
+# The hashed names need a collectstatic manifest; turn STATICFILES_MANIFEST off where
+# collectstatic doesn't run (the test runner does so itself).
+STATICFILES_MANIFEST = config('STATICFILES_MANIFEST', default=True, cast=bool)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': (
+            'whitenoise.storage.CompressedManifestStaticFilesStorage' if STATICFILES_MANIFEST
+            else 'whitenoise.storage.CompressedStaticFilesStorage'
+        ),
+    },
+}
 
 # Media files (uploaded files)
 MEDIA_URL = '/media/'
@@ -150,9 +338,33 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ]
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'library_app.throttling.AnonBrowseThrottle',
+        'library_app.throttling.AnonWriteThrottle',
+        'library_app.throttling.UserBrowseThrottle',
+        'library_app.throttling.UserWriteThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon_browse': config('THROTTLE_ANON_BROWSE', default='120/min'),
+        'anon_write': config('THROTTLE_ANON_WRITE', default='10/min'),
+        'user_browse': config('THROTTLE_USER_BROWSE', default='300/min'),
+        'user_write': config('THROTTLE_USER_WRITE', default='60/min'),
+    },
 }
 
+# Throttle buckets live in the default cache; the test runner turns throttling
+# off so test cases don't share them (see library_app.testing)
+THROTTLING_ENABLED = config('THROTTLING_ENABLED', default=True, cast=bool)
+TEST_RUNNER = 'library_app.testing.TestRunner'
+
+# Adaptive load shedding of anonymous catalogue reads
+LOAD_SHEDDING_ENABLED = config('LOAD_SHEDDING_ENABLED', default=True, cast=bool)
+LOAD_SHEDDING_PATHS = config('LOAD_SHEDDING_PATHS', default='/books/', cast=Csv())
+LOAD_SHEDDING_MAX_IN_FLIGHT = config('LOAD_SHEDDING_MAX_IN_FLIGHT', default=32, cast=int)
+LOAD_SHEDDING_DB_LATENCY = config('LOAD_SHEDDING_DB_LATENCY', default=0.2, cast=float)
+LOAD_SHEDDING_RETRY_AFTER = config('LOAD_SHEDDING_RETRY_AFTER', default=5, cast=int)
+
 # JWT Settings
 from datetime import timedelta
 
@@ -171,3 +383,14 @@ SIMPLE_JWT = {
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Metrics
+# Workers sharing METRICS_DIR publish snapshots there so /metrics covers all of them.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=float)
+# A snapshot not rewritten for this many seconds is a finished worker's and goes to the archive,
+# where it is kept per worker for METRICS_RETIRE_AFTER seconds before joining the retired total
+METRICS_STALE_AFTER = config('METRICS_STALE_AFTER', default=60, cast=float)
+METRICS_RETIRE_AFTER = config('METRICS_RETIRE_AFTER', default=86400, cast=float)
+# Bearer token for Prometheus scrapes; superusers can always read /metrics
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
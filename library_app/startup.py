@@ -0,0 +1,69 @@
+"""
+Cold-start measurement for server processes.
+
+`measure_startup()` runs a fresh interpreter with `-X importtime`, calls
+`django.setup()` and loads the URLconf, which is the work a worker does before
+it can answer its first request, and reports the timings together with the
+import cost of every module.
+"""
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.apps import apps
+from django.urls import get_resolver
+get_resolver().url_patterns
+end = time.perf_counter()
+print(json.dumps({
+    'setup_seconds': setup - start,
+    'urlconf_seconds': end - setup,
+    'apps': [config.name for config in apps.get_app_configs()],
+    'modules': sorted(sys.modules),
+}))
+"""
+
+
+def parse_importtime(output):
+    """[(module, self_us, cumulative_us)] from `python -X importtime` output"""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def by_package(imports):
+    """Total self import time in microseconds per top-level package, slowest first"""
+    totals = defaultdict(int)
+    for name, self_us, _ in imports:
+        totals[name.split('.')[0]] += self_us
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def measure_startup(env=None):
+    """Start a new process with `env` added to the environment and time its startup"""
+    environment = {**os.environ, **(env or {})}
+    paths = [str(settings.BASE_DIR), environment.get('PYTHONPATH', '')]
+    environment['PYTHONPATH'] = os.pathsep.join(path for path in paths if path)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT],
+        capture_output=True, text=True, env=environment, cwd=settings.BASE_DIR,
+    )
+    if result.returncode:
+        raise RuntimeError(f'Startup failed:\n{result.stderr[-2000:]}')
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['total_seconds'] = report['setup_seconds'] + report['urlconf_seconds']
+    report['imports'] = parse_importtime(result.stderr)
+    return report
@@ -0,0 +1,113 @@
+"""
+Test helpers shared by the app test suites.
+
+`QueryBudgetMixin` runs an endpoint against growing amounts of data and fails
+when the number of SQL queries grows with it, which is how N+1 regressions
+show up. The failure message lists every query whose count scaled together
+with the stack of the code that issued it.
+
+`TestRunner` runs the suite with the settings in TEST_SETTINGS overridden.
+"""
+import traceback
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+PROJECT_ROOT = str(Path(settings.BASE_DIR))
+
+TEST_SETTINGS = {
+    # Buckets live in the shared cache and would carry over between test cases;
+    # throttling tests enable it themselves
+    'THROTTLING_ENABLED': False,
+    # Test runs have no collectstatic manifest to look hashed names up in
+    'STORAGES': {
+        **settings.STORAGES,
+        'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedStaticFilesStorage'},
+    },
+}
+
+
+class TestRunner(DiscoverRunner):
+    """The default runner, with TEST_SETTINGS applied for the whole run"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(**TEST_SETTINGS)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+class CapturedQueries(list):
+    """List of (sql, stack) pairs recorded by `capture_queries`"""
+
+    def by_statement(self):
+        grouped = defaultdict(list)
+        for sql, stack in self:
+            grouped[sql].append(stack)
+        return grouped
+
+
+@contextmanager
+def capture_queries():
+    """Record the SQL template and project call stack of every query in the block"""
+    captured = CapturedQueries()
+
+    def wrapper(execute, sql, params, many, context):
+        frames = [
+            frame for frame in traceback.extract_stack()[:-1]
+            if frame.filename.startswith(PROJECT_ROOT) and 'site-packages' not in frame.filename
+        ]
+        captured.append((sql, ''.join(traceback.format_list(frames))))
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield captured
+
+
+class QueryBudgetMixin:
+    """TestCase mixin asserting that endpoints run a constant number of queries"""
+    row_counts = (1, 10, 100)
+
+    def assertConstantQueries(self, add_rows, request, row_counts=None):
+        """
+        Grow the data with `add_rows(count)` to each of `row_counts` rows in turn,
+        call `request()` at every size and fail if the query count changes.
+        """
+        row_counts = row_counts or self.row_counts
+        runs = {}
+        existing = 0
+        for rows in row_counts:
+            add_rows(rows - existing)
+            existing = rows
+            with capture_queries() as captured:
+                response = request()
+            self.assertLess(response.status_code, 500, f'request failed with {rows} rows')
+            runs[rows] = captured
+
+        smallest, largest = runs[row_counts[0]], runs[row_counts[-1]]
+        if all(len(captured) == len(smallest) for captured in runs.values()):
+            return
+
+        baseline = smallest.by_statement()
+        lines = [
+            'Query count scales with rows: ' + ', '.join(
+                f'{rows} rows -> {len(captured)} queries' for rows, captured in runs.items()
+            )
+        ]
+        for sql, stacks in largest.by_statement().items():
+            if len(stacks) != len(baseline.get(sql, [])):
+                lines.append(
+                    f'\n{len(baseline.get(sql, []))} -> {len(stacks)} executions of:\n  {sql}\n'
+                    f'issued from:\n{stacks[-1]}'
+                )
+        self.fail('\n'.join(lines))
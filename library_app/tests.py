@@ -0,0 +1,552 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+from pathlib import Path
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from books.models import Book
+from user.models import User
+from library_app import compression
+from library_app.compression import CompressionMiddleware, choose_encoding
+from library_app.db_router import PrimaryReplicaRouter, read_from
+from library_app.metrics import registry
+from library_app.middleware import PIN_COOKIE, LoadSheddingMiddleware, ReplicaRoutingMiddleware
+from library_app.startup import by_package, measure_startup, parse_importtime
+from library_app.throttling import AnonBrowseThrottle
+
+
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    """Test cases for primary/replica database routing"""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_use_primary_outside_requests(self):
+        """Test reads go to the primary when no replica was chosen"""
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+
+    def test_reads_use_chosen_replica(self):
+        """Test reads go to the replica chosen for the block"""
+        with read_from('replica_1'):
+            self.assertEqual(self.router.db_for_read(Book), 'replica_1')
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+
+    def test_writes_always_use_primary(self):
+        """Test writes go to the primary even inside a replica block"""
+        with read_from('replica_1'):
+            self.assertEqual(self.router.db_for_write(Book), 'default')
+
+    def test_migrations_only_run_on_primary(self):
+        """Test replicas are never migrated"""
+        self.assertTrue(self.router.allow_migrate('default', 'books'))
+        self.assertFalse(self.router.allow_migrate('replica_1', 'books'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], READ_YOUR_WRITES_WINDOW=5)
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    """Test cases for read-your-writes replica pinning"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+        self.read_aliases = []
+        self.middleware = ReplicaRoutingMiddleware(self.view)
+
+    def view(self, request):
+        self.read_aliases.append(self.router.db_for_read(Book))
+        return HttpResponse(status=400 if request.GET.get('fail') else 200)
+
+    def test_safe_requests_read_from_replica(self):
+        """Test GET requests are served from a replica"""
+        self.middleware(self.factory.get('/books/'))
+        self.assertEqual(self.read_aliases, ['replica_1'])
+
+    def test_writes_read_from_primary(self):
+        """Test unsafe requests read from the primary"""
+        self.middleware(self.factory.post('/books/borrow/'))
+        self.assertEqual(self.read_aliases, ['default'])
+
+    def test_client_pinned_after_write(self):
+        """Test a client reads from the primary right after writing"""
+        self.middleware(self.factory.post('/books/borrow/', HTTP_AUTHORIZATION='Bearer abc'))
+        self.middleware(self.factory.get('/books/', HTTP_AUTHORIZATION='Bearer abc'))
+        self.assertEqual(self.read_aliases, ['default', 'default'])
+
+    def test_failed_write_does_not_pin(self):
+        """Test rejected writes leave the client on the replica"""
+        self.middleware(self.factory.post('/books/borrow/?fail=1', HTTP_AUTHORIZATION='Bearer abc'))
+        self.middleware(self.factory.get('/books/', HTTP_AUTHORIZATION='Bearer abc'))
+        self.assertEqual(self.read_aliases, ['default', 'replica_1'])
+
+    def test_anonymous_writer_pinned_by_cookie(self):
+        """Test a client without a token is pinned by the signed cookie of its write"""
+        response = self.middleware(self.factory.post('/users/register/'))
+        request = self.factory.get('/books/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.middleware(request)
+        self.assertEqual(self.read_aliases, ['default', 'default'])
+
+        forged = self.factory.get('/books/')
+        forged.COOKIES[PIN_COOKIE] = '1'
+        self.middleware(forged)
+        self.assertEqual(self.read_aliases[-1], 'replica_1')
+
+    def test_shared_address_is_not_pinned(self):
+        """Test a write doesn't pin other clients behind the same address"""
+        self.middleware(self.factory.post('/books/borrow/', REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer abc'))
+        self.middleware(self.factory.get('/books/', REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer other'))
+        self.assertEqual(self.read_aliases, ['default', 'replica_1'])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        """Test everything uses the primary without replicas"""
+        self.middleware(self.factory.get('/books/'))
+        self.assertEqual(self.read_aliases, ['default'])
+
+
+@override_settings(METRICS_TOKEN='scrape-secret', METRICS_DIR='')
+class MetricsTests(TestCase):
+    """Test cases for request metrics and the /metrics endpoint"""
+
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        self.metrics_url = reverse('metrics')
+        self.superuser = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='AdminPass123!',
+            first_name='Admin',
+            last_name='User'
+        )
+
+    def scrape(self):
+        response = self.client.get(self.metrics_url, HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content.decode()
+
+    def test_requests_recorded_per_route(self):
+        """Test latency, query and size series are exported per route"""
+        self.client.get(reverse('books'))
+        body = self.scrape()
+        labels = 'route="books/",method="GET",status="200"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 1', body)
+        self.assertIn(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1', body)
+        self.assertIn(f'http_db_queries_total{{{labels}}}', body)
+        self.assertIn(f'http_response_bytes_total{{{labels}}}', body)
+
+    def test_metrics_requires_token_or_superuser(self):
+        """Test anonymous and regular clients cannot read metrics"""
+        response = self.client.get(self.metrics_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(user=self.superuser)
+        response = self.client.get(self.metrics_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_snapshots_merged_across_workers(self):
+        """Test samples written by other workers are included in scrapes"""
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            registry.observe('books/search/', 'GET', 200, 0.02, 1, 0.001, 100)
+            registry.flush()
+            # Pretend the file was written by another worker process
+            for path in Path(directory).glob('*.json'):
+                path.rename(Path(directory) / 'metrics-otherhost-7-0123abcd.json')
+            registry.reset()
+            body = self.scrape()
+        self.assertIn('http_request_duration_seconds_count{route="books/search/",method="GET",status="200"} 1', body)
+
+    def test_finished_workers_archived(self):
+        """Test snapshots of workers that stopped writing keep counting from the archive"""
+        search = 'http_request_duration_seconds_count{route="books/search/",method="GET",status="200"}'
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            registry.observe('books/search/', 'GET', 200, 0.02, 1, 0.001, 100)
+            registry.flush()
+            own = Path(directory) / f'metrics-{registry.worker_id}.json'
+            finished = Path(directory) / 'metrics-otherhost-7-0123abcd.json'
+            shutil.copy(own, finished)
+            os.utime(finished, (time.time() - 3600, time.time() - 3600))
+            self.assertIn(f'{search} 2', self.scrape())
+            self.assertFalse(finished.exists())
+            self.assertIn(f'{search} 2', self.scrape())
+
+            # A worker that was only stalled replaces its archived counts when it writes again
+            shutil.copy(own, finished)
+            self.assertIn(f'{search} 2', self.scrape())
+
+            # Past METRICS_RETIRE_AFTER, archived workers are folded into one total
+            finished.unlink()
+            another = Path(directory) / 'metrics-otherhost-9-4567cdef.json'
+            shutil.copy(own, another)
+            os.utime(another, (time.time() - 3600, time.time() - 3600))
+            with self.settings(METRICS_RETIRE_AFTER=0):
+                self.assertIn(f'{search} 3', self.scrape())
+            archive = json.loads((Path(directory) / 'archive.json').read_text())
+        self.assertEqual(list(archive['workers']), [another.stem])
+        self.assertEqual(archive['retired']['books/search/\tGET\t200'][0], 1)
+
+
+@override_settings(
+    THROTTLING_ENABLED=True,
+    REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {
+            'anon_browse': '3/min', 'anon_write': '2/min', 'user_browse': '5/min', 'user_write': '5/min',
+        },
+    },
+)
+class ThrottlingTests(TestCase):
+    """Test cases for token-bucket throttling"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='Pass123!',
+            first_name='Test',
+            last_name='User'
+        )
+
+    def test_anonymous_browsing_budget(self):
+        """Test anonymous reads are limited and told when to retry"""
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse('books')).status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('search_book'), {'title': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+    def test_budgets_are_separate(self):
+        """Test exhausting anonymous reads leaves logins and user requests alone"""
+        for _ in range(4):
+            self.client.get(reverse('books'))
+        response = self.client.post(reverse('login'), {'username': 'testuser', 'password': 'Pass123!'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(reverse('books')).status_code, status.HTTP_200_OK)
+
+    def test_login_budget(self):
+        """Test repeated anonymous logins are limited per client"""
+        data = {'username': 'testuser', 'password': 'wrong'}
+        for _ in range(2):
+            self.client.post(reverse('login'), data)
+        response = self.client.post(reverse('login'), data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_bucket_refills(self):
+        """Test tokens refill at the configured rate"""
+        request = RequestFactory().get('/books/')
+        request.user = mock.Mock(is_authenticated=False)
+        throttle = AnonBrowseThrottle()
+        with mock.patch.object(AnonBrowseThrottle, 'timer', side_effect=[0, 0, 0, 0, 20]):
+            self.assertTrue(all(throttle.allow_request(request, None) for _ in range(3)))
+            self.assertFalse(throttle.allow_request(request, None))
+            self.assertEqual(throttle.wait(), 20)
+            # 3 tokens per minute refill one token every 20 seconds
+            self.assertTrue(throttle.allow_request(request, None))
+
+    def test_concurrent_requests_share_the_bucket(self):
+        """Test simultaneous requests of one client can't spend the same tokens"""
+        request = RequestFactory().get('/books/')
+        request.user = mock.Mock(is_authenticated=False)
+        barrier = threading.Barrier(10)
+        results = []
+        get = LocMemCache.get
+
+        def slow_get(*args, **kwargs):
+            # Widen the window between reading and writing the bucket
+            value = get(*args, **kwargs)
+            time.sleep(0.01)
+            return value
+
+        def hit():
+            barrier.wait()
+            results.append(AnonBrowseThrottle().allow_request(request, None))
+
+        with mock.patch.object(LocMemCache, 'get', slow_get):
+            threads = [threading.Thread(target=hit) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(results.count(True), 3)
+
+
+@override_settings(
+    LOAD_SHEDDING_ENABLED=True,
+    LOAD_SHEDDING_PATHS=['/books/'],
+    LOAD_SHEDDING_MAX_IN_FLIGHT=2,
+    LOAD_SHEDDING_DB_LATENCY=0.1,
+    LOAD_SHEDDING_RETRY_AFTER=5,
+)
+class LoadSheddingTests(SimpleTestCase):
+    """Test cases for adaptive load shedding"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = LoadSheddingMiddleware(lambda request: HttpResponse())
+
+    def test_sheds_anonymous_reads_when_busy(self):
+        """Test anonymous catalogue reads get 503 and Retry-After when saturated"""
+        self.middleware.in_flight = 2
+        response = self.middleware(self.factory.get('/books/search/'))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '5')
+
+    def test_keeps_priority_traffic(self):
+        """Test writes, signed-in reads and other paths are never shed"""
+        self.middleware.in_flight = 2
+        self.assertEqual(self.middleware(self.factory.post('/books/borrow/')).status_code, 200)
+        self.assertEqual(self.middleware(self.factory.get('/books/', HTTP_AUTHORIZATION='Bearer x')).status_code, 200)
+        self.assertEqual(self.middleware(self.factory.get('/users/profile/')).status_code, 200)
+
+    def test_sheds_on_slow_database(self):
+        """Test a slow database triggers shedding until the reading expires"""
+        slow = self.factory.get('/books/borrow/')
+        slow.query_timer = mock.Mock(queries=2, seconds=2.0)
+        self.middleware(slow)
+        self.assertEqual(self.middleware(self.factory.get('/books/')).status_code, 503)
+        self.middleware.db_latency_updated -= 10
+        self.assertEqual(self.middleware(self.factory.get('/books/')).status_code, 200)
+
+
+class StartupTests(SimpleTestCase):
+    """Test cases for worker cold start"""
+
+    def test_parse_importtime(self):
+        """Test reading `python -X importtime` output"""
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   django.utils\n'
+            'import time:        80 |        200 | django\n'
+        )
+        imports = parse_importtime(output)
+        self.assertEqual(imports, [('django.utils', 120, 120), ('django', 80, 200)])
+        self.assertEqual(by_package(imports), [('django', 200)])
+
+    def test_full_role(self):
+        """Test a full worker loads the admin but leaves the docs views for first use"""
+        report = measure_startup({'DEPLOYMENT_ROLE': 'full'})
+        self.assertIn('django.contrib.admin', report['apps'])
+        # Docs pages build their drf_yasg views on first use
+        self.assertNotIn('drf_yasg.views', report['modules'])
+
+    def test_api_role_skips_optional_apps(self):
+        """Test an API-only worker never imports the admin or the docs, and so imports less"""
+        full = measure_startup({'DEPLOYMENT_ROLE': 'full'})
+        report = measure_startup({'DEPLOYMENT_ROLE': 'api'})
+        for app in ('django.contrib.admin', 'drf_yasg', 'docs'):
+            self.assertNotIn(app, report['apps'])
+        for module in ('drf_yasg', 'docs', 'books.admin', 'whitenoise.middleware'):
+            self.assertNotIn(module, report['modules'])
+        self.assertLess(set(report['modules']), set(full['modules']))
+
+    @unittest.skipUnless(os.environ.get('CHECK_STARTUP_BUDGET'), 'set CHECK_STARTUP_BUDGET=1 to time startup')
+    def test_within_budget(self):
+        """Test both roles start within STARTUP_TIME_BUDGET on this machine"""
+        for role in ('full', 'api'):
+            with self.subTest(role=role):
+                report = measure_startup({'DEPLOYMENT_ROLE': role})
+                self.assertLess(report['total_seconds'], settings.STARTUP_TIME_BUDGET)
+
+
+class CompressionTests(TestCase):
+    """Test cases for negotiated response compression"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='Pass123!')
+        Book.objects.bulk_create(
+            Book(title=f'Compressed Book {index}', author=self.author, isbn=f'{index:010d}', page_count=100)
+            for index in range(20)
+        )
+
+    def test_choose_encoding(self):
+        """Test Accept-Encoding negotiation"""
+        self.assertEqual(choose_encoding('gzip, deflate'), 'gzip')
+        self.assertIsNone(choose_encoding('identity'))
+        self.assertIsNone(choose_encoding('gzip;q=0'))
+        self.assertEqual(choose_encoding('*'), choose_encoding('br, gzip'))
+
+    @unittest.skipUnless(compression.brotli, 'brotli is not installed')
+    def test_prefers_brotli(self):
+        """Test brotli wins when the client accepts both"""
+        self.assertEqual(choose_encoding('gzip, br'), 'br')
+        self.assertEqual(choose_encoding('gzip, br;q=0.5'), 'gzip')
+
+    def test_large_json_is_gzipped(self):
+        """Test book pages are compressed when the client accepts gzip"""
+        response = self.client.get(reverse('books'), {'page_size': 20}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        body = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(body['data']['books']), 20)
+
+    def test_identity_when_not_accepted(self):
+        """Test clients without Accept-Encoding get plain bodies"""
+        response = self.client.get(reverse('books'), {'page_size': 20})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertTrue(json.loads(response.content)['success'])
+
+    def test_small_responses_are_not_compressed(self):
+        """Test bodies below COMPRESSION_MIN_SIZE are sent as they are"""
+        middleware = CompressionMiddleware(lambda request: JsonResponse({'ok': True}))
+        response = middleware(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_catalogue_pages_are_compressed_once(self):
+        """Test a hot catalogue page reuses its cached compressed body"""
+        with mock.patch('library_app.compression.compress', wraps=compression.compress) as compress:
+            first = self.client.get(reverse('books'), HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get(reverse('books'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(first.content, second.content)
+
+    def test_streaming_responses_are_compressed_per_chunk(self):
+        """Test streaming bodies are compressed incrementally"""
+        chunks = [f'line {index}\n' * 50 for index in range(3)]
+        middleware = CompressionMiddleware(
+            lambda request: StreamingHttpResponse(iter(chunks), content_type='text/csv')
+        )
+        response = middleware(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        parts = list(response.streaming_content)
+        # Every chunk is flushed on its own: the first part already decodes to the first chunk
+        self.assertEqual(zlib.decompressobj(31).decompress(parts[0]).decode(), chunks[0])
+        self.assertEqual(gzip.decompress(b''.join(parts)).decode(), ''.join(chunks))
+
+    def test_encoded_responses_are_left_alone(self):
+        """Test responses that are already encoded are not compressed twice"""
+        def view(request):
+            response = HttpResponse(b'x' * 5000, content_type='text/plain')
+            response['Content-Encoding'] = 'gzip'
+            return response
+        response = CompressionMiddleware(view)(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response.content, b'x' * 5000)
+
+
+@override_settings(BATCH_WORKERS=1)
+class BatchTests(TestCase):
+    """Test cases for the batch API"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='kiosk', email='kiosk@example.com', password='Pass123!')
+        self.book = Book.objects.create(title='Batched Book', author=self.user, isbn='0306406152', page_count=10)
+        self.url = reverse('batch')
+
+    def batch(self, *requests):
+        return self.client.post(self.url, {'requests': list(requests)}, format='json')
+
+    def test_runs_reads_in_order(self):
+        """Test sub-responses come back in request order with their ids"""
+        self.client.force_authenticate(user=self.user)
+        response = self.batch(
+            {'id': 'books', 'path': '/books/?page_size=5'},
+            {'id': 'me', 'path': '/users/profile/'},
+            {'id': 'search', 'path': '/books/search/?title=Batched'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        responses = response.data['data']['responses']
+        self.assertEqual([entry['id'] for entry in responses], ['books', 'me', 'search'])
+        self.assertEqual([entry['status'] for entry in responses], [200, 200, 200])
+        self.assertEqual(responses[1]['body']['data']['username'], 'kiosk')
+
+    def test_sub_requests_keep_permissions(self):
+        """Test anonymous batches can't reach authenticated routes"""
+        response = self.batch({'path': '/users/profile/'}, {'path': '/books/'})
+        statuses = [entry['status'] for entry in response.data['data']['responses']]
+        self.assertEqual(statuses, [status.HTTP_401_UNAUTHORIZED, status.HTTP_200_OK])
+
+    def test_writes_run_in_order(self):
+        """Test a read after a write sees the write"""
+        self.client.force_authenticate(user=self.user)
+        response = self.batch(
+            {'method': 'POST', 'path': '/books/borrow/', 'body': {'book_id': self.book.id}},
+            {'path': '/users/dashboard/'},
+        )
+        borrow, dashboard = response.data['data']['responses']
+        self.assertEqual(borrow['status'], 200)
+        self.assertEqual(len(dashboard['body']['data']['active_loans']), 1)
+
+    def test_limits_and_bad_routes(self):
+        """Test batch size limits and routes that can't be batched"""
+        with self.settings(BATCH_MAX_REQUESTS=2):
+            response = self.batch(*[{'path': '/books/'}] * 3)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.batch({'path': '/nowhere/'}, {'path': '/batch/'}, {'path': '/admin/'})
+        statuses = [entry['status'] for entry in response.data['data']['responses']]
+        self.assertEqual(statuses, [404, 400, 400])
+
+        response = self.batch({'path': '/books/', 'headers': {'Authorization': 'Bearer x'}})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sub_requests_recorded_in_metrics(self):
+        """Test every sub-request is recorded under its own route"""
+        registry.reset()
+        self.batch({'path': '/books/?page_size=5'}, {'path': '/books/search/?title=Batched'}, {'path': '/nowhere/'})
+        series = registry.snapshot()
+        self.assertEqual(series['books/\tGET\t200'][0], 1)
+        self.assertEqual(series['books/search/\tGET\t200'][0], 1)
+        self.assertEqual(series['batch/\tPOST\t200'][0], 1)
+
+    def test_sub_requests_shed_when_busy(self):
+        """Test an anonymous batch has its catalogue reads shed while the worker is overloaded"""
+        with mock.patch.object(LoadSheddingMiddleware, 'is_overloaded', return_value=True):
+            response = self.batch({'path': '/books/'}, {'path': '/users/profile/'})
+            statuses = [entry['status'] for entry in response.data['data']['responses']]
+            self.assertEqual(statuses, [status.HTTP_503_SERVICE_UNAVAILABLE, status.HTTP_401_UNAUTHORIZED])
+            shed = response.data['data']['responses'][0]
+            self.assertEqual((shed['body']['code'], shed['headers']['Retry-After']), ('server_busy', '5'))
+
+            self.client.force_authenticate(user=self.user)
+            response = self.batch({'path': '/books/'})
+            self.assertEqual(response.data['data']['responses'][0]['status'], status.HTTP_200_OK)
+
+    def test_authenticates_once(self):
+        """Test the JWT is decoded for the batch only"""
+        token = self.client.post(reverse('login'), {'username': 'kiosk', 'password': 'Pass123!'}).data['data']['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        validate_token = JWTAuthentication.get_validated_token
+        with mock.patch.object(JWTAuthentication, 'get_validated_token', autospec=True, side_effect=validate_token) as validate:
+            response = self.batch({'path': '/users/profile/'}, {'path': '/users/dashboard/'})
+        self.assertEqual(validate.call_count, 1)
+        self.assertEqual([entry['status'] for entry in response.data['data']['responses']], [200, 200])
+
+
+@override_settings(BATCH_WORKERS=4)
+class ConcurrentBatchTests(TransactionTestCase):
+    """Test cases for reads running on the batch thread pool"""
+
+    def test_concurrent_reads(self):
+        """Test concurrent GET sub-requests see committed data"""
+        user = User.objects.create_user(username='reader', email='reader@example.com', password='Pass123!')
+        Book.objects.create(title='Pooled Book', author=user, isbn='0306406152', page_count=10)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post(reverse('batch'), {'requests': [
+            {'path': '/books/search/?title=Pooled'},
+            {'path': '/users/profile/'},
+            {'path': '/books/isbn/?isbn=0306406152'},
+        ]}, format='json')
+        responses = response.data['data']['responses']
+        self.assertEqual([entry['status'] for entry in responses], [200, 200, 200])
+        self.assertEqual(responses[1]['body']['data']['username'], 'reader')
@@ -0,0 +1,98 @@
+"""
+Token-bucket throttles kept in the shared cache.
+
+Each client gets a bucket holding up to `num_requests` tokens that refills at
+`num_requests / period`, so short bursts are absorbed while the sustained rate
+stays capped. Requests fall into one of four budgets, each with its own rate in
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']: anonymous reads (`anon_browse`),
+anonymous writes such as login (`anon_write`), authenticated reads
+(`user_browse`) and authenticated writes (`user_write`).
+
+A bucket is read and written under a short lock taken with `cache.add`, which
+is atomic on every cache backend, so concurrent requests of one client can't
+spend the same token twice.
+"""
+import time
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+# A bucket's lock; it expires on its own if its holder dies
+LOCK_TIMEOUT = 1
+LOCK_ATTEMPTS = 50
+LOCK_WAIT = 0.002
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Base class; subclasses choose which requests they apply to"""
+    authenticated = False
+    safe = True
+
+    def get_rate(self):
+        # Read the rates on every request so settings overrides apply
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def applies_to(self, request):
+        is_authenticated = bool(request.user and request.user.is_authenticated)
+        return is_authenticated == self.authenticated and (request.method in SAFE_METHODS) == self.safe
+
+    def get_cache_key(self, request, view):
+        if not settings.THROTTLING_ENABLED or not self.applies_to(request):
+            return None
+        ident = request.user.pk if self.authenticated else self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        lock = f'{self.key}:lock'
+        for _ in range(LOCK_ATTEMPTS):
+            if self.cache.add(lock, 1, LOCK_TIMEOUT):
+                try:
+                    return self.take_token()
+                finally:
+                    self.cache.delete(lock)
+            time.sleep(LOCK_WAIT)
+        # Still contended after LOCK_ATTEMPTS: this client has many requests in flight
+        self.wait_seconds = self.duration / self.num_requests
+        return False
+
+    def take_token(self):
+        now = self.timer()
+        refill_rate = self.num_requests / self.duration
+        tokens, updated = self.cache.get(self.key, (self.num_requests, now))
+        tokens = min(self.num_requests, tokens + (now - updated) * refill_rate)
+        if tokens < 1:
+            self.wait_seconds = (1 - tokens) / refill_rate
+            return False
+        self.cache.set(self.key, (tokens - 1, now), self.duration)
+        return True
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None)
+
+
+class AnonBrowseThrottle(TokenBucketThrottle):
+    scope = 'anon_browse'
+
+
+class AnonWriteThrottle(TokenBucketThrottle):
+    scope = 'anon_write'
+    safe = False
+
+
+class UserBrowseThrottle(TokenBucketThrottle):
+    scope = 'user_browse'
+    authenticated = True
+
+
+class UserWriteThrottle(TokenBucketThrottle):
+    scope = 'user_write'
+    authenticated = True
+    safe = False
@@ -14,57 +14,29 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
-from django.urls import path, include, re_path
+from django.apps import apps
+from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-# Swagger/OpenAPI schema configuration
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Library Management API",
-        default_version='v1',
-        description="""
-        A comprehensive Library Management System API with JWT authentication.
-        
-        ## Features
-        - User registration and authentication with JWT tokens
-        - Book management (CRUD operations)
-        - Book borrowing system
-        - Role-based access control (User, Admin)
-        
-        ## Authentication
-        Most endpoints require JWT authentication. To authenticate:
-        1. Register or login to get access token
-        2. Click 'Authorize' button and enter: `Bearer <your_access_token>`
-        
-        ## User Roles
-        - **Anonymous**: Can browse books only
-        - **Registered User**: Can browse and borrow books
-        - **Superuser**: Full access to manage books and users
-        """,
-        terms_of_service="https://www.example.com/terms/",
-        contact=openapi.Contact(email="contact@library.local"),
-        license=openapi.License(name="MIT License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from library_app.batch import BatchAPIView
+from library_app.metrics import MetricsAPIView
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('users/', include('user.urls')),
     path('books/', include('books.urls')),
-    
-    # Swagger/ReDoc API Documentation
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('jobs/', include('jobs.urls')),
+    path('audit/', include('audit.urls')),
+    path('metrics', MetricsAPIView.as_view(), name='metrics'),
+    path('batch/', BatchAPIView.as_view(), name='batch'),
 ]
 
+# Left out by DEPLOYMENT_ROLE=api
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+    urlpatterns.append(path('admin/', admin.site.urls))
+if apps.is_installed('docs'):
+    urlpatterns.append(path('', include('docs.urls')))
+
 # Serve media files in development
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
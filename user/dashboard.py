@@ -0,0 +1,57 @@
+"""
+Patron dashboard: profile, open loans and loan counts in one response.
+
+The payload costs two queries (open loans joined with their books, and one
+aggregate for the counts) and is cached per user for DASHBOARD_CACHE_TIMEOUT
+seconds. Borrowing and returning call `invalidate_dashboard` so the cached copy
+never shows a stale loan list.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from books.models import Loan
+from books.serializers import ActiveLoanSerializer
+from .serializers import UserSerializer
+
+
+def dashboard_cache_key(user_id):
+    return f'dashboard:{user_id}'
+
+
+def invalidate_dashboard(user_id):
+    cache.delete(dashboard_cache_key(user_id))
+
+
+def invalidate_dashboards(user_ids):
+    cache.delete_many([dashboard_cache_key(user_id) for user_id in user_ids])
+
+
+def build_dashboard(user):
+    active = Q(return_date__isnull=True)
+    overdue_before = timezone.now() - timedelta(days=settings.LOAN_PERIOD_DAYS)
+    loans = Loan.objects.filter(user=user)
+    counts = loans.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=active),
+        overdue=Count('id', filter=active & Q(loan_date__lt=overdue_before)),
+    )
+    counts['returned'] = counts['total'] - counts['active']
+    active_loans = loans.filter(active).select_related('book').order_by('loan_date')
+    return {
+        'profile': UserSerializer(user).data,
+        'active_loans': ActiveLoanSerializer(active_loans, many=True).data,
+        'counts': counts,
+    }
+
+
+def get_dashboard(user):
+    key = dashboard_cache_key(user.pk)
+    data = cache.get(key)
+    if data is None:
+        data = build_dashboard(user)
+        cache.set(key, data, settings.DASHBOARD_CACHE_TIMEOUT)
+    return data
@@ -1,8 +1,13 @@
+from datetime import timedelta
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from user.models import User
+from books.models import Book, Loan
+from library_app.testing import QueryBudgetMixin
 
 
 class UserRegistrationTests(TestCase):
@@ -172,3 +177,135 @@ class UsersListTests(TestCase):
         self.assertTrue(response.data['success'])
         # Should return 2 regular users, not the superuser
         self.assertEqual(len(response.data['data']), 2)
+
+
+class DashboardTests(TestCase):
+    """Test cases for the patron dashboard API"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='patron', email='patron@example.com', password='TestPass123!',
+            first_name='Pat', last_name='Ron'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.books = [
+            Book.objects.create(title=f'Dashboard Book {index}', author=self.user, isbn=f'{index:010d}', page_count=100)
+            for index in range(3)
+        ]
+        self.url = reverse('user-dashboard')
+
+    def borrow(self, book):
+        return self.client.post(reverse('borrow_book'), {'book_id': book.id})
+
+    def test_dashboard_requires_authentication(self):
+        """Test anonymous users get 401"""
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_dashboard_contents(self):
+        """Test profile, active loans with due status and counts"""
+        self.borrow(self.books[0])
+        self.borrow(self.books[1])
+        self.client.post(reverse('return_book'), {'book_id': self.books[1].id})
+        self.borrow(self.books[2])
+        Loan.objects.filter(book=self.books[2]).update(loan_date=timezone.now() - timedelta(days=30))
+
+        cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        data = response.data['data']
+        self.assertEqual(data['profile']['username'], 'patron')
+        self.assertEqual(
+            [(loan['book_title'], loan['due_status']) for loan in data['active_loans']],
+            [('Dashboard Book 2', 'overdue'), ('Dashboard Book 0', 'on_time')]
+        )
+        self.assertEqual(data['counts'], {'total': 3, 'active': 2, 'overdue': 1, 'returned': 1})
+
+    def test_dashboard_is_cached_until_borrow_or_return(self):
+        """Test the cached dashboard is dropped when the user borrows or returns"""
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        self.borrow(self.books[0])
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['data']['active_loans']), 1)
+
+        self.client.post(reverse('return_book'), {'book_id': self.books[0].id})
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['data']['active_loans'], [])
+
+
+class UserQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Query counts of the user endpoints must not grow with the data"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='TestPass123!',
+            first_name='Test',
+            last_name='User'
+        )
+
+    def add_users(self, count):
+        start = User.objects.count()
+        User.objects.bulk_create(
+            User(username=f'member{start + index}', email=f'member{start + index}@example.com')
+            for index in range(count)
+        )
+
+    def test_list_users(self):
+        """Test listing users"""
+        url = reverse('users')
+        self.assertConstantQueries(self.add_users, lambda: self.client.get(url))
+
+    def test_profile(self):
+        """Test getting the profile"""
+        self.client.force_authenticate(user=self.user)
+        url = reverse('user-profile')
+        self.assertConstantQueries(self.add_users, lambda: self.client.get(url))
+
+    def test_dashboard(self):
+        """Test the patron dashboard"""
+        self.client.force_authenticate(user=self.user)
+        url = reverse('user-dashboard')
+
+        def add_loans(count):
+            cache.clear()
+            start = Book.objects.count()
+            books = Book.objects.bulk_create(
+                Book(title=f'Loaned {start + index}', author=self.user, isbn=f'{start + index:010d}', page_count=10)
+                for index in range(count)
+            )
+            Loan.objects.bulk_create(Loan(book=book, user=self.user) for book in books)
+
+        self.assertConstantQueries(add_loans, lambda: self.client.get(url))
+
+    def test_login(self):
+        """Test logging in"""
+        url = reverse('login')
+        data = {'username': 'testuser', 'password': 'TestPass123!'}
+        self.assertConstantQueries(self.add_users, lambda: self.client.post(url, data, format='json'))
+
+    def test_register(self):
+        """Test registering"""
+        url = reverse('register')
+        registered = []
+
+        def register():
+            registered.append(len(registered))
+            name = f'newuser{len(registered)}'
+            return self.client.post(url, {
+                'username': name,
+                'email': f'{name}@example.com',
+                'password': 'TestPass123!',
+                'password2': 'TestPass123!',
+                'first_name': 'New',
+                'last_name': 'User'
+            }, format='json')
+
+        self.assertConstantQueries(self.add_users, register)
@@ -1,10 +1,11 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
-from .views import RegisterAPIView, LoginAPIView, ProfileAPIView, UsersAPIView
+from .views import RegisterAPIView, LoginAPIView, ProfileAPIView, DashboardAPIView, UsersAPIView
 
 urlpatterns = [
     path('register/', RegisterAPIView.as_view(), name='register'),
     path('login/', LoginAPIView.as_view(), name='login'),
     path('profile/', ProfileAPIView.as_view(), name='user-profile'),
+    path('dashboard/', DashboardAPIView.as_view(), name='user-dashboard'),
     path('all-users/', UsersAPIView.as_view(), name='users'),
 ]
@@ -6,6 +6,7 @@ from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserSe
 from library_app.utils import wrap_response
 from rest_framework.permissions import IsAuthenticated , AllowAny
 from user.models import User
+from .dashboard import get_dashboard
 
 class RegisterAPIView(APIView):
     """API endpoint for user registration"""
@@ -99,6 +100,19 @@ class ProfileAPIView(APIView):
             data=UserSerializer(user).data
         )
 
+class DashboardAPIView(APIView):
+    """API endpoint for the patron dashboard"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Get profile, active loans with due status and loan counts in one call"""
+        return wrap_response(
+            success=True,
+            code="dashboard_retrieved",
+            message='Dashboard retrieved successfully',
+            data=get_dashboard(request.user)
+        )
+
 class UsersAPIView(APIView):
     """API endpoint for user profile"""
     permission_classes = [AllowAny]  